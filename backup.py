@@ -0,0 +1,368 @@
+import argparse
+import datetime
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+import database
+import shards
+
+BACKUP_DIR = 'backups'
+PAGES_PER_STEP = 1024
+STEP_PAUSE_MS = 5
+BACKUP_KEEP = 24
+BACKUP_MAX_AGE_DAYS = 30
+BACKUP_INTERVAL_SECONDS = 3600
+BACKUP_PATTERN = re.compile(r'^(?P<stem>.+)-(?P<stamp>\d{8}-\d{6})\.db$')
+
+
+def backup_dir(db_file=None):
+    db_file = db_file or database.DB_FILE
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), BACKUP_DIR)
+
+
+def _stem(db_file):
+    return os.path.splitext(os.path.basename(db_file))[0]
+
+
+def _copy(source, target, pages, pause, progress):
+    total_pages = [0]
+
+    def step(status, remaining, total):
+        total_pages[0] = total
+        if progress:
+            progress(total - remaining, total)
+        # Yield between steps so writers and the UI get the disk and the GIL.
+        if pause:
+            time.sleep(pause)
+
+    source.backup(target, pages=pages, progress=step)
+    return total_pages[0]
+
+
+def backup_database(dest=None, db_file=None, pages=PAGES_PER_STEP, pause_ms=STEP_PAUSE_MS, progress=None):
+    if pages < 1:
+        raise ValueError("Pages per step must be positive")
+    db_file = db_file or database.DB_FILE
+    if not os.path.exists(db_file):
+        raise ValueError(f"Database file not found: {db_file}")
+    if dest is None:
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        dest = os.path.join(backup_dir(db_file), f"{_stem(db_file)}-{stamp}.db")
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    partial = dest + '.partial'
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    started = time.perf_counter()
+    source = target = None
+    try:
+        source = sqlite3.connect(f"file:{os.path.abspath(db_file)}?mode=ro", uri=True, isolation_level=None)
+        # Pin one WAL snapshot for the whole copy. Without it every commit by
+        # another connection restarts the backup from the first page, and a
+        # busy database never finishes; with it writers carry on untouched.
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        target = sqlite3.connect(partial)
+        page_count = _copy(source, target, pages, pause_ms / 1000.0, progress)
+        target.execute("PRAGMA journal_mode = DELETE")
+        target.close()
+        target = None
+    except Exception as e:
+        if target is not None:
+            target.close()
+        if os.path.exists(partial):
+            os.remove(partial)
+        if isinstance(e, sqlite3.Error):
+            raise Exception(f"Failed to back up database: {str(e)}")
+        raise
+    finally:
+        if source is not None:
+            source.close()
+    # Only a finished copy ever carries the backup's name.
+    os.replace(partial, dest)
+    seconds = time.perf_counter() - started
+    size = os.path.getsize(dest)
+    return {
+        'path': dest,
+        'pages': page_count,
+        'bytes': size,
+        'seconds': seconds,
+        'bytes_per_sec': size / seconds if seconds > 0 else 0.0,
+    }
+
+
+def backup_all(directory=None, pages=PAGES_PER_STEP, pause_ms=STEP_PAUSE_MS, progress=None, cancelled=None):
+    # The catalog and, in sharded mode, every shard; all share one timestamp
+    # so a set can be matched up again for a restore.
+    directory = directory or backup_dir()
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    results = []
+    for db_file in database.database_files():
+        if cancelled is not None and cancelled():
+            raise Exception("Backup cancelled")
+        dest = os.path.join(directory, f"{_stem(db_file)}-{stamp}.db")
+        results.append(backup_database(dest, db_file=db_file, pages=pages, pause_ms=pause_ms, progress=progress))
+    return results
+
+
+def list_backups(directory=None, db_file=None):
+    directory = directory or backup_dir(db_file)
+    stem = _stem(db_file or database.DB_FILE)
+    backups = []
+    if not os.path.isdir(directory):
+        return backups
+    for name in os.listdir(directory):
+        match = BACKUP_PATTERN.match(name)
+        if not match or match.group('stem') != stem:
+            continue
+        taken = datetime.datetime.strptime(match.group('stamp'), '%Y%m%d-%H%M%S')
+        path = os.path.join(directory, name)
+        backups.append((taken, path, os.path.getsize(path)))
+    backups.sort(reverse=True)
+    return backups
+
+
+def prune_backups(directory=None, db_file=None, keep=BACKUP_KEEP, max_age_days=BACKUP_MAX_AGE_DAYS):
+    # The newest `keep` backups always survive; older ones go once they pass
+    # max_age_days (or straight away when no age limit is set).
+    if keep < 1:
+        raise ValueError("At least one backup must be kept")
+    removed = []
+    cutoff = None
+    if max_age_days is not None:
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=max_age_days)
+    for taken, path, _ in list_backups(directory, db_file)[keep:]:
+        if cutoff is None or taken < cutoff:
+            os.remove(path)
+            removed.append(path)
+    return removed
+
+
+def verify_backup(path):
+    try:
+        conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+        try:
+            result = conn.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to verify backup: {str(e)}")
+    if result != 'ok':
+        raise ValueError(f"Backup {path} is damaged: {result}")
+
+
+def restore_database(backup_path, db_file=None, pages=PAGES_PER_STEP, progress=None):
+    # Copies the backup over the live file through the backup API, so the
+    # swap happens inside one write transaction: other connections see the
+    # old database or the restored one, never a mix.
+    db_file = db_file or database.DB_FILE
+    if not os.path.exists(backup_path):
+        raise ValueError(f"Backup not found: {backup_path}")
+    verify_backup(backup_path)
+    started = time.perf_counter()
+    source = target = None
+    try:
+        source = sqlite3.connect(f"file:{os.path.abspath(backup_path)}?mode=ro", uri=True)
+        target = sqlite3.connect(db_file, timeout=30)
+        page_count = _copy(source, target, pages, 0, progress)
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to restore database: {str(e)}")
+    finally:
+        if target is not None:
+            target.close()
+        if source is not None:
+            source.close()
+    # Pooled connections and cached rows describe the old contents.
+    if os.path.abspath(db_file) == os.path.abspath(database.DB_FILE):
+        database.configure()
+    return {'path': db_file, 'pages': page_count, 'seconds': time.perf_counter() - started}
+
+
+def restore_all(backup_path, pages=PAGES_PER_STEP, progress=None):
+    # In sharded mode a catalog backup stands for its whole set: every shard
+    # backed up under the same timestamp is restored with it, and shards that
+    # did not exist then are moved aside, so catalog and shards agree again.
+    directory = database.shard_directory()
+    if directory is None:
+        return [restore_database(backup_path, pages=pages, progress=progress)]
+    match = BACKUP_PATTERN.match(os.path.basename(backup_path))
+    if not match or match.group('stem') != _stem(database.DB_FILE):
+        raise ValueError(f"Restore a sharded database from a backup of its catalog, "
+                         f"{_stem(database.DB_FILE)}-YYYYMMDD-HHMMSS.db")
+    stamp = match.group('stamp')
+    backup_folder = os.path.dirname(os.path.abspath(backup_path))
+    shard_backups = {}
+    for name in os.listdir(backup_folder):
+        found = BACKUP_PATTERN.match(name)
+        if not found or found.group('stamp') != stamp:
+            continue
+        shard = shards.SHARD_PATTERN.match(found.group('stem') + '.db')
+        if shard:
+            shard_backups[int(shard.group(1))] = os.path.join(backup_folder, name)
+    # Check the whole set before touching any live file.
+    for path in [backup_path] + list(shard_backups.values()):
+        verify_backup(path)
+
+    # Closes every pooled catalog and shard connection first.
+    database.configure()
+    results = [restore_database(backup_path, pages=pages, progress=progress)]
+    for user_id, path in sorted(shard_backups.items()):
+        results.append(restore_database(path, db_file=shards.shard_path(directory, user_id), pages=pages,
+                                        progress=progress))
+    set_aside = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    for user_id in shards.shard_user_ids(directory):
+        if user_id not in shard_backups:
+            live = shards.shard_path(directory, user_id)
+            aside = os.path.join(backup_folder, f"{_stem(live)}-pre-restore-{set_aside}.db")
+            for suffix in ('-wal', '-shm', ''):
+                if os.path.exists(live + suffix):
+                    os.replace(live + suffix, aside + suffix)
+    database.configure()
+    return results
+
+
+class BackupScheduler:
+    def __init__(self, interval=BACKUP_INTERVAL_SECONDS, directory=None, keep=BACKUP_KEEP,
+                 max_age_days=BACKUP_MAX_AGE_DAYS, pages=PAGES_PER_STEP, pause_ms=STEP_PAUSE_MS):
+        self.interval = interval
+        self.directory = directory
+        self.keep = keep
+        self.max_age_days = max_age_days
+        self.pages = pages
+        self.pause_ms = pause_ms
+        self.last_result = None
+        self.last_error = None
+        self.progress = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="db-backup", daemon=True)
+            self._thread.start()
+        return self
+
+    def run_now(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def status(self):
+        if self.progress is not None:
+            done, total = self.progress
+            return f"Backup running: {done:,} of {total:,} pages"
+        if self.last_error is not None:
+            return f"Last backup failed: {self.last_error}"
+        if self.last_result is not None:
+            result = self.last_result
+            files = f", {result['files']:,} files" if result['files'] > 1 else ""
+            return (f"Last backup: {os.path.basename(result['path'])} ({result['bytes'] / 1048576:.1f} MB{files} in "
+                    f"{result['seconds']:.1f}s)")
+        return "No backup taken yet"
+
+    def _report(self, done, total):
+        # Raising from the progress callback abandons the copy mid-way.
+        if self._stop.is_set():
+            raise Exception("Backup cancelled")
+        self.progress = (done, total)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                results = backup_all(self.directory, pages=self.pages, pause_ms=self.pause_ms,
+                                     progress=self._report, cancelled=self._stop.is_set)
+                self.last_result = {
+                    'path': results[0]['path'],
+                    'files': len(results),
+                    'bytes': sum(result['bytes'] for result in results),
+                    'seconds': sum(result['seconds'] for result in results),
+                }
+                self.last_error = None
+                for db_file in database.database_files():
+                    prune_backups(self.directory, db_file, keep=self.keep, max_age_days=self.max_age_days)
+            except Exception as e:
+                self.last_error = str(e)
+            finally:
+                self.progress = None
+
+
+def _print_progress(done, total):
+    if total:
+        print(f"\r{done:,}/{total:,} pages ({done * 100 // total}%)", end='', file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Back up and restore the inventory database while it is in use.")
+    parser.add_argument('--db', default=database.DB_FILE, help="SQLite database file")
+    parser.add_argument('--shards', help="Shard directory, when --db is a sharded catalog")
+    commands = parser.add_subparsers(dest='command', required=True)
+    create = commands.add_parser('backup', help="Take a backup now")
+    create.add_argument('dest', nargs='?', help="Backup file (default: a timestamped file in backups/)")
+    create.add_argument('--pages', type=int, default=PAGES_PER_STEP, help="Pages copied per step")
+    create.add_argument('--pause-ms', type=float, default=STEP_PAUSE_MS, help="Pause between steps")
+    create.add_argument('--keep', type=int, default=BACKUP_KEEP, help="Prune to this many backups afterwards")
+    restore = commands.add_parser('restore', help="Replace the database with a backup")
+    restore.add_argument('backup')
+    commands.add_parser('list', help="List backups, newest first")
+    prune = commands.add_parser('prune', help="Apply the retention policy")
+    prune.add_argument('--keep', type=int, default=BACKUP_KEEP)
+    prune.add_argument('--max-age-days', type=float, default=BACKUP_MAX_AGE_DAYS)
+    schedule = commands.add_parser('schedule', help="Take a backup every interval until interrupted")
+    schedule.add_argument('--interval', type=float, default=BACKUP_INTERVAL_SECONDS, help="Seconds between backups")
+    schedule.add_argument('--keep', type=int, default=BACKUP_KEEP)
+    args = parser.parse_args(argv)
+    database.configure(db_file=args.db, shard_dir=args.shards)
+
+    if args.command == 'backup':
+        if args.dest is None:
+            results = backup_all(pages=args.pages, pause_ms=args.pause_ms, progress=_print_progress)
+        else:
+            results = [backup_database(args.dest, pages=args.pages, pause_ms=args.pause_ms, progress=_print_progress)]
+        print(file=sys.stderr)
+        for stats in results:
+            print(f"Backed up {stats['bytes'] / 1048576:,.1f} MB to {stats['path']} in {stats['seconds']:.2f}s "
+                  f"({stats['bytes_per_sec'] / 1048576:,.1f} MB/s)")
+        if args.dest is None:
+            for db_file in database.database_files():
+                for path in prune_backups(db_file=db_file, keep=args.keep):
+                    print(f"Removed {path}")
+    elif args.command == 'restore':
+        results = restore_all(args.backup, progress=_print_progress)
+        print(file=sys.stderr)
+        for stats in results:
+            print(f"Restored {stats['path']} in {stats['seconds']:.2f}s")
+    elif args.command == 'list':
+        for db_file in database.database_files():
+            for taken, path, size in list_backups(db_file=db_file):
+                print(f"{taken:%Y-%m-%d %H:%M:%S}  {size / 1048576:10,.1f} MB  {path}")
+    elif args.command == 'prune':
+        for db_file in database.database_files():
+            for path in prune_backups(db_file=db_file, keep=args.keep, max_age_days=args.max_age_days):
+                print(f"Removed {path}")
+    elif args.command == 'schedule':
+        scheduler = BackupScheduler(interval=args.interval, keep=args.keep).start()
+        scheduler.run_now()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            scheduler.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import backup
+import database
+from benchmarks import datagen
+from benchmarks.run import summarize
+
+DEFAULT_PRODUCTS = '1m'
+DEFAULT_SIZE_MB = 2048
+DEFAULT_STEPS = '256,1024,4096'
+PAD_ROW_BYTES = 64 * 1024
+PAD_BATCH = 256
+
+
+def _file_size(path):
+    wal = path + '-wal'
+    return os.path.getsize(path) + (os.path.getsize(wal) if os.path.exists(wal) else 0)
+
+
+def grow(path, size_mb):
+    # Realistic rows come from datagen; the rest of the target size is filler
+    # pages, which the backup copies exactly like any others.
+    target = size_mb * 1048576
+    current = _file_size(path)
+    if current >= target:
+        return current
+    with database.connect_db().writer() as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS bench_padding (id INTEGER PRIMARY KEY, data BLOB)")
+    while current < target:
+        with database.connect_db().writer() as conn:
+            conn.executemany("INSERT INTO bench_padding (data) VALUES (randomblob(?))",
+                             [(PAD_ROW_BYTES,)] * PAD_BATCH)
+        current = _file_size(path)
+    # A checkpoint cannot run inside the writer's transaction.
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    return os.path.getsize(path)
+
+
+def write_latency(user_id, stop, samples):
+    while not stop.is_set():
+        started = time.perf_counter()
+        row = database.add_product(user_id, 'backup bench item', 1, 1.0)
+        samples.append(time.perf_counter() - started)
+        database.delete_product(user_id, row[0])
+        time.sleep(0.005)
+
+
+def run(path, user_id, steps, pause_ms, out_dir):
+    results = {}
+    idle = []
+    stop = threading.Event()
+    thread = threading.Thread(target=write_latency, args=(user_id, stop, idle))
+    thread.start()
+    time.sleep(2)
+    stop.set()
+    thread.join()
+    results['writes_idle'] = summarize(idle)
+    for pages in steps:
+        dest = os.path.join(out_dir, f"bench-{pages}.db")
+        samples = []
+        stop = threading.Event()
+        thread = threading.Thread(target=write_latency, args=(user_id, stop, samples))
+        thread.start()
+        try:
+            stats = backup.backup_database(dest, db_file=path, pages=pages, pause_ms=pause_ms)
+        finally:
+            stop.set()
+            thread.join()
+        os.remove(dest)
+        results[f"pages_{pages}"] = {
+            'mb': stats['bytes'] / 1048576,
+            'seconds': stats['seconds'],
+            'mb_per_sec': stats['bytes_per_sec'] / 1048576,
+            'writes_during_backup': summarize(samples) if samples else None,
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure online backup throughput and its effect on writers.")
+    parser.add_argument('--products', default=DEFAULT_PRODUCTS, help="Products in the base dataset, e.g. 100k, 1m")
+    parser.add_argument('--size-mb', type=int, default=DEFAULT_SIZE_MB, help="Grow the database to at least this size")
+    parser.add_argument('--steps', default=DEFAULT_STEPS, help="Comma-separated pages-per-step values to try")
+    parser.add_argument('--pause-ms', type=float, default=backup.STEP_PAUSE_MS)
+    parser.add_argument('--out-dir', help="Where backups are written (default: a temporary directory)")
+    parser.add_argument('--output', help="Write JSON results to this file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    info = datagen.ensure_dataset(datagen.parse_size(args.products))
+    # Padding goes into a copy so the query benchmarks keep their dataset.
+    path = os.path.splitext(info['path'])[0] + '_backup.db'
+    if not os.path.exists(path):
+        backup.backup_database(path, db_file=info['path'], pause_ms=0)
+    database.configure(db_file=path)
+    size = grow(path, args.size_mb)
+    steps = [int(step) for step in args.steps.split(',') if step.strip()]
+    out_dir = args.out_dir or tempfile.mkdtemp(prefix='inventory-backup-bench-')
+    os.makedirs(out_dir, exist_ok=True)
+    report = {'db_file': path, 'db_mb': size / 1048576, 'pause_ms': args.pause_ms,
+              'results': run(path, info['heavy_user_id'], steps, args.pause_ms, out_dir)}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
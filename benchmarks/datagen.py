@@ -0,0 +1,121 @@
+import os
+import random
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backup
+import database
+import passwords
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+BENCH_PASSWORD = 'bench-password'
+WORDS = ('steel', 'bolt', 'washer', 'cable', 'widget', 'gear', 'valve', 'pipe', 'hinge', 'bracket',
+         'spring', 'clamp', 'filter', 'sensor', 'relay', 'switch', 'panel', 'motor', 'pump', 'seal')
+INSERT_BATCH = 50000
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    multiplier = 1
+    if text.endswith('k'):
+        multiplier, text = 1000, text[:-1]
+    elif text.endswith('m'):
+        multiplier, text = 1000000, text[:-1]
+    return int(float(text) * multiplier)
+
+
+def user_count(products):
+    return max(10, products // 1000)
+
+
+def product_name(rng):
+    return f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.randint(1, 9999)}"
+
+
+def generate(path, products, users=None, seed=1234):
+    users = users or user_count(products)
+    if os.path.exists(path):
+        os.remove(path)
+    database.configure(db_file=path)
+    database.init_db()
+    rng = random.Random(seed)
+    # One hash shared by every synthetic user keeps generation fast; login
+    # benchmarks still pay the full verification cost.
+    password_hash = passwords.hash_password(BENCH_PASSWORD)
+    with database.connect_db().writer() as conn:
+        conn.executemany("INSERT INTO users (id, username, password) VALUES (?, ?, ?)",
+                         ((uid, f"user{uid}", password_hash) for uid in range(1, users + 1)))
+    # The first user holds half of all products so per-user paths see a large inventory.
+    heavy = products // 2
+    counts = [heavy] + [0] * (users - 1)
+    remaining = products - heavy
+    for i in range(remaining):
+        counts[1 + i % (users - 1)] += 1
+    batch = []
+    for uid, count in enumerate(counts, start=1):
+        for product_no in range(1, count + 1):
+            batch.append((uid, product_name(rng), rng.randint(0, 500), round(rng.uniform(1, 999), 2), product_no))
+            if len(batch) >= INSERT_BATCH:
+                _insert(batch)
+    if batch:
+        _insert(batch)
+    with database.connect_db().writer() as conn:
+        # Bulk-loaded stock enters the ledger as an opening balance.
+        conn.execute("INSERT INTO stock_snapshots (inventory_id, user_id, product_no, as_of, last_movement_id, quantity) "
+                     "SELECT id, user_id, product_no, strftime('%Y-%m-%dT%H:%M:%f', 'now'), 0, quantity FROM inventory")
+        # A freshly generated dataset has no history for clients to catch up on.
+        conn.execute("DELETE FROM inventory_changes")
+        conn.execute("ANALYZE")
+    return {'path': path, 'products': products, 'users': users, 'heavy_user_id': 1, 'heavy_products': heavy}
+
+
+def _insert(batch):
+    with database.connect_db().writer() as conn:
+        conn.executemany("INSERT INTO inventory (user_id, product_name, quantity, price, product_no) "
+                         "VALUES (?, ?, ?, ?, ?)", batch)
+    batch.clear()
+
+
+def dataset_path(products):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, f"bench_{products}.db")
+
+
+def ensure_dataset(products, regenerate=False):
+    path = dataset_path(products)
+    users = user_count(products)
+    if not regenerate and os.path.exists(path):
+        try:
+            conn = sqlite3.connect(path)
+            (count,) = conn.execute("SELECT COUNT(*) FROM inventory").fetchone()
+            conn.close()
+            if count == products:
+                return {'path': path, 'products': products, 'users': users,
+                        'heavy_user_id': 1, 'heavy_products': products // 2}
+        except sqlite3.Error:
+            pass
+    return generate(path, products, users)
+
+
+def scratch_copy(info):
+    # Benchmarks write to the database (products, ledger rows, the change log
+    # and product sequences), so every run gets a fresh copy and the cached
+    # dataset stays identical from run to run.
+    path = info['path'][:-len('.db')] + '.run.db'
+    remove_scratch(path)
+    backup.backup_database(path, db_file=info['path'], pause_ms=0)
+    return dict(info, path=path)
+
+
+def remove_scratch(path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+if __name__ == "__main__":
+    for size in sys.argv[1:] or ['1k']:
+        info = ensure_dataset(parse_size(size), regenerate=True)
+        print(f"Generated {info['products']:,} products for {info['users']:,} users at {info['path']}")
@@ -0,0 +1,165 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import database
+import remote
+from benchmarks.run import summarize
+
+DEFAULT_CLIENTS = 8
+DEFAULT_DURATION = 10.0
+DEFAULT_WRITE_RATIO = 0.3
+LOAD_PASSWORD = 'load-password'
+
+
+def _prepare(db_file, clients):
+    database.configure(db_file=db_file)
+    database.init_db()
+    user_ids = []
+    for i in range(clients):
+        username = f"load{i}"
+        database.register_user(username, LOAD_PASSWORD)
+        user_ids.append(database.check_user(username, LOAD_PASSWORD))
+    database.configure()
+    return user_ids
+
+
+def _workload(db, user_id, seed, deadline, write_ratio):
+    rng = random.Random(seed)
+    samples = {}
+    errors = {}
+    products = []
+    while time.perf_counter() < deadline:
+        roll = rng.random()
+        if roll < write_ratio or not products:
+            if products and roll < write_ratio / 3:
+                name, call = 'update_product', lambda: db.update_product(user_id, rng.choice(products), 'load item',
+                                                                         rng.randint(1, 50), 2.5)
+            else:
+                name, call = 'add_product', lambda: products.append(
+                    db.add_product(user_id, f"load item {rng.randint(1, 99999)}", rng.randint(1, 50), 1.5)[0])
+        elif roll < write_ratio + (1 - write_ratio) / 2:
+            name, call = 'view_products_window', lambda: db.view_products_window(user_id, rng.randint(0, len(products)), 40)
+        else:
+            name, call = 'get_inventory_summary', lambda: db.get_inventory_summary(user_id)
+        started = time.perf_counter()
+        try:
+            call()
+        except Exception as e:
+            key = f"{name}: {str(e)[:80]}"
+            errors[key] = errors.get(key, 0) + 1
+            continue
+        samples.setdefault(name, []).append(time.perf_counter() - started)
+    return samples, errors
+
+
+def _direct_worker(args):
+    db_file, user_id, seed, wall_deadline, write_ratio = args
+    # Each process opens its own connections, like separate stations sharing
+    # one file did before the server existed. perf_counter is per process, so
+    # the shared deadline travels as wall-clock time.
+    database.configure(db_file=db_file)
+    deadline = time.perf_counter() + max(0.0, wall_deadline - time.time())
+    return _workload(database, user_id, seed, deadline, write_ratio)
+
+
+def _merge(results, elapsed):
+    samples, errors = {}, {}
+    for client_samples, client_errors in results:
+        for name, values in client_samples.items():
+            samples.setdefault(name, []).extend(values)
+        for key, count in client_errors.items():
+            errors[key] = errors.get(key, 0) + count
+    total = sum(len(values) for values in samples.values())
+    return {
+        'operations': total,
+        'ops_per_sec': total / elapsed,
+        'errors': errors,
+        'by_operation': {name: summarize(values) for name, values in sorted(samples.items())},
+    }
+
+
+def run_direct(db_file, user_ids, duration, write_ratio):
+    with multiprocessing.get_context('spawn').Pool(len(user_ids)) as pool:
+        wall_deadline = time.time() + duration
+        started = time.perf_counter()
+        jobs = [(db_file, uid, i, wall_deadline, write_ratio) for i, uid in enumerate(user_ids)]
+        results = pool.map(_direct_worker, jobs)
+        elapsed = time.perf_counter() - started
+    return _merge(results, elapsed)
+
+
+def run_server(url, user_ids, duration, write_ratio):
+    results = [None] * len(user_ids)
+    deadline = time.perf_counter() + duration
+
+    def worker(i, uid):
+        results[i] = _workload(remote.RemoteDatabase(url), uid, i, deadline, write_ratio)
+
+    threads = [threading.Thread(target=worker, args=(i, uid)) for i, uid in enumerate(user_ids)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return _merge(results, time.perf_counter() - started)
+
+
+def _start_server(db_file, port, batch_window_ms):
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'server.py'), '--db', db_file,
+                                '--port', str(port), '--batch-window-ms', str(batch_window_ms)])
+    url = f"http://127.0.0.1:{port}"
+    client = remote.RemoteDatabase(url, timeout=2)
+    for _ in range(100):
+        try:
+            client.init_db()
+            return process, url
+        except Exception:
+            time.sleep(0.1)
+    process.terminate()
+    raise Exception("Inventory server did not start")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive concurrent clients against the inventory database.")
+    parser.add_argument('--mode', choices=('server', 'direct', 'both'), default='both')
+    parser.add_argument('--db', default=os.path.join(ROOT, 'benchmarks', 'data', 'loadgen.db'))
+    parser.add_argument('--url', help="Use an already running server instead of starting one")
+    parser.add_argument('--port', type=int, default=8799)
+    parser.add_argument('--clients', type=int, default=DEFAULT_CLIENTS)
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION)
+    parser.add_argument('--write-ratio', type=float, default=DEFAULT_WRITE_RATIO)
+    parser.add_argument('--batch-window-ms', type=float, default=2)
+    args = parser.parse_args(argv)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    user_ids = _prepare(args.db, args.clients)
+    report = {'clients': args.clients, 'duration': args.duration, 'write_ratio': args.write_ratio}
+    if args.mode in ('direct', 'both'):
+        report['direct'] = run_direct(args.db, user_ids, args.duration, args.write_ratio)
+    if args.mode in ('server', 'both'):
+        process = None
+        url = args.url
+        if not url:
+            process, url = _start_server(args.db, args.port, args.batch_window_ms)
+        try:
+            report['server'] = run_server(url, user_ids, args.duration, args.write_ratio)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from benchmarks import datagen
+
+DEFAULT_SIZES = '1k,100k,1m'
+DEFAULT_ITERATIONS = 200
+LOGIN_ITERATIONS = 20
+IMPORT_ROWS = 20000
+DEFAULT_THRESHOLD = 0.10
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(samples, rows=None):
+    total = sum(samples)
+    result = {
+        'count': len(samples),
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'mean_ms': total / len(samples) * 1000,
+        'ops_per_sec': len(samples) / total if total > 0 else 0.0,
+    }
+    if rows is not None:
+        result['rows_per_sec'] = rows / total if total > 0 else 0.0
+    return result
+
+
+def measure(func, iterations, setup=None):
+    samples = []
+    rows = 0
+    for i in range(iterations):
+        args = setup(i) if setup else ()
+        started = time.perf_counter()
+        result = func(*args)
+        samples.append(time.perf_counter() - started)
+        if isinstance(result, (list, tuple)) and result and isinstance(result[0], (list, tuple)):
+            rows += len(result)
+        elif isinstance(result, int) and not isinstance(result, bool):
+            rows += result
+    return samples, rows
+
+
+def bench_database(info, iterations, rng):
+    user_id = info['heavy_user_id']
+    results = {}
+
+    def record(name, samples, rows=None):
+        results[name] = summarize(samples, rows)
+
+    samples, _ = measure(lambda: database.check_user('user1', datagen.BENCH_PASSWORD),
+                         min(iterations, LOGIN_ITERATIONS))
+    record('check_user', samples)
+
+    added = []
+    samples, _ = measure(lambda: added.append(database.add_product(user_id, datagen.product_name(rng),
+                                                                   rng.randint(1, 100), 9.99)), iterations)
+    record('add_product', samples)
+
+    samples, _ = measure(lambda no: database.update_product(user_id, no, 'updated item', 7, 1.5), len(added),
+                         setup=lambda i: (added[i][0],))
+    record('update_product', samples)
+
+    samples, _ = measure(lambda no: database.receive_stock(user_id, no, 5), len(added),
+                         setup=lambda i: (added[i][0],))
+    record('receive_stock', samples)
+
+    def receive_burst():
+        futures = [database.submit_write(database.receive_stock, user_id, row[0], 5) for row in added]
+        database.flush_writes()
+        return sum(1 for future in futures if future.result())
+
+    samples, rows = measure(receive_burst, 1)
+    record('receive_stock_group_commit', samples, rows)
+
+    for row in added:
+        database.set_product_sku(user_id, row[0], f"BENCH-{row[0]}")
+    samples, _ = measure(lambda no: database.scan_product(user_id, f"BENCH-{no}"), len(added),
+                         setup=lambda i: (added[i][0],))
+    record('scan_product', samples)
+
+    def scan_burst():
+        futures = [database.submit_write(database.scan_product, user_id, f"BENCH-{row[0]}") for row in added]
+        database.flush_writes()
+        return sum(1 for future in futures if future.result())
+
+    samples, rows = measure(scan_burst, 1)
+    record('scan_product_group_commit', samples, rows)
+    samples, rows = measure(lambda: database.stock_as_of(user_id, time.strftime('%Y-%m-%d')),
+                            max(1, iterations // 20))
+    record('stock_as_of', samples, rows)
+
+    added_nos = [row[0] for row in added]
+    samples, rows = measure(lambda: len(database.set_products_quantity(user_id, added_nos, 3)), 1)
+    record('set_products_quantity', samples, rows)
+    samples, rows = measure(lambda: len(database.adjust_products_price(user_id, added_nos, 10)), 1)
+    record('adjust_products_price', samples, rows)
+
+    samples, _ = measure(lambda no: database.delete_product(user_id, no), len(added),
+                         setup=lambda i: (added[i][0],))
+    record('delete_product', samples)
+
+    reads = max(1, iterations // 20)
+    samples, rows = measure(lambda: database.view_products(user_id), reads)
+    record('view_products', samples, rows)
+    samples, rows = measure(lambda: sum(1 for _ in database.iter_products(user_id)), reads)
+    record('iter_products', samples, rows)
+
+    heavy = max(1, info['heavy_products'])
+    samples, rows = measure(lambda after: database.products_page(user_id, after, database.PAGE_SIZE),
+                            iterations, setup=lambda i: (rng.randint(0, heavy),))
+    record('products_page', samples, rows)
+    samples, rows = measure(lambda offset: database.view_products_window(user_id, offset, 40), iterations,
+                            setup=lambda i: (rng.randint(0, heavy),))
+    record('view_products_window', samples, rows)
+    samples, _ = measure(lambda: database.count_products(user_id), iterations)
+    record('count_products', samples)
+    samples, _ = measure(lambda: database.get_inventory_summary(user_id), iterations)
+    record('get_inventory_summary', samples)
+    samples, rows = measure(lambda term: database.search_products(user_id, term), iterations,
+                            setup=lambda i: (rng.choice(datagen.WORDS)[:rng.randint(2, 5)],))
+    record('search_products', samples, rows)
+
+    samples, rows = measure(lambda: database.export_products(io.StringIO(), user_id=user_id)['rows'], 1)
+    record('export_products', samples, rows)
+    samples, rows = measure(lambda: database.export_products(io.StringIO())['rows'], 1)
+    record('export_products_all', samples, rows)
+
+    # Last, so the exports above see the dataset at its generated size.
+    import_user = info['users']
+    csv_text = 'product_name,quantity,price\n' + ''.join(
+        f"{datagen.product_name(rng)},{rng.randint(0, 500)},{rng.uniform(1, 999):.2f}\n" for _ in range(IMPORT_ROWS))
+    samples, rows = measure(lambda: database.import_products(import_user, io.StringIO(csv_text))['imported'], 1)
+    record('import_products', samples, rows)
+    return results
+
+
+def bench_populate_list(info, iterations):
+    try:
+        import main
+        app = main.MainApplication()
+    except Exception as e:
+        return {'skipped': f"No display available: {str(e)}"}
+    try:
+        app.withdraw()
+        app.update()
+        while 'db_ready' not in app.startup_timer.marks:
+            app.update()
+            time.sleep(0.001)
+        app.current_user_id = info['heavy_user_id']
+        app.show_frame("InventoryPage")
+        page = app.frames["InventoryPage"]
+        samples = []
+        for _ in range(max(1, iterations // 10)):
+            started = time.perf_counter()
+            page.populate_list()
+            while not page.tree.get_children() or app.db_executor.busy:
+                app.update()
+            samples.append(time.perf_counter() - started)
+        return summarize(samples, len(page.tree.get_children()) * len(samples))
+    finally:
+        app.on_close()
+
+
+def run(sizes, iterations, skip_gui=False, regenerate=False, seed=1234):
+    rng = random.Random(seed)
+    database_file = database.DB_FILE
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'iterations': iterations,
+        },
+        'results': {},
+    }
+    for size in sizes:
+        products = datagen.parse_size(size)
+        info = datagen.scratch_copy(datagen.ensure_dataset(products, regenerate=regenerate))
+        try:
+            database.configure(db_file=info['path'])
+            database.init_db()
+            results = bench_database(info, iterations, rng)
+            if not skip_gui:
+                results['populate_list'] = bench_populate_list(info, iterations)
+            report['results'][size] = results
+        finally:
+            database.configure(db_file=database_file)
+            datagen.remove_scratch(info['path'])
+    return report
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    regressions = []
+    lines = []
+    for size, operations in current['results'].items():
+        for name, stats in operations.items():
+            base = baseline.get('results', {}).get(size, {}).get(name)
+            if not base or 'p50_ms' not in base or 'p50_ms' not in stats:
+                continue
+            for metric in ('p50_ms', 'p99_ms'):
+                before, after = base[metric], stats[metric]
+                change = (after - before) / before if before > 0 else 0.0
+                flag = 'REGRESSION' if change > threshold else ''
+                lines.append(f"{size:>6} {name:<24} {metric:<7} {before:>10.3f} -> {after:>10.3f} "
+                             f"({change * 100:+6.1f}%) {flag}")
+                if flag:
+                    regressions.append((size, name, metric, change))
+    return regressions, lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark database.py and the InventoryPage render path.")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Comma-separated product counts, e.g. 1k,100k,1m")
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument('--output', help="Write JSON results to this file (default: stdout)")
+    parser.add_argument('--skip-gui', action='store_true', help="Skip the Tk populate_list benchmark")
+    parser.add_argument('--regenerate', action='store_true', help="Rebuild the synthetic databases")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help="Compare two result files instead of running")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown flagged as a regression (default 0.10)")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        regressions, lines = compare(baseline, current, args.threshold)
+        print("\n".join(lines))
+        print(f"{len(regressions)} regression(s) over {args.threshold * 100:.0f}%")
+        return 1 if regressions else 0
+
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    report = run(sizes, args.iterations, skip_gui=args.skip_gui, regenerate=args.regenerate)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
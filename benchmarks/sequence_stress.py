@@ -0,0 +1,122 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import database
+
+DEFAULT_PROCESSES = 8
+DEFAULT_OPERATIONS = 500
+DEFAULT_USERS = 2
+IMPORT_ROWS = 200
+STRESS_PASSWORD = 'stress-password'
+
+
+def _worker(args):
+    db_file, user_ids, worker, operations = args
+    database.configure(db_file=db_file)
+    added = 0
+    imported = 0
+    errors = {}
+    for i in range(operations):
+        user_id = user_ids[(worker + i // 4) % len(user_ids)]
+        try:
+            # Every fourth call on odd workers is a small import, so block
+            # reservations race single allocations for the same user.
+            if worker % 2 and i % 4 == 0:
+                text = 'product_name,quantity,price\n' + ''.join(
+                    f"stress {worker}-{i}-{n},1,1.5\n" for n in range(IMPORT_ROWS))
+                imported += database.import_products(user_id, io.StringIO(text), batch_size=IMPORT_ROWS // 4)['imported']
+            elif i % 10 == 9:
+                first, last = database.reserve_product_nos(user_id, 5)
+                errors.setdefault('reserved', 0)
+                errors['reserved'] += last - first + 1
+            else:
+                database.add_product(user_id, f"stress {worker}-{i}", 1, 1.5)
+                added += 1
+        except Exception as e:
+            key = str(e)[:100]
+            errors[key] = errors.get(key, 0) + 1
+    return added, imported, errors
+
+
+def check(db_file, user_ids):
+    conn = sqlite3.connect(db_file)
+    try:
+        report = {}
+        for user_id in user_ids:
+            count, distinct, highest = conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT product_no), MAX(product_no) FROM inventory WHERE user_id = ?",
+                (user_id,)).fetchone()
+            (next_no,) = conn.execute("SELECT next_no FROM product_sequences WHERE user_id = ?",
+                                      (user_id,)).fetchone()
+            report[user_id] = {'rows': count, 'distinct_product_nos': distinct, 'max_product_no': highest,
+                               'next_no': next_no}
+        return report
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hammer product_no allocation from many writer processes.")
+    parser.add_argument('--db', default=os.path.join(ROOT, 'benchmarks', 'data', 'sequence_stress.db'))
+    parser.add_argument('--processes', type=int, default=DEFAULT_PROCESSES)
+    parser.add_argument('--operations', type=int, default=DEFAULT_OPERATIONS, help="Operations per process")
+    parser.add_argument('--users', type=int, default=DEFAULT_USERS, help="Users the processes share")
+    args = parser.parse_args(argv)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    database.configure(db_file=args.db)
+    database.init_db()
+    user_ids = []
+    for n in range(args.users):
+        database.register_user(f"stress{n}", STRESS_PASSWORD)
+        user_ids.append(database.check_user(f"stress{n}", STRESS_PASSWORD))
+    database.configure()
+
+    started = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+        results = pool.map(_worker, [(args.db, user_ids, worker, args.operations)
+                                     for worker in range(args.processes)])
+    seconds = time.perf_counter() - started
+    added = sum(result[0] for result in results)
+    imported = sum(result[1] for result in results)
+    errors = {}
+    for _, _, worker_errors in results:
+        for key, count in worker_errors.items():
+            errors[key] = errors.get(key, 0) + count
+    reserved = errors.pop('reserved', 0)
+    users = check(args.db, user_ids)
+    rows = sum(user['rows'] for user in users.values())
+    collisions = sum(count for key, count in errors.items() if 'UNIQUE' in key)
+    duplicates = sum(user['rows'] - user['distinct_product_nos'] for user in users.values())
+    overrun = [user_id for user_id, user in users.items() if user['max_product_no'] >= user['next_no']]
+    ok = not collisions and not duplicates and not overrun and rows == added + imported
+    print(json.dumps({
+        'processes': args.processes,
+        'seconds': seconds,
+        'added': added,
+        'imported': imported,
+        'reserved': reserved,
+        'rows': rows,
+        'collisions': collisions,
+        'duplicate_product_nos': duplicates,
+        'errors': errors,
+        'users': users,
+        'ok': ok,
+    }, indent=2))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
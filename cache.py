@@ -0,0 +1,219 @@
+import array
+import bisect
+import collections
+import sys
+import threading
+
+DEFAULT_MAX_BYTES = 64 << 20
+# Rough per-row cost (three array slots, a list slot and a short str), used
+# to decide whether a user's inventory is worth loading at all.
+ROW_ESTIMATE_BYTES = 100
+
+
+def _name_bytes(name):
+    return sys.getsizeof(name) + 8
+
+
+class ProductColumns:
+    __slots__ = ('product_nos', 'names', 'quantities', 'prices', 'version', 'data_version', 'nbytes')
+
+    def __init__(self, rows, version, data_version):
+        self.product_nos = array.array('q', (row[0] for row in rows))
+        self.names = [row[1] for row in rows]
+        self.quantities = array.array('q', (row[2] for row in rows))
+        self.prices = array.array('d', (row[3] for row in rows))
+        self.version = version
+        self.data_version = data_version
+        self.nbytes = 24 * len(self.names) + sum(_name_bytes(name) for name in self.names)
+
+    def __len__(self):
+        return len(self.product_nos)
+
+    def copy(self):
+        other = ProductColumns((), self.version, self.data_version)
+        other.product_nos = array.array('q', self.product_nos)
+        other.names = list(self.names)
+        other.quantities = array.array('q', self.quantities)
+        other.prices = array.array('d', self.prices)
+        other.nbytes = self.nbytes
+        return other
+
+    def row(self, index):
+        return (self.product_nos[index], self.names[index], self.quantities[index], self.prices[index])
+
+    def rows(self, start=0, end=None):
+        end = len(self) if end is None else min(end, len(self))
+        return list(zip(self.product_nos[start:end], self.names[start:end],
+                        self.quantities[start:end], self.prices[start:end]))
+
+    def position(self, product_no):
+        pos = bisect.bisect_left(self.product_nos, product_no)
+        return pos, pos < len(self) and self.product_nos[pos] == product_no
+
+    def page(self, after_product_no, limit, direction):
+        if direction == 'asc':
+            start = 0 if after_product_no is None else bisect.bisect_right(self.product_nos, after_product_no)
+            return self.rows(start, start + limit)
+        end = len(self) if after_product_no is None else bisect.bisect_left(self.product_nos, after_product_no)
+        rows = self.rows(max(0, end - limit), end)
+        rows.reverse()
+        return rows
+
+    def insert(self, row):
+        pos, found = self.position(row[0])
+        if found:
+            return self.update(row)
+        self.product_nos.insert(pos, row[0])
+        self.names.insert(pos, row[1])
+        self.quantities.insert(pos, row[2])
+        self.prices.insert(pos, row[3])
+        self.nbytes += 24 + _name_bytes(row[1])
+
+    def update(self, row):
+        pos, found = self.position(row[0])
+        if not found:
+            return self.insert(row)
+        self.nbytes += _name_bytes(row[1]) - _name_bytes(self.names[pos])
+        self.names[pos] = row[1]
+        self.quantities[pos] = row[2]
+        self.prices[pos] = row[3]
+
+    def delete(self, product_no):
+        pos, found = self.position(product_no)
+        if not found:
+            return
+        self.nbytes -= 24 + _name_bytes(self.names[pos])
+        del self.product_nos[pos]
+        del self.names[pos]
+        del self.quantities[pos]
+        del self.prices[pos]
+
+    def update_many(self, rows):
+        for row in rows:
+            self.update(row)
+
+    def delete_many(self, product_nos):
+        # Rebuilds each column once instead of shifting it once per product.
+        positions = sorted(pos for pos, found in map(self.position, set(product_nos)) if found)
+        if not positions:
+            return
+        self.nbytes -= sum(24 + _name_bytes(self.names[pos]) for pos in positions)
+        spans = list(zip([0] + [pos + 1 for pos in positions], positions + [len(self)]))
+        self.product_nos = _without(self.product_nos, spans)
+        self.names = _without(self.names, spans)
+        self.quantities = _without(self.quantities, spans)
+        self.prices = _without(self.prices, spans)
+
+
+def _without(values, spans):
+    kept = values[:0]
+    for start, end in spans:
+        kept += values[start:end]
+    return kept
+
+
+class ReadCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        # Versions outlive evicted entries so a load that raced with a write
+        # is still recognised as stale.
+        self._versions = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def fits(self, row_count):
+        return row_count * ROW_ESTIMATE_BYTES <= self.max_bytes
+
+    def _current(self, user_id):
+        return self._epoch, self._versions.get(user_id, 0)
+
+    def version(self, user_id):
+        with self._lock:
+            return self._current(user_id)
+
+    def get(self, user_id, data_version):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry.data_version == data_version:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                self._drop(user_id)
+            self.misses += 1
+            return None
+
+    def read(self, entry, func, *args):
+        # Writers patch entries in place, so multi-column reads take the lock
+        # to avoid seeing a row half inserted.
+        with self._lock:
+            return func(entry, *args)
+
+    def put(self, user_id, rows, version, data_version):
+        entry = ProductColumns(rows, version, data_version)
+        with self._lock:
+            if version != self._current(user_id) or entry.nbytes > self.max_bytes:
+                return entry
+            if user_id in self._entries:
+                self._drop(user_id)
+            self._entries[user_id] = entry
+            self.nbytes += entry.nbytes
+            self._evict()
+        return entry
+
+    def _drop(self, user_id):
+        self.nbytes -= self._entries.pop(user_id).nbytes
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+
+    def _patch(self, user_id, apply):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            before = entry.nbytes
+            apply(entry)
+            entry.version = self._current(user_id)
+            self.nbytes += entry.nbytes - before
+            self._evict()
+
+    def insert(self, user_id, row):
+        self._patch(user_id, lambda entry: entry.insert(row))
+
+    def update(self, user_id, row):
+        self._patch(user_id, lambda entry: entry.update(row))
+
+    def delete(self, user_id, product_no):
+        self._patch(user_id, lambda entry: entry.delete(product_no))
+
+    def update_many(self, user_id, rows):
+        self._patch(user_id, lambda entry: entry.update_many(rows))
+
+    def delete_many(self, user_id, product_nos):
+        self._patch(user_id, lambda entry: entry.delete_many(product_nos))
+
+    def invalidate(self, user_id=None):
+        if user_id is None:
+            return self.clear()
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            if user_id in self._entries:
+                self._drop(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'users': len(self._entries), 'bytes': self.nbytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,219 @@
+try:
+    import numpy
+except ImportError:
+    # Sorting and filtering fall back to pure Python, which is fine for a few
+    # hundred thousand rows but noticeably slower beyond that.
+    numpy = None
+
+import cache
+
+SORT_COLUMNS = ('product_no', 'product_name', 'quantity', 'price')
+
+
+class ProductView:
+    def __init__(self, columns, order):
+        self.columns = columns
+        self.order = order
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.columns.row(int(i)) for i in self.order[index]]
+        return self.columns.row(int(self.order[index]))
+
+    def __iter__(self):
+        for i in self.order:
+            yield self.columns.row(int(i))
+
+    def product_nos(self):
+        return [self.columns.product_nos[int(i)] for i in self.order]
+
+
+class ColumnarSnapshot:
+    def __init__(self, columns):
+        self.columns = columns
+        self._orders = {}
+        self._arrays = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(cache.ProductColumns(sorted(rows, key=lambda row: row[0]), None, None))
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __contains__(self, product_no):
+        return self.columns.position(product_no)[1]
+
+    def _changed(self):
+        self._orders.clear()
+        self._arrays = None
+
+    # Single-row edits patch the cached orders instead of dropping them, so
+    # an edit under an active sort costs a binary search and an array shift
+    # rather than a full re-sort. Bulk edits past this size just re-sort.
+    PATCH_LIMIT = 32
+
+    def _key(self, sort_by):
+        # Ties keep product_no (column) order, as the stable sorts do.
+        if sort_by == 'product_name':
+            names = self.columns.names
+            return lambda i: (names[i].casefold(), i)
+        values = self.columns.quantities if sort_by == 'quantity' else self.columns.prices
+        return lambda i: (values[i], i)
+
+    def _search(self, order, key, target):
+        low, high = 0, len(order)
+        while low < high:
+            mid = (low + high) // 2
+            if key(int(order[mid])) < target:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def _take(self, sort_by, pos):
+        order = self._orders[sort_by]
+        key = self._key(sort_by)
+        k = self._search(order, key, key(pos))
+        if numpy is not None:
+            self._orders[sort_by] = numpy.delete(order, k)
+        else:
+            del order[k]
+
+    def _put(self, sort_by, pos):
+        order = self._orders[sort_by]
+        key = self._key(sort_by)
+        k = self._search(order, key, key(pos))
+        if numpy is not None:
+            self._orders[sort_by] = numpy.insert(order, k, pos)
+        else:
+            order.insert(k, pos)
+
+    def _shift(self, pos, step):
+        # Positions at or after pos move by step after a row is inserted or
+        # removed there.
+        for sort_by, order in self._orders.items():
+            if numpy is not None:
+                order[order >= pos] += step
+            else:
+                self._orders[sort_by] = [i + step if i >= pos else i for i in order]
+
+    def insert(self, row):
+        pos, found = self.columns.position(row[0])
+        if found:
+            return self.update(row)
+        self.columns.insert(row)
+        # The identity order for product_no is cheaper to rebuild than patch.
+        self._orders.pop('product_no', None)
+        self._shift(pos, 1)
+        for sort_by in self._orders:
+            self._put(sort_by, pos)
+        if self._arrays is not None:
+            self._arrays = (numpy.insert(self._arrays[0], pos, row[2]), numpy.insert(self._arrays[1], pos, row[3]))
+
+    def update(self, row):
+        pos, found = self.columns.position(row[0])
+        if not found:
+            return self.insert(row)
+        old = self.columns.row(pos)
+        changed = [sort_by for sort_by, column in (('product_name', 1), ('quantity', 2), ('price', 3))
+                   if sort_by in self._orders and old[column] != row[column]]
+        for sort_by in changed:
+            self._take(sort_by, pos)
+        self.columns.update(row)
+        for sort_by in changed:
+            self._put(sort_by, pos)
+        if self._arrays is not None:
+            self._arrays[0][pos] = row[2]
+            self._arrays[1][pos] = row[3]
+
+    def delete(self, product_no):
+        pos, found = self.columns.position(product_no)
+        if not found:
+            return
+        self._orders.pop('product_no', None)
+        for sort_by in self._orders:
+            self._take(sort_by, pos)
+        self.columns.delete(product_no)
+        self._shift(pos + 1, -1)
+        if self._arrays is not None:
+            self._arrays = (numpy.delete(self._arrays[0], pos), numpy.delete(self._arrays[1], pos))
+
+    def update_many(self, rows):
+        if len(rows) > self.PATCH_LIMIT:
+            self.columns.update_many(rows)
+            self._changed()
+            return
+        for row in rows:
+            self.update(row)
+
+    def delete_many(self, product_nos):
+        if len(product_nos) > self.PATCH_LIMIT:
+            self.columns.delete_many(product_nos)
+            self._changed()
+            return
+        for product_no in product_nos:
+            self.delete(product_no)
+
+    def _numeric(self):
+        # Copies rather than numpy.frombuffer views: an array.array that is
+        # exporting its buffer can no longer grow, which would break insert().
+        if self._arrays is None:
+            self._arrays = (numpy.array(self.columns.quantities, dtype=numpy.int64),
+                            numpy.array(self.columns.prices, dtype=numpy.float64))
+        return self._arrays
+
+    def _ascending(self, sort_by):
+        order = self._orders.get(sort_by)
+        if order is not None:
+            return order
+        n = len(self.columns)
+        if sort_by == 'product_no':
+            # Columns are kept in product_no order already.
+            order = numpy.arange(n) if numpy is not None else range(n)
+        elif sort_by == 'product_name':
+            names = self.columns.names
+            order = sorted(range(n), key=lambda i: names[i].casefold())
+            if numpy is not None:
+                order = numpy.array(order, dtype=numpy.int64)
+        elif numpy is not None:
+            quantities, prices = self._numeric()
+            order = numpy.argsort(quantities if sort_by == 'quantity' else prices, kind='stable')
+        else:
+            values = self.columns.quantities if sort_by == 'quantity' else self.columns.prices
+            order = sorted(range(n), key=values.__getitem__)
+        self._orders[sort_by] = order
+        return order
+
+    def select(self, sort_by='product_no', descending=False, quantity_min=None, quantity_max=None,
+               price_min=None, price_max=None):
+        if sort_by not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort_by}")
+        order = self._ascending(sort_by)
+        if descending:
+            order = order[::-1]
+        bounds = (quantity_min, quantity_max, price_min, price_max)
+        if all(bound is None for bound in bounds):
+            return ProductView(self.columns, order)
+        if numpy is not None:
+            quantities, prices = self._numeric()
+            mask = numpy.ones(len(self.columns), dtype=bool)
+            if quantity_min is not None:
+                mask &= quantities >= quantity_min
+            if quantity_max is not None:
+                mask &= quantities <= quantity_max
+            if price_min is not None:
+                mask &= prices >= price_min
+            if price_max is not None:
+                mask &= prices <= price_max
+            return ProductView(self.columns, order[mask[order]])
+        quantities, prices = self.columns.quantities, self.columns.prices
+        q_low = float('-inf') if quantity_min is None else quantity_min
+        q_high = float('inf') if quantity_max is None else quantity_max
+        p_low = float('-inf') if price_min is None else price_min
+        p_high = float('inf') if price_max is None else price_max
+        return ProductView(self.columns, [i for i in order
+                                          if q_low <= quantities[i] <= q_high and p_low <= prices[i] <= p_high])
@@ -0,0 +1,234 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DEFAULT_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,
+    'mmap_size': 268435456,
+    'busy_timeout': 5000,
+    'foreign_keys': 'ON',
+}
+
+DEFAULT_READERS = 4
+
+
+class ConnectionManager:
+    def __init__(self, db_file, pragmas=None, readers=DEFAULT_READERS, factory=sqlite3.Connection):
+        self.db_file = db_file
+        self.factory = factory
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+        self.max_readers = max(1, readers)
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._depth = 0
+        self._on_commit = []
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
+        self._trace_callback = None
+        self._trace_version = 0
+        self._reader_trace = {}
+        self._closed = False
+        self._retired = False
+        self._prepare()
+
+    def _prepare(self):
+        # Creates the file and switches it to WAL once, up front, so opening
+        # a read-only reader never has to wait on the writer lock.
+        conn = sqlite3.connect(self.db_file, isolation_level=None)
+        try:
+            conn.execute(f"PRAGMA busy_timeout = {self.pragmas.get('busy_timeout', 0)}")
+            conn.execute("PRAGMA journal_mode = WAL")
+        finally:
+            conn.close()
+
+    def _apply_pragmas(self, conn):
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+
+    def _open_writer(self):
+        conn = sqlite3.connect(self.db_file, isolation_level=None, check_same_thread=False,
+                               factory=self.factory)
+        conn.set_trace_callback(self._trace_callback)
+        conn.execute("PRAGMA journal_mode = WAL")
+        self._apply_pragmas(conn)
+        return conn
+
+    def _open_reader(self):
+        uri = f"file:{self.db_file}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, isolation_level=None, check_same_thread=False,
+                               factory=self.factory)
+        self._apply_pragmas(conn)
+        return conn
+
+    def _ensure_writer(self):
+        with self._writer_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection manager is closed")
+            if self._writer is None:
+                self._writer = self._open_writer()
+            return self._writer
+
+    @property
+    def lock(self):
+        return self._writer_lock
+
+    def set_trace_callback(self, callback):
+        with self._writer_lock:
+            self._trace_callback = callback
+            self._trace_version += 1
+            if self._writer is not None:
+                self._writer.set_trace_callback(callback)
+
+    def data_version(self, blocking=True):
+        # Changes only when another connection or process commits; commits
+        # made through this manager's writer leave it untouched. Returns None
+        # when blocking is False and the writer is busy on another thread.
+        if not self._writer_lock.acquire(blocking):
+            return None
+        try:
+            # A retired manager reopens its writer per use, and a new
+            # connection's data_version says nothing about the old one's.
+            if self._retired:
+                return None
+            return self._ensure_writer().execute("PRAGMA data_version").fetchone()[0]
+        finally:
+            self._writer_lock.release()
+
+    def on_commit(self, callback):
+        # Runs callback once the enclosing write transaction commits, still
+        # holding the writer lock; it is dropped if that transaction (or the
+        # savepoint it was registered in) rolls back.
+        with self._writer_lock:
+            if self._depth == 0:
+                callback()
+            else:
+                self._on_commit.append(callback)
+
+    @contextmanager
+    def writer(self):
+        with self._writer_lock:
+            try:
+                yield from self._write_transaction()
+            finally:
+                if self._retired and self._depth == 0:
+                    self._close_writer()
+
+    def _write_transaction(self):
+        conn = self._ensure_writer()
+        if self._depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        else:
+            conn.execute(f"SAVEPOINT sp_{self._depth}")
+        pending = len(self._on_commit)
+        self._depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._depth -= 1
+            del self._on_commit[pending:]
+            if self._depth == 0:
+                conn.execute("ROLLBACK")
+            else:
+                conn.execute(f"ROLLBACK TO sp_{self._depth}")
+                conn.execute(f"RELEASE sp_{self._depth}")
+            raise
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                conn.execute("COMMIT")
+            except BaseException:
+                self._on_commit = []
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            callbacks, self._on_commit = self._on_commit, []
+            for callback in callbacks:
+                callback()
+        else:
+            conn.execute(f"RELEASE sp_{self._depth}")
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _acquire_reader(self):
+        # None in the pool marks a slot freed by a reader that was closed
+        # instead of returned; the waiter goes back to open one in its place.
+        conn = None
+        while conn is None:
+            try:
+                conn = self._readers.get_nowait()
+            except queue.Empty:
+                conn = None
+            if conn is None:
+                with self._reader_lock:
+                    if self._closed:
+                        raise sqlite3.ProgrammingError("Connection manager is closed")
+                    if self._reader_count < self.max_readers:
+                        conn = self._open_reader()
+                        self._reader_count += 1
+            if conn is None:
+                conn = self._readers.get()
+        # Readers pick up a changed trace callback the next time they are handed out.
+        if self._reader_trace.get(id(conn)) != self._trace_version:
+            conn.set_trace_callback(self._trace_callback)
+            self._reader_trace[id(conn)] = self._trace_version
+        return conn
+
+    @contextmanager
+    def reader(self):
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            if self._closed or self._retired:
+                self._discard_reader(conn)
+            else:
+                self._readers.put(conn)
+
+    def _discard_reader(self, conn, notify=True):
+        conn.close()
+        with self._reader_lock:
+            self._reader_count -= 1
+        self._reader_trace.pop(id(conn), None)
+        if notify:
+            self._readers.put(None)
+
+    def _drain_readers(self):
+        markers = 0
+        while True:
+            try:
+                conn = self._readers.get_nowait()
+            except queue.Empty:
+                break
+            if conn is None:
+                markers += 1
+            else:
+                self._discard_reader(conn, notify=False)
+        # Markers belong to threads that may be about to wait for them.
+        for _ in range(markers):
+            self._readers.put(None)
+
+    def retire(self):
+        # For a manager dropped from a pool that other threads may still
+        # hold: idle connections close now, busy ones when they are released,
+        # and any later use opens a connection just for that use.
+        with self._writer_lock:
+            self._retired = True
+            if self._depth == 0:
+                self._close_writer()
+        self._drain_readers()
+
+    def close(self):
+        with self._writer_lock:
+            self._closed = True
+            self._close_writer()
+        self._drain_readers()
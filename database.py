@@ -1,200 +1,1199 @@
-import sqlite3
-
-DB_FILE = 'inventory.db'
-
-def connect_db():
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.execute("PRAGMA foreign_keys = ON")
-        return conn
-    except sqlite3.Error as e:
-        raise Exception(f"Failed to connect to database: {str(e)}")
-
-def create_tables():
-    conn = None
-    try:
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL UNIQUE,
-            password TEXT NOT NULL
-        )
-        ''')
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS inventory (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            product_name TEXT NOT NULL,
-            quantity INTEGER NOT NULL CHECK(quantity >= 0),
-            price REAL NOT NULL CHECK(price >= 0),
-            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-        )
-        ''')
-        cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_user_id ON inventory(user_id)
-        ''')
-        cursor.execute("PRAGMA table_info(inventory)")
-        cols = [row[1] for row in cursor.fetchall()]
-        if 'product_no' not in cols:
-            cursor.execute("ALTER TABLE inventory ADD COLUMN product_no INTEGER")
-            cursor.execute("SELECT DISTINCT user_id FROM inventory")
-            user_ids = [row[0] for row in cursor.fetchall()]
-            for uid in user_ids:
-                cursor.execute("SELECT id FROM inventory WHERE user_id = ? ORDER BY id ASC", (uid,))
-                ids = [row[0] for row in cursor.fetchall()]
-                for idx, inv_id in enumerate(ids, start=1):
-                    cursor.execute("UPDATE inventory SET product_no = ? WHERE id = ?", (idx, inv_id))
-        cursor.execute('''
-        CREATE UNIQUE INDEX IF NOT EXISTS ux_inventory_user_product_no
-        ON inventory(user_id, product_no)
-        ''')
-        conn.commit()
-    except sqlite3.Error as e:
-        if conn:
-            conn.rollback()
-        raise Exception(f"Failed to create tables: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
-
-def register_user(username, password):
-    if not username or not password:
-        raise ValueError("Username and password are required")
-    
-    conn = None
-    try:
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)",
-                      (username.strip(), password))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
-    except sqlite3.Error as e:
-        if conn:
-            conn.rollback()
-        raise Exception(f"Database error during registration: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
-
-def check_user(username, password):
-    if not username or not password:
-        return None
-    
-    conn = None
-    try:
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, password FROM users WHERE username = ?", (username.strip(),))
-        user_data = cursor.fetchone()
-        if user_data:
-            user_id, stored_password = user_data
-            if stored_password == password:
-                return user_id
-        return None
-    except sqlite3.Error as e:
-        raise Exception(f"Database error during login: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
-
-def add_product(user_id, name, quantity, price):
-    if not user_id:
-        raise ValueError("User ID is required")
-    if not name or not name.strip():
-        raise ValueError("Product name is required")
-    if quantity < 0:
-        raise ValueError("Quantity cannot be negative")
-    if price < 0:
-        raise ValueError("Price cannot be negative")
-    
-    conn = None
-    try:
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT COALESCE(MAX(product_no), 0) + 1 FROM inventory WHERE user_id = ?", (user_id,))
-        next_no = cursor.fetchone()[0]
-        cursor.execute("INSERT INTO inventory (user_id, product_name, quantity, price, product_no) VALUES (?, ?, ?, ?, ?)",
-                      (user_id, name.strip(), quantity, price, next_no))
-        conn.commit()
-    except sqlite3.Error as e:
-        if conn:
-            conn.rollback()
-        raise Exception(f"Failed to add product: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
-
-def view_products(user_id):
-    if not user_id:
-        raise ValueError("User ID is required")
-    
-    conn = None
-    try:
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT product_no, product_name, quantity, price FROM inventory WHERE user_id = ? ORDER BY product_no DESC", 
-                      (user_id,))
-        rows = cursor.fetchall()
-        return rows
-    except sqlite3.Error as e:
-        raise Exception(f"Failed to retrieve products: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
-
-def update_product(user_id, product_no, name, quantity, price):
-    if not user_id or not product_no:
-        raise ValueError("User ID and product number are required")
-    if not name or not name.strip():
-        raise ValueError("Product name is required")
-    if quantity < 0:
-        raise ValueError("Quantity cannot be negative")
-    if price < 0:
-        raise ValueError("Price cannot be negative")
-    
-    conn = None
-    try:
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE inventory SET product_name = ?, quantity = ?, price = ? WHERE user_id = ? AND product_no = ?",
-                      (name.strip(), quantity, price, user_id, product_no))
-        if cursor.rowcount == 0:
-            raise ValueError(f"Product with number {product_no} not found for this user")
-        conn.commit()
-    except sqlite3.Error as e:
-        if conn:
-            conn.rollback()
-        raise Exception(f"Failed to update product: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
-
-def delete_product(user_id, product_no):
-    if not user_id or not product_no:
-        raise ValueError("User ID and product number are required")
-    
-    conn = None
-    try:
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM inventory WHERE user_id = ? AND product_no = ?", (user_id, product_no))
-        if cursor.rowcount == 0:
-            raise ValueError(f"Product with number {product_no} not found for this user")
-        conn.commit()
-    except sqlite3.Error as e:
-        if conn:
-            conn.rollback()
-        raise Exception(f"Failed to delete product: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
-
-try:
-    create_tables()
-except Exception as e:
-    print(f"Warning: Database initialization failed: {str(e)}")
+import atexit
+import csv
+import datetime
+import io
+import json
+import math
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+import cache
+import columnar
+import connection
+import instrumentation
+import migrations
+import passwords
+import shards
+import write_batcher
+
+DB_FILE = 'inventory.db'
+PAGE_SIZE = 500
+IMPORT_BATCH_SIZE = 10000
+# Rejected lines kept with their reason; the rest are only counted.
+IMPORT_MAX_ERRORS = 1000
+EXPORT_FETCH_SIZE = 5000
+EXPORT_BUFFER_SIZE = 1 << 20
+SEARCH_LIMIT = 1000
+# Product numbers bound per statement by the bulk edits.
+BULK_CHUNK_SIZE = 500
+CACHE_MAX_BYTES = cache.DEFAULT_MAX_BYTES
+MOVEMENT_RETENTION_DAYS = 90
+CHANGE_FEED_LIMIT = 1000
+CHANGE_LOG_KEEP = 100000
+WRITE_BATCH_MAX = write_batcher.DEFAULT_MAX_BATCH
+WRITE_BATCH_WINDOW_MS = write_batcher.DEFAULT_WINDOW_MS
+
+_manager = None
+_manager_lock = threading.Lock()
+_initialized = False
+_init_lock = threading.Lock()
+_pragmas = None
+_readers = connection.DEFAULT_READERS
+_cache = cache.ReadCache(CACHE_MAX_BYTES)
+_batcher = None
+_batch_max = WRITE_BATCH_MAX
+_batch_window_ms = WRITE_BATCH_WINDOW_MS
+# Sharded mode keeps users in DB_FILE (the catalog) and each user's rows in
+# their own file under _shard_dir.
+_shard_dir = None
+_max_open_shards = shards.DEFAULT_MAX_OPEN
+_shards = None
+# Applied to every manager, including shards opened while it is set.
+_trace_callback = None
+
+def configure(db_file=None, pragmas=None, readers=None, cache_bytes=None, batch_max=None, batch_window_ms=None,
+              shard_dir=None, max_open_shards=None):
+    global DB_FILE, _manager, _pragmas, _readers, _initialized, _batcher, _batch_max, _batch_window_ms
+    global _shard_dir, _max_open_shards, _shards
+    # Queued writes belong to the current file, so they are committed first.
+    with _manager_lock:
+        batcher, _batcher = _batcher, None
+    if batcher is not None:
+        batcher.close()
+    with _manager_lock:
+        _initialized = False
+        _cache.clear()
+        if cache_bytes is not None:
+            _cache.max_bytes = cache_bytes
+        if _manager is not None:
+            _manager.close()
+            _manager = None
+        if _shards is not None:
+            _shards.close()
+            _shards = None
+        if shard_dir is not None:
+            _shard_dir = shard_dir or None
+        if max_open_shards is not None:
+            _max_open_shards = max_open_shards
+        if db_file is not None:
+            DB_FILE = db_file
+        if pragmas is not None:
+            _pragmas = pragmas
+        if readers is not None:
+            _readers = readers
+        if batch_max is not None:
+            _batch_max = batch_max
+        if batch_window_ms is not None:
+            _batch_window_ms = batch_window_ms
+
+def connect_db(user_id=None):
+    global _manager, _shards
+    with _manager_lock:
+        if user_id is not None and _shard_dir is not None:
+            if _shards is None:
+                _shards = shards.ShardMap(_shard_dir, _open_shard, max_open=_max_open_shards)
+            shard_map = _shards
+        else:
+            if _manager is None:
+                _manager = connection.ConnectionManager(DB_FILE, pragmas=_pragmas, readers=_readers,
+                                                        factory=instrumentation.InstrumentedConnection)
+                if _trace_callback is not None:
+                    _manager.set_trace_callback(_trace_callback)
+            return _manager
+    return shard_map.get(user_id)
+
+def _open_shard(path, user_id):
+    with connect_db().reader() as conn:
+        row = conn.execute("SELECT username FROM users WHERE id = ?", (user_id,)).fetchone()
+    if row is None:
+        raise ValueError(f"User {user_id} not found")
+    manager = connection.ConnectionManager(path, pragmas=_pragmas, readers=_readers,
+                                           factory=instrumentation.InstrumentedConnection)
+    if _trace_callback is not None:
+        manager.set_trace_callback(_trace_callback)
+    migrations.migrate(manager)
+    with manager.writer() as conn:
+        # A password-less copy of the user row keeps the shard's foreign keys
+        # intact; credentials stay in the catalog.
+        conn.execute("INSERT OR IGNORE INTO users (id, username, password) VALUES (?, ?, '')", (user_id, row[0]))
+    # A reopened shard starts a new data_version sequence, so cached rows
+    # validated against the old one cannot be trusted.
+    _cache.invalidate(user_id)
+    return manager
+
+def _all_managers():
+    # A generator, so maintenance over thousands of shards only keeps the
+    # LRU's worth of them open.
+    yield connect_db()
+    if _shard_dir is not None:
+        for user_id in shards.shard_user_ids(_shard_dir):
+            yield connect_db(user_id)
+
+def database_files():
+    files = [DB_FILE]
+    if _shard_dir is not None:
+        files.extend(shards.shard_path(_shard_dir, user_id) for user_id in shards.shard_user_ids(_shard_dir))
+    return files
+
+def set_trace_callback(callback):
+    global _trace_callback
+    with _manager_lock:
+        _trace_callback = callback
+        shard_map = _shards
+    connect_db().set_trace_callback(callback)
+    if shard_map is not None:
+        shard_map.set_trace_callback(callback)
+
+def shard_directory():
+    return _shard_dir
+
+def shard_stats():
+    with _manager_lock:
+        shard_map = _shards
+    return shard_map.stats() if shard_map is not None else None
+
+def _write_batcher():
+    global _batcher
+    with _manager_lock:
+        if _batcher is None:
+            _batcher = write_batcher.WriteBatcher(connect_db, max_batch=_batch_max, window_ms=_batch_window_ms)
+            atexit.register(_batcher.close)
+        return _batcher
+
+def submit_write(func, *args, **kwargs):
+    # Group commit: the write is queued and committed together with the others
+    # that arrive within the batch window. The returned future resolves to the
+    # function's result (or raises its error) once the batch has committed.
+    return _write_batcher().submit(func, *args, **kwargs)
+
+def flush_writes(timeout=None):
+    with _manager_lock:
+        batcher = _batcher
+    return batcher.flush(timeout) if batcher is not None else True
+
+def write_batch_stats():
+    with _manager_lock:
+        batcher = _batcher
+    if batcher is None:
+        return {'batches': 0, 'writes': 0, 'largest_batch': 0, 'average_batch': 0.0, 'pending': 0}
+    return batcher.stats()
+
+def init_db():
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return False
+        create_tables()
+        _initialized = True
+        return True
+
+@instrumentation.instrumented()
+def create_tables():
+    try:
+        migrations.migrate(connect_db())
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to create tables: {str(e)}")
+
+@instrumentation.instrumented()
+def register_user(username, password):
+    if not username or not password:
+        raise ValueError("Username and password are required")
+    
+    password_hash = passwords.hash_async(password).result()
+    try:
+        with connect_db().writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)",
+                          (username.strip(), password_hash))
+        return True
+    except sqlite3.IntegrityError:
+        return False
+    except sqlite3.Error as e:
+        raise Exception(f"Database error during registration: {str(e)}")
+
+@instrumentation.instrumented()
+def check_user(username, password):
+    if not username or not password:
+        return None
+    
+    try:
+        with connect_db().reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, password FROM users WHERE username = ?", (username.strip(),))
+            user_data = cursor.fetchone()
+        if user_data:
+            user_id, stored_password = user_data
+            if passwords.verify_async(password, stored_password).result():
+                if passwords.needs_rehash(stored_password):
+                    passwords.submit(_rehash_password, user_id, password, stored_password)
+                return user_id
+        return None
+    except sqlite3.Error as e:
+        raise Exception(f"Database error during login: {str(e)}")
+
+def _rehash_password(user_id, password, stored_password):
+    password_hash = passwords.hash_password(password)
+    try:
+        with connect_db().writer() as conn:
+            # Only replace the hash we verified against, never a newer one.
+            conn.execute("UPDATE users SET password = ? WHERE id = ? AND password = ?",
+                         (password_hash, user_id, stored_password))
+    except sqlite3.Error as e:
+        print(f"Warning: Failed to upgrade password hash: {str(e)}")
+
+def _validate_product(name, quantity, price):
+    if not name or not name.strip():
+        raise ValueError("Product name is required")
+    # NaN slips past the range checks and infinity poisons the summary totals.
+    if not math.isfinite(quantity):
+        raise ValueError("Quantity must be a finite number")
+    if not math.isfinite(price):
+        raise ValueError("Price must be a finite number")
+    if quantity < 0:
+        raise ValueError("Quantity cannot be negative")
+    if price < 0:
+        raise ValueError("Price cannot be negative")
+
+@instrumentation.instrumented()
+def add_product(user_id, name, quantity, price, sku=None):
+    if not user_id:
+        raise ValueError("User ID is required")
+    _validate_product(name, quantity, price)
+    sku = _normalize_sku(sku)
+    
+    try:
+        manager = connect_db(user_id)
+        with manager.writer() as conn:
+            cursor = conn.cursor()
+            next_no = _allocate_product_nos(cursor, user_id)
+            cursor.execute("INSERT INTO inventory (user_id, product_name, quantity, price, product_no, sku) "
+                          "VALUES (?, ?, ?, ?, ?, ?) RETURNING product_no, product_name, quantity, price",
+                          (user_id, name.strip(), quantity, price, next_no, sku))
+            row = cursor.fetchall()[0]
+            _log_movement(cursor, user_id, next_no, 'receive', quantity)
+            manager.on_commit(lambda: _cache.insert(user_id, row))
+            return row
+    except sqlite3.IntegrityError as e:
+        _raise_sku_conflict(e, sku)
+        raise Exception(f"Failed to add product: {str(e)}")
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to add product: {str(e)}")
+
+def _allocate_product_nos(cursor, user_id, count=1):
+    # Returns the first of `count` consecutive numbers. Runs inside the
+    # caller's write transaction, so the numbers are only spent if it commits.
+    cursor.execute("UPDATE product_sequences SET next_no = next_no + ? WHERE user_id = ? RETURNING next_no",
+                  (count, user_id))
+    rows = cursor.fetchall()
+    if not rows:
+        # First product for this user, or rows that were loaded directly.
+        cursor.execute("INSERT INTO product_sequences (user_id, next_no) "
+                      "SELECT ?, COALESCE(MAX(product_no), 0) + 1 + ? FROM inventory WHERE user_id = ? "
+                      "RETURNING next_no", (user_id, count, user_id))
+        rows = cursor.fetchall()
+    return rows[0][0] - count
+
+@instrumentation.instrumented()
+def reserve_product_nos(user_id, count):
+    if not user_id:
+        raise ValueError("User ID is required")
+    if count < 1:
+        raise ValueError("Count must be positive")
+
+    try:
+        with connect_db(user_id).writer() as conn:
+            first = _allocate_product_nos(conn.cursor(), user_id, count)
+            return first, first + count - 1
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to reserve product numbers: {str(e)}")
+
+def _log_movement(cursor, user_id, product_no, kind, delta, note=None):
+    cursor.execute("INSERT INTO stock_movements (inventory_id, user_id, product_no, kind, delta, note) "
+                   "SELECT id, user_id, product_no, ?, ?, ? FROM inventory WHERE user_id = ? AND product_no = ?",
+                   (kind, delta, note, user_id, product_no))
+
+def _move_stock(user_id, product_no, kind, delta, note, action, column='product_no'):
+    # column is 'product_no' or 'sku'; either way the row is found through a
+    # unique index and changed in place, so concurrent deltas never overwrite
+    # each other.
+    try:
+        manager = connect_db(user_id)
+        with manager.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"UPDATE inventory SET quantity = quantity + ? "
+                          f"WHERE user_id = ? AND {column} = ? AND quantity + ? >= 0 "
+                          f"RETURNING product_no, product_name, quantity, price",
+                          (delta, user_id, product_no, delta))
+            rows = cursor.fetchall()
+            if not rows:
+                cursor.execute(f"SELECT quantity FROM inventory WHERE user_id = ? AND {column} = ?",
+                              (user_id, product_no))
+                current = cursor.fetchone()
+                if current is None:
+                    if column == 'sku':
+                        raise ValueError(f"No product with SKU {product_no} for this user")
+                    raise ValueError(f"Product with number {product_no} not found for this user")
+                raise ValueError(f"Insufficient stock: only {current[0]} on hand")
+            _log_movement(cursor, user_id, rows[0][0], kind, delta, note)
+            manager.on_commit(lambda: _cache.update(user_id, rows[0]))
+            return rows[0]
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to {action}: {str(e)}")
+
+@instrumentation.instrumented()
+def receive_stock(user_id, product_no, quantity, note=None):
+    if not user_id or not product_no:
+        raise ValueError("User ID and product number are required")
+    if quantity <= 0:
+        raise ValueError("Quantity must be greater than 0")
+    return _move_stock(user_id, product_no, 'receive', quantity, note, "receive stock")
+
+@instrumentation.instrumented()
+def issue_stock(user_id, product_no, quantity, note=None):
+    if not user_id or not product_no:
+        raise ValueError("User ID and product number are required")
+    if quantity <= 0:
+        raise ValueError("Quantity must be greater than 0")
+    return _move_stock(user_id, product_no, 'issue', -quantity, note, "issue stock")
+
+@instrumentation.instrumented()
+def adjust_stock(user_id, product_no, delta, note=None):
+    if not user_id or not product_no:
+        raise ValueError("User ID and product number are required")
+    if delta == 0:
+        raise ValueError("Adjustment cannot be zero")
+    return _move_stock(user_id, product_no, 'adjust', delta, note, "adjust stock")
+
+def _normalize_sku(sku):
+    if sku is None:
+        return None
+    sku = str(sku).strip()
+    return sku or None
+
+def _raise_sku_conflict(e, sku):
+    if sku is not None and 'sku' in str(e):
+        raise ValueError(f"SKU {sku} is already assigned to another product")
+
+@instrumentation.instrumented()
+def scan_product(user_id, sku, quantity=1, kind='receive', note=None):
+    # One indexed UPDATE per scan; scans from a handheld can be submitted
+    # through submit_write and share commits.
+    if not user_id:
+        raise ValueError("User ID is required")
+    sku = _normalize_sku(sku)
+    if sku is None:
+        raise ValueError("SKU is required")
+    if quantity <= 0:
+        raise ValueError("Quantity must be greater than 0")
+    if kind not in ('receive', 'issue'):
+        raise ValueError("Scan kind must be 'receive' or 'issue'")
+    delta = quantity if kind == 'receive' else -quantity
+    return _move_stock(user_id, sku, kind, delta, note, "scan product", column='sku')
+
+@instrumentation.instrumented()
+def set_product_sku(user_id, product_no, sku):
+    # A blank SKU clears it.
+    if not user_id or not product_no:
+        raise ValueError("User ID and product number are required")
+    sku = _normalize_sku(sku)
+    
+    try:
+        with connect_db(user_id).writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE inventory SET sku = ? WHERE user_id = ? AND product_no = ? RETURNING product_no",
+                          (sku, user_id, product_no))
+            if not cursor.fetchall():
+                raise ValueError(f"Product with number {product_no} not found for this user")
+            return sku
+    except sqlite3.IntegrityError as e:
+        _raise_sku_conflict(e, sku)
+        raise Exception(f"Failed to set SKU: {str(e)}")
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to set SKU: {str(e)}")
+
+@instrumentation.instrumented()
+def find_product_by_sku(user_id, sku):
+    if not user_id:
+        raise ValueError("User ID is required")
+    sku = _normalize_sku(sku)
+    if sku is None:
+        return None
+    
+    try:
+        with connect_db(user_id).reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT product_no, product_name, quantity, price FROM inventory "
+                           "WHERE user_id = ? AND sku = ?", (user_id, sku))
+            return cursor.fetchone()
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to look up SKU: {str(e)}")
+
+@instrumentation.instrumented()
+def product_sku(user_id, product_no):
+    if not user_id or not product_no:
+        raise ValueError("User ID and product number are required")
+    
+    try:
+        with connect_db(user_id).reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT sku FROM inventory WHERE user_id = ? AND product_no = ?", (user_id, product_no))
+            row = cursor.fetchone()
+            return row[0] if row else None
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to look up SKU: {str(e)}")
+
+def _ledger_bound(at):
+    # Ledger timestamps are UTC ISO strings. A bare date means the end of
+    # that day, i.e. the start of the next one.
+    if isinstance(at, str):
+        text = at.strip()
+        try:
+            at = datetime.date.fromisoformat(text)
+        except ValueError:
+            try:
+                at = datetime.datetime.fromisoformat(text)
+            except ValueError:
+                raise ValueError(f"Invalid date: {text}")
+    if isinstance(at, datetime.datetime):
+        if at.tzinfo is not None:
+            at = at.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return at.isoformat(timespec='milliseconds')
+    if isinstance(at, datetime.date):
+        return (at + datetime.timedelta(days=1)).isoformat()
+    raise ValueError("Date must be a date, datetime or ISO string")
+
+@instrumentation.instrumented()
+def stock_as_of(user_id, at, product_no=None):
+    if not user_id:
+        raise ValueError("User ID is required")
+    bound = _ledger_bound(at)
+
+    snapshot_filter = " AND product_no = ?" if product_no is not None else ""
+    movement_filter = " AND m.product_no = ?" if product_no is not None else ""
+    extra = (product_no,) if product_no is not None else ()
+    # Latest snapshot at or before the bound, plus the movements appended
+    # after it. Compaction keeps both sides short, so neither scans history.
+    query = f'''
+    WITH heads AS (
+        SELECT inventory_id, product_no, quantity, last_movement_id, MAX(as_of)
+        FROM stock_snapshots WHERE user_id = ? AND as_of <= ?{snapshot_filter}
+        GROUP BY inventory_id
+    ), levels AS (
+        SELECT inventory_id, MAX(product_no) AS product_no, SUM(quantity) AS quantity FROM (
+            SELECT inventory_id, product_no, quantity FROM heads
+            UNION ALL
+            SELECT m.inventory_id, m.product_no, m.delta FROM stock_movements m
+            WHERE m.user_id = ? AND m.created_at < ?{movement_filter}
+              AND m.id > COALESCE((SELECT s.last_movement_id FROM stock_snapshots s
+                                   WHERE s.inventory_id = m.inventory_id AND s.as_of <= ?
+                                   ORDER BY s.as_of DESC LIMIT 1), 0)
+        )
+        GROUP BY inventory_id
+    )
+    SELECT l.product_no, i.product_name, l.quantity, i.id IS NOT NULL
+    FROM levels l LEFT JOIN inventory i ON i.id = l.inventory_id
+    '''
+    try:
+        with connect_db(user_id).reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (user_id, bound) + extra + (user_id, bound) + extra + (bound,))
+            rows = cursor.fetchall()
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to retrieve stock history: {str(e)}")
+    # Products deleted since then have no name to show once their stock is gone.
+    rows = [(no, name, quantity) for no, name, quantity, exists in rows if exists or quantity]
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+@instrumentation.instrumented()
+def product_movements(user_id, product_no, limit=100):
+    if not user_id or not product_no:
+        raise ValueError("User ID and product number are required")
+
+    try:
+        with connect_db(user_id).reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT created_at, kind, delta, note FROM stock_movements "
+                          "WHERE user_id = ? AND product_no = ? ORDER BY id DESC LIMIT ?",
+                          (user_id, product_no, limit))
+            return cursor.fetchall()
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to retrieve stock movements: {str(e)}")
+
+@instrumentation.instrumented()
+def compact_movements(before=None):
+    if before is None:
+        cutoff = datetime.datetime.now(datetime.timezone.utc).date() - datetime.timedelta(days=MOVEMENT_RETENTION_DAYS)
+    elif isinstance(before, datetime.datetime):
+        cutoff = before.date()
+    elif isinstance(before, datetime.date):
+        cutoff = before
+    else:
+        try:
+            cutoff = datetime.date.fromisoformat(str(before).strip()[:10])
+        except ValueError:
+            raise ValueError(f"Invalid date: {before}")
+    # Only closed days are folded; today's snapshot would go stale with the
+    # next movement. Ledger timestamps are UTC.
+    cutoff = min(cutoff, datetime.datetime.now(datetime.timezone.utc).date()).isoformat()
+
+    stats = {'snapshots': 0, 'movements': 0, 'cutoff': cutoff}
+    for manager in _all_managers():
+        snapshots, movements = _compact_movements(manager, cutoff)
+        stats['snapshots'] += snapshots
+        stats['movements'] += movements
+    return stats
+
+def _compact_movements(manager, cutoff):
+    try:
+        with manager.writer() as conn:
+            cursor = conn.cursor()
+            # One snapshot per product per day that had movements, so "as of" a
+            # date before the cutoff still resolves exactly to the day.
+            cursor.execute('''
+            INSERT INTO stock_snapshots (inventory_id, user_id, product_no, as_of, last_movement_id, quantity)
+            SELECT b.inventory_id, b.user_id, b.product_no, b.as_of, b.last_id,
+                   COALESCE((SELECT s.quantity FROM stock_snapshots s WHERE s.inventory_id = b.inventory_id
+                             ORDER BY s.as_of DESC LIMIT 1), 0)
+                   + SUM(b.delta) OVER (PARTITION BY b.inventory_id ORDER BY b.as_of)
+            FROM (
+                SELECT inventory_id, MAX(user_id) AS user_id, MAX(product_no) AS product_no,
+                       date(created_at, '+1 day') AS as_of, SUM(delta) AS delta, MAX(id) AS last_id
+                FROM stock_movements WHERE created_at < ?
+                GROUP BY inventory_id, date(created_at)
+            ) AS b
+            WHERE true
+            ON CONFLICT(inventory_id, as_of) DO UPDATE SET
+                quantity = excluded.quantity,
+                last_movement_id = MAX(last_movement_id, excluded.last_movement_id)
+            ''', (cutoff,))
+            snapshots = cursor.rowcount
+            cursor.execute("DELETE FROM stock_movements WHERE created_at < ?", (cutoff,))
+            return snapshots, cursor.rowcount
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to compact stock movements: {str(e)}")
+
+@instrumentation.instrumented()
+def change_seq(user_id=None):
+    try:
+        with connect_db(user_id).reader() as conn:
+            return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM inventory_changes").fetchone()[0]
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to read change sequence: {str(e)}")
+
+@instrumentation.instrumented()
+def changes_since(user_id, seq, limit=CHANGE_FEED_LIMIT):
+    # Returns the net change per product since seq as
+    # (product_no, existed_at_seq, name, quantity, price); name is None for a
+    # product that is gone now. 'reset' asks the caller to reload instead,
+    # because the log was pruned past seq, a bulk import logged a 'reload', or
+    # so much changed that replaying it would cost more than a reload.
+    if not user_id:
+        raise ValueError("User ID is required")
+
+    try:
+        with connect_db(user_id).reader() as conn:
+            cursor = conn.cursor()
+            # One read transaction, so the product rows match the sequence.
+            cursor.execute("BEGIN")
+            cursor.execute("SELECT COALESCE(MAX(seq), 0), MIN(seq) FROM inventory_changes")
+            latest, oldest = cursor.fetchone()
+            if latest <= seq:
+                return {'seq': latest, 'reset': latest < seq, 'changes': []}
+            if oldest is not None and seq < oldest - 1:
+                return {'seq': latest, 'reset': True, 'changes': []}
+            cursor.execute('''
+            SELECT f.product_no, c.op != 'insert', i.product_name, i.quantity, i.price, f.reload
+            FROM (
+                SELECT product_no, MIN(seq) AS first_seq, MAX(op = 'reload') AS reload FROM inventory_changes
+                WHERE user_id = ? AND seq > ? AND seq <= ?
+                GROUP BY product_no
+            ) AS f
+            JOIN inventory_changes c ON c.seq = f.first_seq
+            LEFT JOIN inventory i ON i.user_id = ? AND i.product_no = f.product_no
+            ORDER BY f.product_no
+            LIMIT ?
+            ''', (user_id, seq, latest, user_id, limit + 1))
+            changes = cursor.fetchall()
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to read inventory changes: {str(e)}")
+    if len(changes) > limit or any(change[5] for change in changes):
+        return {'seq': latest, 'reset': True, 'changes': []}
+    return {'seq': latest, 'reset': False, 'changes': [change[:5] for change in changes]}
+
+@instrumentation.instrumented()
+def prune_changes(keep=CHANGE_LOG_KEEP):
+    pruned = 0
+    try:
+        for manager in _all_managers():
+            with manager.writer() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM inventory_changes "
+                              "WHERE seq <= (SELECT MAX(seq) FROM inventory_changes) - ?", (keep,))
+                pruned += cursor.rowcount
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to prune inventory changes: {str(e)}")
+    return pruned
+
+def _is_path(path_or_stream):
+    return isinstance(path_or_stream, (str, bytes)) or hasattr(path_or_stream, '__fspath__')
+
+def _detect_format(name, stream):
+    if name:
+        lowered = name.lower()
+        if lowered.endswith('.jsonl') or lowered.endswith('.json'):
+            return 'jsonl'
+        if lowered.endswith('.csv'):
+            return 'csv'
+    if not isinstance(stream, io.TextIOBase) or not stream.seekable():
+        return 'csv'
+    position = stream.tell()
+    head = stream.read(256).lstrip()
+    stream.seek(position)
+    return 'jsonl' if head.startswith('{') else 'csv'
+
+def _parse_records(stream, fmt):
+    if fmt == 'jsonl':
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("Expected a JSON object")
+            except ValueError as e:
+                yield line_no, None, f"Invalid JSON: {str(e)}"
+                continue
+            yield line_no, record, None
+    else:
+        reader = csv.DictReader(stream)
+        while True:
+            try:
+                record = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                # The reader has consumed the bad line, so parsing resumes
+                # with the next one.
+                yield reader.line_num, None, f"Invalid CSV: {str(e)}"
+                continue
+            yield reader.line_num, record, None
+
+def _product_from_record(record):
+    name = record.get('product_name', record.get('name'))
+    name = str(name).strip() if name is not None else ''
+    try:
+        quantity = int(str(record.get('quantity', '')).strip())
+    except ValueError:
+        raise ValueError("Quantity must be a whole number")
+    try:
+        price = float(str(record.get('price', '')).strip())
+    except ValueError:
+        raise ValueError("Price must be a number")
+    _validate_product(name, quantity, price)
+    return name, quantity, price
+
+@instrumentation.instrumented()
+def import_products(user_id, path_or_stream, progress=None, batch_size=IMPORT_BATCH_SIZE, fmt=None):
+    if not user_id:
+        raise ValueError("User ID is required")
+    if batch_size < 1:
+        raise ValueError("Batch size must be positive")
+    
+    if _is_path(path_or_stream):
+        # utf-8-sig drops the byte order mark Excel puts before the header.
+        stream = open(path_or_stream, newline='', encoding='utf-8-sig')
+        name = str(path_or_stream)
+        owned = True
+    else:
+        stream = path_or_stream
+        name = getattr(path_or_stream, 'name', None)
+        owned = False
+    
+    result = {'imported': 0, 'errors': [], 'error_count': 0, 'first_product_no': None, 'last_product_no': None}
+    lines = 0
+    try:
+        fmt = fmt or _detect_format(name if isinstance(name, str) else None, stream)
+        if fmt not in ('csv', 'jsonl'):
+            raise ValueError("Format must be 'csv' or 'jsonl'")
+        manager = connect_db(user_id)
+        batch = []
+        
+        def flush():
+            with manager.writer() as conn:
+                # Each batch reserves its own block of numbers, so other
+                # writers can interleave between batches of a long import.
+                first = _allocate_product_nos(conn.cursor(), user_id, len(batch))
+                last = first + len(batch) - 1
+                rows = [product + (first + i,) for i, product in enumerate(batch)]
+                conn.execute("INSERT OR IGNORE INTO change_feed_paused (user_id) VALUES (?)", (user_id,))
+                conn.executemany("INSERT INTO inventory (user_id, product_name, quantity, price, product_no) "
+                                 "VALUES (?, ?, ?, ?, ?)", rows)
+                conn.execute("DELETE FROM change_feed_paused WHERE user_id = ?", (user_id,))
+                conn.execute("INSERT INTO inventory_changes (user_id, product_no, op) VALUES (?, ?, 'reload')",
+                             (user_id, first))
+                conn.execute("INSERT INTO stock_movements (inventory_id, user_id, product_no, kind, delta, note) "
+                             "SELECT id, user_id, product_no, 'receive', quantity, 'import' FROM inventory "
+                             "WHERE user_id = ? AND product_no BETWEEN ? AND ?", (user_id, first, last))
+                manager.on_commit(lambda: _cache.invalidate(user_id))
+            if result['first_product_no'] is None:
+                result['first_product_no'] = first
+            result['imported'] += len(batch)
+            result['last_product_no'] = last
+            batch.clear()
+            if progress:
+                progress(lines, result['imported'])
+        
+        for line_no, record, error in _parse_records(stream, fmt):
+            lines += 1
+            if error is None:
+                try:
+                    product = _product_from_record(record)
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                result['error_count'] += 1
+                if len(result['errors']) < IMPORT_MAX_ERRORS:
+                    result['errors'].append((line_no, error))
+                continue
+            batch.append((user_id, product[0], product[1], product[2]))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        if progress:
+            progress(lines, result['imported'])
+        return result
+    except UnicodeDecodeError as e:
+        # A text stream cannot resume past undecodable bytes, so the rest of
+        # the file is lost; batches already committed stay imported.
+        raise Exception(f"Failed to import products: {str(e)}")
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to import products: {str(e)}")
+    finally:
+        if owned:
+            stream.close()
+
+EXPORT_COLUMNS = ('product_no', 'product_name', 'quantity', 'price')
+
+@instrumentation.instrumented()
+def export_products(path_or_stream, user_id=None, progress=None, fetch_size=EXPORT_FETCH_SIZE, fmt=None):
+    if fetch_size < 1:
+        raise ValueError("Fetch size must be positive")
+    if fmt is None:
+        name = str(path_or_stream) if _is_path(path_or_stream) else ''
+        fmt = 'jsonl' if name.lower().endswith(('.jsonl', '.json')) else 'csv'
+    if fmt not in ('csv', 'jsonl'):
+        raise ValueError("Format must be 'csv' or 'jsonl'")
+    
+    columns = EXPORT_COLUMNS if user_id else ('user_id',) + EXPORT_COLUMNS
+    query = f"SELECT {', '.join(columns)} FROM inventory"
+    if user_id:
+        sources = [(connect_db(user_id), query + " WHERE user_id = ? ORDER BY product_no", (user_id,))]
+    elif _shard_dir is not None:
+        # Shards are visited in user order, which keeps the output ordered
+        # the same way as the single-file query. A generator, so each shard
+        # is opened only when its turn comes and the LRU bounds what stays open.
+        sources = ((connect_db(uid), query + " WHERE user_id = ? ORDER BY product_no", (uid,))
+                   for uid in shards.shard_user_ids(_shard_dir))
+    else:
+        sources = [(connect_db(), query + " ORDER BY user_id, product_no", ())]
+    
+    if _is_path(path_or_stream):
+        stream = open(path_or_stream, 'w', newline='', encoding='utf-8', buffering=EXPORT_BUFFER_SIZE)
+        owned = True
+    else:
+        stream = path_or_stream
+        owned = False
+    rows = 0
+    started = time.perf_counter()
+    try:
+        if fmt == 'csv':
+            writer = csv.writer(stream)
+            writer.writerow(columns)
+            write_rows = writer.writerows
+        else:
+            def write_rows(batch):
+                stream.write(''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in batch))
+        for manager, sql, params in sources:
+            with manager.reader() as conn:
+                cursor = conn.cursor()
+                cursor.arraysize = fetch_size
+                cursor.execute(sql, params)
+                while True:
+                    batch = cursor.fetchmany()
+                    if not batch:
+                        break
+                    write_rows(batch)
+                    rows += len(batch)
+                    if progress:
+                        progress(rows)
+        stream.flush()
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to export products: {str(e)}")
+    finally:
+        if owned:
+            stream.close()
+    seconds = time.perf_counter() - started
+    return {'rows': rows, 'seconds': seconds, 'rows_per_sec': rows / seconds if seconds > 0 else 0.0}
+
+def _cached_products(user_id, load=False):
+    manager = connect_db(user_id)
+    # Never wait on the writer just to validate the cache; SQLite can serve
+    # the read from its own snapshot while a write is in progress.
+    data_version = manager.data_version(blocking=False)
+    if data_version is None:
+        return None
+    entry = _cache.get(user_id, data_version)
+    if entry is not None or not load:
+        return entry
+    version = _cache.version(user_id)
+    with manager.reader() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT sku_count FROM inventory_summary WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        if not _cache.fits(row[0] if row else 0):
+            return None
+        cursor.execute("SELECT product_no, product_name, quantity, price FROM inventory "
+                       "WHERE user_id = ? ORDER BY product_no", (user_id,))
+        rows = cursor.fetchall()
+    return _cache.put(user_id, rows, version, data_version)
+
+def invalidate_cache(user_id=None):
+    _cache.invalidate(user_id)
+
+def cache_stats():
+    return _cache.stats()
+
+@instrumentation.instrumented()
+def load_products(user_id):
+    if not user_id:
+        raise ValueError("User ID is required")
+    
+    # Returns (count, change seq), read in one transaction so replaying the
+    # feed from seq neither double counts nor misses a product.
+    try:
+        # Warms the cache the window reads are served from.
+        _cached_products(user_id, load=True)
+        with connect_db(user_id).reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN")
+            cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM inventory_changes")
+            seq = cursor.fetchone()[0]
+            cursor.execute("SELECT sku_count FROM inventory_summary WHERE user_id = ?", (user_id,))
+            row = cursor.fetchone()
+        return (row[0] if row else 0), seq
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to load products: {str(e)}")
+
+@instrumentation.instrumented()
+def product_snapshot(user_id):
+    if not user_id:
+        raise ValueError("User ID is required")
+    
+    try:
+        entry = _cached_products(user_id, load=True)
+        if entry is not None:
+            return columnar.ColumnarSnapshot(_cache.read(entry, cache.ProductColumns.copy))
+        with connect_db(user_id).reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT product_no, product_name, quantity, price FROM inventory "
+                           "WHERE user_id = ? ORDER BY product_no", (user_id,))
+            return columnar.ColumnarSnapshot(cache.ProductColumns(cursor.fetchall(), None, None))
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to retrieve products: {str(e)}")
+
+@instrumentation.instrumented()
+def view_products(user_id):
+    if not user_id:
+        raise ValueError("User ID is required")
+    
+    try:
+        entry = _cached_products(user_id, load=True)
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to retrieve products: {str(e)}")
+    if entry is not None:
+        rows = _cache.read(entry, cache.ProductColumns.rows)
+        rows.reverse()
+        return rows
+    return list(iter_products(user_id, direction='desc'))
+
+@instrumentation.instrumented()
+def products_page(user_id, after_product_no=None, limit=PAGE_SIZE, direction='asc'):
+    if not user_id:
+        raise ValueError("User ID is required")
+    if direction not in ('asc', 'desc'):
+        raise ValueError("Direction must be 'asc' or 'desc'")
+    
+    query = "SELECT product_no, product_name, quantity, price FROM inventory WHERE user_id = ?"
+    params = [user_id]
+    if after_product_no is not None:
+        query += " AND product_no > ?" if direction == 'asc' else " AND product_no < ?"
+        params.append(after_product_no)
+    query += f" ORDER BY product_no {direction.upper()} LIMIT ?"
+    params.append(max(0, limit))
+    try:
+        entry = _cached_products(user_id)
+        if entry is not None:
+            return _cache.read(entry, cache.ProductColumns.page, after_product_no, max(0, limit), direction)
+        with connect_db(user_id).reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return cursor.fetchall()
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to retrieve products: {str(e)}")
+
+@instrumentation.instrumented()
+def iter_products(user_id, after_product_no=None, limit=None, direction='asc', page_size=PAGE_SIZE):
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        page = products_page(user_id, after_product_no, size, direction)
+        yield from page
+        if len(page) < size:
+            return
+        after_product_no = page[-1][0]
+        if remaining is not None:
+            remaining -= len(page)
+
+def _fts_query(text):
+    tokens = re.findall(r"\w+", text)
+    return " ".join(f'"{token}"*' for token in tokens)
+
+def _like_escape(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+@instrumentation.instrumented()
+def search_products(user_id, text, limit=SEARCH_LIMIT, cancel=None):
+    if not user_id:
+        raise ValueError("User ID is required")
+    
+    match = _fts_query(text or "")
+    if not match:
+        return []
+    try:
+        with connect_db(user_id).reader() as conn:
+            if cancel is not None:
+                conn.set_progress_handler(lambda: 1 if cancel.is_set() else 0, 1000)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'inventory_fts'")
+                if cursor.fetchone():
+                    # CROSS JOIN pins the FTS index as the outer loop; otherwise the
+                    # planner may walk the user's whole inventory probing MATCH per row.
+                    cursor.execute("SELECT i.product_no, i.product_name, i.quantity, i.price "
+                                   "FROM inventory_fts f CROSS JOIN inventory i ON i.id = f.rowid "
+                                   "WHERE inventory_fts MATCH ? AND i.user_id = ? LIMIT ?",
+                                   (match, user_id, limit))
+                else:
+                    cursor.execute("SELECT product_no, product_name, quantity, price FROM inventory "
+                                   "WHERE user_id = ? AND product_name LIKE ? ESCAPE '\\' LIMIT ?",
+                                   (user_id, f"%{_like_escape(text.strip())}%", limit))
+                rows = cursor.fetchall()
+            finally:
+                if cancel is not None:
+                    conn.set_progress_handler(None, 0)
+        rows.sort(key=lambda row: row[0])
+        return rows
+    except sqlite3.OperationalError as e:
+        if cancel is not None and cancel.is_set():
+            return None
+        raise Exception(f"Failed to search products: {str(e)}")
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to search products: {str(e)}")
+
+@instrumentation.instrumented()
+def count_products(user_id):
+    if not user_id:
+        raise ValueError("User ID is required")
+    
+    try:
+        entry = _cached_products(user_id)
+        if entry is not None:
+            return len(entry)
+        with connect_db(user_id).reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM inventory WHERE user_id = ?", (user_id,))
+            return cursor.fetchone()[0]
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to count products: {str(e)}")
+
+@instrumentation.instrumented()
+def get_inventory_summary(user_id):
+    if not user_id:
+        raise ValueError("User ID is required")
+    
+    try:
+        with connect_db(user_id).reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT sku_count, total_units, total_value FROM inventory_summary WHERE user_id = ?",
+                          (user_id,))
+            row = cursor.fetchone()
+        return row if row else (0, 0, 0.0)
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to retrieve inventory summary: {str(e)}")
+
+@instrumentation.instrumented()
+def view_products_window(user_id, offset, limit):
+    if not user_id:
+        raise ValueError("User ID is required")
+    
+    try:
+        entry = _cached_products(user_id)
+        if entry is not None:
+            return _cache.read(entry, cache.ProductColumns.rows, max(0, offset), max(0, offset) + max(0, limit))
+        with connect_db(user_id).reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT product_no, product_name, quantity, price FROM inventory WHERE user_id = ? ORDER BY product_no ASC LIMIT ? OFFSET ?",
+                          (user_id, max(0, limit), max(0, offset)))
+            return cursor.fetchall()
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to retrieve products: {str(e)}")
+
+@instrumentation.instrumented()
+def update_product(user_id, product_no, name, quantity, price):
+    if not user_id or not product_no:
+        raise ValueError("User ID and product number are required")
+    _validate_product(name, quantity, price)
+    
+    try:
+        manager = connect_db(user_id)
+        with manager.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT quantity FROM inventory WHERE user_id = ? AND product_no = ?", (user_id, product_no))
+            previous = cursor.fetchone()
+            if previous is None:
+                raise ValueError(f"Product with number {product_no} not found for this user")
+            cursor.execute("UPDATE inventory SET product_name = ?, quantity = ?, price = ? WHERE user_id = ? AND product_no = ? "
+                          "RETURNING product_no, product_name, quantity, price",
+                          (name.strip(), quantity, price, user_id, product_no))
+            rows = cursor.fetchall()
+            if quantity != previous[0]:
+                _log_movement(cursor, user_id, product_no, 'adjust', quantity - previous[0])
+            manager.on_commit(lambda: _cache.update(user_id, rows[0]))
+            return rows[0]
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to update product: {str(e)}")
+
+@instrumentation.instrumented()
+def delete_product(user_id, product_no):
+    if not user_id or not product_no:
+        raise ValueError("User ID and product number are required")
+    
+    try:
+        manager = connect_db(user_id)
+        with manager.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO stock_movements (inventory_id, user_id, product_no, kind, delta) "
+                          "SELECT id, user_id, product_no, 'remove', -quantity FROM inventory "
+                          "WHERE user_id = ? AND product_no = ?", (user_id, product_no))
+            cursor.execute("DELETE FROM inventory WHERE user_id = ? AND product_no = ? "
+                          "RETURNING product_no, product_name, quantity, price", (user_id, product_no))
+            rows = cursor.fetchall()
+            if not rows:
+                raise ValueError(f"Product with number {product_no} not found for this user")
+            manager.on_commit(lambda: _cache.delete(user_id, product_no))
+            return rows[0]
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to delete product: {str(e)}")
+
+def _bulk_product_nos(user_id, product_nos):
+    if not user_id:
+        raise ValueError("User ID is required")
+    product_nos = sorted({int(product_no) for product_no in product_nos})
+    if not product_nos:
+        raise ValueError("No products selected")
+    return product_nos
+
+def _chunks(values, size=BULK_CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def _bulk_update(user_id, product_nos, assignment, params, where, action, kind=None, delta=None):
+    # One transaction for the whole selection. `where` skips rows the update
+    # would not change, and `delta` is the SQL for the logged stock movement.
+    try:
+        manager = connect_db(user_id)
+        updated = []
+        with manager.writer() as conn:
+            cursor = conn.cursor()
+            for chunk in _chunks(product_nos):
+                marks = ', '.join('?' * len(chunk))
+                if kind is not None:
+                    cursor.execute(f"INSERT INTO stock_movements (inventory_id, user_id, product_no, kind, delta) "
+                                  f"SELECT id, user_id, product_no, ?, {delta} FROM inventory "
+                                  f"WHERE user_id = ? AND product_no IN ({marks}) AND {where}",
+                                  (kind, *params, user_id, *chunk, *params))
+                cursor.execute(f"UPDATE inventory SET {assignment} "
+                              f"WHERE user_id = ? AND product_no IN ({marks}) AND {where} "
+                              f"RETURNING product_no, product_name, quantity, price",
+                              (*params, user_id, *chunk, *params))
+                updated.extend(cursor.fetchall())
+            updated.sort()
+            manager.on_commit(lambda: _cache.update_many(user_id, updated))
+        return updated
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to {action}: {str(e)}")
+
+@instrumentation.instrumented()
+def set_products_quantity(user_id, product_nos, quantity):
+    # Returns the rows that changed; products already at `quantity` are left alone.
+    product_nos = _bulk_product_nos(user_id, product_nos)
+    if quantity < 0:
+        raise ValueError("Quantity cannot be negative")
+    return _bulk_update(user_id, product_nos, "quantity = ?", (quantity,), "quantity != ?",
+                        "update products", kind='adjust', delta="? - quantity")
+
+@instrumentation.instrumented()
+def adjust_products_price(user_id, product_nos, percent):
+    product_nos = _bulk_product_nos(user_id, product_nos)
+    if percent == 0:
+        raise ValueError("Adjustment cannot be zero")
+    if percent < -100:
+        raise ValueError("Price cannot be reduced by more than 100%")
+    return _bulk_update(user_id, product_nos, "price = ROUND(price * (100.0 + ?) / 100.0, 2)", (percent,),
+                        "price != ROUND(price * (100.0 + ?) / 100.0, 2)", "update products")
+
+@instrumentation.instrumented()
+def delete_products(user_id, product_nos):
+    # Products that are already gone are skipped; the return value lists the
+    # product numbers that were actually deleted.
+    product_nos = _bulk_product_nos(user_id, product_nos)
+    
+    try:
+        manager = connect_db(user_id)
+        deleted = []
+        with manager.writer() as conn:
+            cursor = conn.cursor()
+            for chunk in _chunks(product_nos):
+                marks = ', '.join('?' * len(chunk))
+                cursor.execute(f"INSERT INTO stock_movements (inventory_id, user_id, product_no, kind, delta) "
+                              f"SELECT id, user_id, product_no, 'remove', -quantity FROM inventory "
+                              f"WHERE user_id = ? AND product_no IN ({marks})", (user_id, *chunk))
+                cursor.execute(f"DELETE FROM inventory WHERE user_id = ? AND product_no IN ({marks}) "
+                              f"RETURNING product_no", (user_id, *chunk))
+                deleted.extend(row[0] for row in cursor.fetchall())
+            deleted.sort()
+            manager.on_commit(lambda: _cache.delete_many(user_id, deleted))
+        return deleted
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to delete products: {str(e)}")
+
+if __name__ == "__main__":
+    init_db()
+    if len(sys.argv) >= 3 and sys.argv[1] == 'export':
+        export_user = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        stats = export_products(sys.argv[2], user_id=export_user)
+        print(f"Exported {stats['rows']:,} rows in {stats['seconds']:.2f}s "
+              f"({stats['rows_per_sec']:,.0f} rows/sec)")
+    elif len(sys.argv) >= 2 and sys.argv[1] == 'compact':
+        stats = compact_movements(sys.argv[2] if len(sys.argv) > 2 else None)
+        print(f"Folded {stats['movements']:,} movements before {stats['cutoff']} "
+              f"into {stats['snapshots']:,} snapshots")
+        print(f"Pruned {prune_changes():,} change feed entries")
+    else:
+        print("Usage: python database.py export PATH [USER_ID]")
+        print("       python database.py compact [BEFORE_DATE]")
@@ -0,0 +1,105 @@
+import queue
+import threading
+
+POLL_INTERVAL_MS = 15
+
+
+class Job:
+    def __init__(self, func, args, kwargs, on_success, on_error):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.on_success = on_success
+        self.on_error = on_error
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class DBExecutor:
+    def __init__(self, widget, poll_interval=POLL_INTERVAL_MS, name="db-worker"):
+        self.widget = widget
+        self.poll_interval = poll_interval
+        self._requests = queue.Queue()
+        self._responses = queue.Queue()
+        self._pending = 0
+        self._poll_id = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, on_success=None, on_error=None, **kwargs):
+        job = Job(func, args, kwargs, on_success, on_error)
+        self._pending += 1
+        self._requests.put(job)
+        self._schedule_poll()
+        return job
+
+    def watch(self, future, on_success=None, on_error=None):
+        # Delivers the outcome of a concurrent.futures.Future produced
+        # elsewhere (e.g. the group-commit queue) on the Tk thread.
+        job = Job(None, (), {}, on_success, on_error)
+        self._pending += 1
+
+        def done(future):
+            try:
+                result = future.result()
+            except Exception as e:
+                self._responses.put((job, job.on_error, (e,)))
+            else:
+                self._responses.put((job, job.on_success, (result,)))
+        future.add_done_callback(done)
+        self._schedule_poll()
+        return job
+
+    def call_soon(self, callback, *args):
+        # Safe to call from the worker thread: the callback runs on the Tk thread.
+        self._responses.put((None, callback, args))
+
+    @property
+    def busy(self):
+        return self._pending > 0
+
+    def _run(self):
+        while True:
+            job = self._requests.get()
+            if job is None:
+                break
+            if job.cancelled:
+                self._responses.put((job, None, None))
+                continue
+            try:
+                result = job.func(*job.args, **job.kwargs)
+            except Exception as e:
+                self._responses.put((job, job.on_error, (e,)))
+            else:
+                self._responses.put((job, job.on_success, (result,)))
+
+    def _schedule_poll(self):
+        if self._poll_id is None:
+            self._poll_id = self.widget.after(self.poll_interval, self._poll)
+
+    def _poll(self):
+        self._poll_id = None
+        while True:
+            try:
+                job, callback, args = self._responses.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                self._pending -= 1
+                if job.cancelled:
+                    continue
+            if callback is not None:
+                try:
+                    callback(*args)
+                except Exception as e:
+                    self.widget.report_callback_exception(type(e), e, e.__traceback__)
+        if self._pending > 0:
+            self._schedule_poll()
+
+    def shutdown(self):
+        self._requests.put(None)
+        if self._poll_id is not None:
+            self.widget.after_cancel(self._poll_id)
+            self._poll_id = None
@@ -0,0 +1,285 @@
+import collections
+import functools
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Upper bounds in milliseconds; the last bucket catches everything slower.
+HISTOGRAM_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+SLOW_QUERY_MS = float(os.environ.get("INVENTORY_SLOW_QUERY_MS", 50))
+MAX_SLOW_QUERIES = 200
+MAX_TRACE_LINES = 1000
+CAPTURE_PLANS = True
+
+_lock = threading.Lock()
+_operations = {}
+_slow_queries = collections.deque(maxlen=MAX_SLOW_QUERIES)
+_trace_log = collections.deque(maxlen=MAX_TRACE_LINES)
+
+
+def configure(slow_query_ms=None, capture_plans=None, max_slow_queries=None):
+    global SLOW_QUERY_MS, CAPTURE_PLANS, _slow_queries
+    if slow_query_ms is not None:
+        SLOW_QUERY_MS = slow_query_ms
+    if capture_plans is not None:
+        CAPTURE_PLANS = capture_plans
+    if max_slow_queries is not None:
+        with _lock:
+            _slow_queries = collections.deque(_slow_queries, maxlen=max_slow_queries)
+
+
+class OperationStats:
+    __slots__ = ('count', 'errors', 'total_ms', 'max_ms', 'rows', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    def add(self, elapsed_ms, rows, failed):
+        self.count += 1
+        self.errors += 1 if failed else 0
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += rows
+        for i, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def percentile(self, pct):
+        if not self.count:
+            return 0.0
+        target = pct / 100.0 * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return HISTOGRAM_BOUNDS_MS[i] if i < len(HISTOGRAM_BOUNDS_MS) else self.max_ms
+        return self.max_ms
+
+    def as_dict(self):
+        labels = [f"<={bound}ms" for bound in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}ms"]
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'rows': self.rows,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'max_ms': self.max_ms,
+            'p50_ms': self.percentile(50),
+            'p99_ms': self.percentile(99),
+            'histogram': {label: count for label, count in zip(labels, self.buckets) if count},
+        }
+
+
+def record(name, elapsed_ms, rows=0, failed=False):
+    with _lock:
+        stats = _operations.get(name)
+        if stats is None:
+            stats = _operations[name] = OperationStats()
+        stats.add(elapsed_ms, rows, failed)
+
+
+def _count_rows(result):
+    if result is None or isinstance(result, bool):
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        return result.get('rows', result.get('imported', 0))
+    return 1
+
+
+def instrumented(name=None):
+    def decorator(func):
+        op_name = name or func.__name__
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                rows = 0
+                failed = False
+                try:
+                    for item in func(*args, **kwargs):
+                        rows += 1
+                        yield item
+                except BaseException:
+                    failed = True
+                    raise
+                finally:
+                    record(op_name, (time.perf_counter() - started) * 1000, rows, failed)
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                record(op_name, (time.perf_counter() - started) * 1000, 0, True)
+                raise
+            record(op_name, (time.perf_counter() - started) * 1000, _count_rows(result))
+            return result
+        return wrapper
+    return decorator
+
+
+def _capture_plan(conn, sql, params):
+    if not CAPTURE_PLANS or not sql.lstrip().upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')):
+        return None
+    try:
+        cursor = sqlite3.Connection.cursor(conn, sqlite3.Cursor)
+        rows = cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        return [row[-1] for row in rows]
+    except sqlite3.Error:
+        return None
+
+
+def _note_statement(conn, sql, params, elapsed_ms, many=False):
+    record('sql.executemany' if many else 'sql.execute', elapsed_ms)
+    if elapsed_ms < SLOW_QUERY_MS:
+        return None
+    return _log_slow_query(conn, sql, params, elapsed_ms, many)
+
+
+def _log_slow_query(conn, sql, params, elapsed_ms, many=False):
+    entry = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'elapsed_ms': round(elapsed_ms, 3),
+        'sql': " ".join(sql.split()),
+        'params': None if many else repr(params)[:200],
+        'plan': None if many else _capture_plan(conn, sql, params),
+    }
+    with _lock:
+        _slow_queries.append(entry)
+    return entry
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    # A SELECT does most of its work while its rows are fetched, so fetch
+    # time is added to the statement that produced the rows; a streaming read
+    # enters the slow-query log once its running total crosses the threshold.
+    _sql = None
+    _params = None
+    _elapsed_ms = 0.0
+    _slow_entry = None
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._sql, self._params, self._elapsed_ms = sql, parameters, elapsed_ms
+            self._slow_entry = _note_statement(self.connection, sql, parameters, elapsed_ms)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._sql = self._slow_entry = None
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _note_statement(self.connection, sql, None, (time.perf_counter() - started) * 1000, many=True)
+
+    def _note_fetch(self, started, rows):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        record('sql.fetch', elapsed_ms, rows)
+        if self._sql is None:
+            return
+        self._elapsed_ms += elapsed_ms
+        if self._slow_entry is not None:
+            with _lock:
+                self._slow_entry['elapsed_ms'] = round(self._elapsed_ms, 3)
+        elif self._elapsed_ms >= SLOW_QUERY_MS:
+            self._slow_entry = _log_slow_query(self.connection, self._sql, self._params, self._elapsed_ms)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._note_fetch(started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._note_fetch(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._note_fetch(started, len(rows))
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        started = time.perf_counter()
+        super().__init__(*args, **kwargs)
+        record('connect', (time.perf_counter() - started) * 1000)
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def trace_statement(statement):
+    _trace_log.append(f"{time.strftime('%H:%M:%S')} [{threading.current_thread().name}] {statement}")
+
+
+def snapshot():
+    with _lock:
+        return {
+            'operations': {name: stats.as_dict() for name, stats in sorted(_operations.items())},
+            'slow_queries': list(_slow_queries),
+            'slow_query_ms': SLOW_QUERY_MS,
+        }
+
+
+def trace_lines():
+    return list(_trace_log)
+
+
+def reset():
+    with _lock:
+        _operations.clear()
+        _slow_queries.clear()
+    _trace_log.clear()
+
+
+def format_report(data=None):
+    data = data or snapshot()
+    lines = [f"{'operation':<26}{'count':>8}{'errors':>8}{'rows':>10}{'mean ms':>10}{'p50 ms':>9}"
+             f"{'p99 ms':>9}{'max ms':>10}"]
+    for name, stats in data['operations'].items():
+        lines.append(f"{name:<26}{stats['count']:>8}{stats['errors']:>8}{stats['rows']:>10}"
+                     f"{stats['mean_ms']:>10.2f}{stats['p50_ms']:>9.2f}{stats['p99_ms']:>9.2f}"
+                     f"{stats['max_ms']:>10.2f}")
+    lines.append("")
+    lines.append(f"Slow queries (>= {data['slow_query_ms']} ms): {len(data['slow_queries'])}")
+    for entry in data['slow_queries'][-20:]:
+        lines.append(f"  {entry['timestamp']}  {entry['elapsed_ms']:.1f} ms  {entry['sql']}")
+        for step in entry['plan'] or []:
+            lines.append(f"      plan: {step}")
+    return "\n".join(lines)
+
+
+def dump(path):
+    data = snapshot()
+    data['trace'] = trace_lines()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    return path
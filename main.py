@@ -1,449 +1,1674 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
-import database
-
-class MainApplication(tk.Tk):
-    def __init__(self):
-        super().__init__()
-        
-        self.title("Inventory Management GUI")
-        self.geometry("1000x700")
-        self.minsize(800, 600)
-        
-        self.current_user_id = None
-        self.setup_styles()
-        container = ttk.Frame(self)
-        container.pack(side="top", fill="both", expand=True)
-        container.grid_rowconfigure(0, weight=1)
-        container.grid_columnconfigure(0, weight=1)
-        
-        self.frames = {}
-        for F in (LoginPage, RegisterPage, InventoryPage):
-            page_name = F.__name__
-            frame = F(parent=container, controller=self)
-            self.frames[page_name] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
-            
-        self.show_frame("LoginPage")
-    
-    def setup_styles(self):
-        style = ttk.Style()
-        style.theme_use('clam')
-        style.configure("Title.TLabel", font=("Segoe UI", 28, "bold"), foreground="#2c3e50")
-        style.configure("Header.TLabel", font=("Segoe UI", 18, "bold"), foreground="#34495e")
-        style.configure("Primary.TButton", font=("Segoe UI", 11, "bold"), padding=10)
-        style.map("Primary.TButton",
-                  background=[("active", "#3498db"), ("!disabled", "#3498db")],
-                  foreground=[("active", "white"), ("!disabled", "white")])
-        style.configure("Secondary.TButton", font=("Segoe UI", 10), padding=8)
-        style.configure("Link.TButton", font=("Segoe UI", 9), foreground="#3498db")
-        style.configure("Treeview", font=("Segoe UI", 10), rowheight=30)
-        style.configure("Treeview.Heading", font=("Segoe UI", 10, "bold"), background="#ecf0f1")
-        style.map("Treeview", background=[("selected", "#3498db")])
-        style.configure("Custom.TEntry", padding=8, font=("Segoe UI", 10))
-        style.configure("TLabelframe", font=("Segoe UI", 11, "bold"), borderwidth=1)
-        style.configure("TLabelframe.Label", font=("Segoe UI", 11, "bold"), foreground="#34495e")
-    
-    def show_frame(self, page_name):
-        frame = self.frames[page_name]
-        if page_name == "InventoryPage":
-            frame.refresh_data()
-        frame.tkraise()
-
-
-class LoginPage(ttk.Frame):
-    def __init__(self, parent, controller):
-        super().__init__(parent)
-        self.controller = controller
-        main_container = ttk.Frame(self, padding="40")
-        main_container.place(relx=0.5, rely=0.5, anchor="center")
-        title = ttk.Label(main_container, text="Inventory Login", style="Title.TLabel")
-        title.pack(pady=(0, 30))
-        form_frame = ttk.Frame(main_container)
-        form_frame.pack()
-        ttk.Label(form_frame, text="Username:", font=("Segoe UI", 10)).pack(pady=(10, 5), anchor='w')
-        self.username_var = tk.StringVar()
-        self.username_entry = ttk.Entry(form_frame, textvariable=self.username_var, 
-                                        style="Custom.TEntry", width=35, font=("Segoe UI", 10))
-        self.username_entry.pack(pady=5, ipady=6)
-        self.username_entry.bind("<Return>", lambda e: self.password_entry.focus())
-        ttk.Label(form_frame, text="Password:", font=("Segoe UI", 10)).pack(pady=(15, 5), anchor='w')
-        self.password_var = tk.StringVar()
-        self.password_entry = ttk.Entry(form_frame, textvariable=self.password_var, 
-                                        style="Custom.TEntry", width=35, font=("Segoe UI", 10),
-                                        show="*")
-        self.password_entry.pack(pady=5, ipady=6)
-        self.password_entry.bind("<Return>", self.attempt_login)
-        button_frame = ttk.Frame(main_container)
-        button_frame.pack(pady=(20, 0))
-        login_button = ttk.Button(button_frame, text="Login", 
-                                  command=self.attempt_login, 
-                                  style="Primary.TButton", width=25)
-        login_button.pack(pady=10, fill='x')
-        register_button = ttk.Button(button_frame, text="Don't have an account? Register",
-                                     command=lambda: controller.show_frame("RegisterPage"),
-                                     style="Link.TButton")
-        register_button.pack(pady=5)
-        self.username_entry.focus()
-    
-    def attempt_login(self, event=None):
-        username = self.username_var.get().strip()
-        password = self.password_var.get()
-        if not username or not password:
-            messagebox.showerror("Login Error", "Please enter both username and password.")
-            return
-        try:
-            user_id = database.check_user(username, password)
-            if user_id:
-                self.controller.current_user_id = user_id
-                self.username_var.set("")
-                self.password_var.set("")
-                self.controller.show_frame("InventoryPage")
-            else:
-                messagebox.showerror("Login Error", "Invalid username or password.")
-                self.password_var.set("")
-                self.password_entry.focus()
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred during login: {str(e)}")
-
-
-class RegisterPage(ttk.Frame):
-    def __init__(self, parent, controller):
-        super().__init__(parent)
-        self.controller = controller
-        main_container = ttk.Frame(self, padding="40")
-        main_container.place(relx=0.5, rely=0.5, anchor="center")
-        title = ttk.Label(main_container, text="Create Account", style="Title.TLabel")
-        title.pack(pady=(0, 30))
-        form_frame = ttk.Frame(main_container)
-        form_frame.pack()
-        ttk.Label(form_frame, text="Username:", font=("Segoe UI", 10)).pack(pady=(10, 5), anchor='w')
-        self.username_var = tk.StringVar()
-        self.username_entry = ttk.Entry(form_frame, textvariable=self.username_var, 
-                                        style="Custom.TEntry", width=35, font=("Segoe UI", 10))
-        self.username_entry.pack(pady=5, ipady=6)
-        self.username_entry.bind("<Return>", lambda e: self.password_entry.focus())
-        ttk.Label(form_frame, text="Password:", font=("Segoe UI", 10)).pack(pady=(15, 5), anchor='w')
-        self.password_var = tk.StringVar()
-        self.password_entry = ttk.Entry(form_frame, textvariable=self.password_var, 
-                                       style="Custom.TEntry", width=35, font=("Segoe UI", 10),
-                                       show="*")
-        self.password_entry.pack(pady=5, ipady=6)
-        self.password_entry.bind("<Return>", lambda e: self.confirm_pass_entry.focus())
-        ttk.Label(form_frame, text="Confirm Password:", font=("Segoe UI", 10)).pack(pady=(15, 5), anchor='w')
-        self.confirm_pass_var = tk.StringVar()
-        self.confirm_pass_entry = ttk.Entry(form_frame, textvariable=self.confirm_pass_var, 
-                                           style="Custom.TEntry", width=35, font=("Segoe UI", 10),
-                                           show="*")
-        self.confirm_pass_entry.pack(pady=5, ipady=6)
-        self.confirm_pass_entry.bind("<Return>", self.attempt_register)
-        button_frame = ttk.Frame(main_container)
-        button_frame.pack(pady=(20, 0))
-        register_button = ttk.Button(button_frame, text="Register", 
-                                     command=self.attempt_register, 
-                                     style="Primary.TButton", width=25)
-        register_button.pack(pady=10, fill='x')
-        login_button = ttk.Button(button_frame, text="Already have an account? Login",
-                                 command=lambda: controller.show_frame("LoginPage"),
-                                 style="Link.TButton")
-        login_button.pack(pady=5)
-        self.username_entry.focus()
-    
-    def attempt_register(self, event=None):
-        username = self.username_var.get().strip()
-        password = self.password_var.get()
-        confirm_pass = self.confirm_pass_var.get()
-        if not username or not password or not confirm_pass:
-            messagebox.showerror("Input Error", "Please fill all fields.")
-            return
-        if len(username) < 3:
-            messagebox.showerror("Input Error", "Username must be at least 3 characters long.")
-            return
-        if len(password) < 4:
-            messagebox.showerror("Input Error", "Password must be at least 4 characters long.")
-            return
-        if password != confirm_pass:
-            messagebox.showerror("Input Error", "Passwords do not match.")
-            self.confirm_pass_var.set("")
-            self.confirm_pass_entry.focus()
-            return
-        try:
-            success = database.register_user(username, password)
-            if success:
-                messagebox.showinfo("Success", "Account created successfully! Please login.")
-                self.username_var.set("")
-                self.password_var.set("")
-                self.confirm_pass_var.set("")
-                self.controller.show_frame("LoginPage")
-            else:
-                messagebox.showerror("Registration Error", "Username already exists. Please choose a different username.")
-                self.username_var.focus()
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred during registration: {str(e)}")
-
-
-class InventoryPage(ttk.Frame):
-    def __init__(self, parent, controller):
-        super().__init__(parent)
-        self.controller = controller
-        self.vcmd_numeric = (self.register(self._validate_numeric), '%P')
-        self.vcmd_float = (self.register(self._validate_float), '%P')
-        self.main_frame = ttk.Frame(self, padding="20")
-        self.main_frame.pack(fill='both', expand=True)
-        self.header_frame = ttk.Frame(self.main_frame)
-        self.header_frame.pack(fill='x', pady=(0, 20))
-        self.header_label = ttk.Label(self.header_frame, text="Inventory Management", style="Header.TLabel")
-        self.header_label.pack(side='left')
-        self.logout_btn = ttk.Button(self.header_frame, text="Logout",
-                                     command=self.logout, style="Secondary.TButton")
-        self.logout_btn.pack(side='right')
-        self.entry_frame = ttk.LabelFrame(self.main_frame, text="Product Details", padding="20")
-        self.entry_frame.pack(fill='x', pady=(0, 15))
-        self.entry_frame.columnconfigure(1, weight=1)
-        self.entry_frame.columnconfigure(3, weight=1)
-        ttk.Label(self.entry_frame, text="Product Name:", font=("Segoe UI", 10)).grid(
-            row=0, column=0, padx=10, pady=10, sticky='w')
-        self.product_name = tk.StringVar()
-        self.name_entry = ttk.Entry(self.entry_frame, textvariable=self.product_name, 
-                                   style="Custom.TEntry", width=30, font=("Segoe UI", 10))
-        self.name_entry.grid(row=0, column=1, padx=10, pady=10, sticky='ew')
-        self.name_entry.bind("<Return>", lambda e: self.quantity_entry.focus())
-        ttk.Label(self.entry_frame, text="Quantity:", font=("Segoe UI", 10)).grid(
-            row=0, column=2, padx=10, pady=10, sticky='w')
-        self.quantity = tk.StringVar(value='0')
-        self.quantity_entry = ttk.Entry(self.entry_frame, textvariable=self.quantity, 
-                                        style="Custom.TEntry", width=20, font=("Segoe UI", 10),
-                                        validate='key', validatecommand=self.vcmd_numeric)
-        self.quantity_entry.grid(row=0, column=3, padx=10, pady=10, sticky='ew')
-        self.quantity_entry.bind("<Return>", lambda e: self.price_entry.focus())
-        ttk.Label(self.entry_frame, text="Price (₹):", font=("Segoe UI", 10)).grid(
-            row=1, column=0, padx=10, pady=10, sticky='w')
-        self.price = tk.StringVar(value='0.00')
-        self.price_entry = ttk.Entry(self.entry_frame, textvariable=self.price, 
-                                    style="Custom.TEntry", width=20, font=("Segoe UI", 10),
-                                    validate='key', validatecommand=self.vcmd_float)
-        self.price_entry.grid(row=1, column=1, padx=10, pady=10, sticky='ew')
-        self.price_entry.bind("<Return>", lambda e: self.add_item() if self.add_btn['state'] == 'normal' else None)
-        self.button_frame = ttk.Frame(self.main_frame)
-        self.button_frame.pack(fill='x', pady=(0, 15))
-        self.add_btn = ttk.Button(self.button_frame, text="Add Product", 
-                                  command=self.add_item, style="Primary.TButton")
-        self.add_btn.grid(row=0, column=0, padx=5, pady=5, sticky='w')
-        self.update_btn = ttk.Button(self.button_frame, text="Update Product", 
-                                     command=self.update_item, style="Secondary.TButton")
-        self.update_btn.grid(row=0, column=1, padx=5, pady=5, sticky='w')
-        self.delete_btn = ttk.Button(self.button_frame, text="Delete Product", 
-                                    command=self.delete_item, style="Secondary.TButton")
-        self.delete_btn.grid(row=0, column=2, padx=5, pady=5, sticky='w')
-        self.clear_btn = ttk.Button(self.button_frame, text="Clear Fields", 
-                                   command=self.clear_fields, style="Secondary.TButton")
-        self.clear_btn.grid(row=0, column=3, padx=5, pady=5, sticky='w')
-        tree_container = ttk.Frame(self.main_frame)
-        tree_container.pack(fill='both', expand=True)
-        self.tree = ttk.Treeview(tree_container, columns=('ID', 'Name', 'Quantity', 'Price'), 
-                                show='headings', style="Treeview")
-        self.tree.heading('ID', text='ID')
-        self.tree.heading('Name', text='Product Name')
-        self.tree.heading('Quantity', text='Quantity')
-        self.tree.heading('Price', text='Price (₹)')
-        self.tree.column('ID', width=60, anchor='center', stretch=False)
-        self.tree.column('Name', width=400, anchor='w')
-        self.tree.column('Quantity', width=150, anchor='center')
-        self.tree.column('Price', width=150, anchor='e')
-        scrollbar = ttk.Scrollbar(tree_container, orient='vertical', command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
-        scrollbar.pack(side='right', fill='y')
-        self.tree.pack(side='left', fill='both', expand=True)
-        self.tree.tag_configure('even', background='#f8f9fa')
-        self.tree.tag_configure('odd', background='white')
-        self.tree.bind('<<TreeviewSelect>>', self.select_item)
-        self.tree.bind('<Double-1>', lambda e: self.select_item())
-        self.selected_item_id = None
-        self._update_button_states('clear')
-    
-    def refresh_data(self):
-        if not self.controller.current_user_id:
-            self.logout()
-            return
-        self.populate_list()
-        self.clear_fields()
-    
-    def logout(self):
-        self.controller.current_user_id = None
-        self.clear_fields()
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        self.controller.show_frame("LoginPage")
-    
-    def _validate_numeric(self, P):
-        if P == "" or P == "0":
-            return True
-        return P.isdigit() and int(P) >= 0
-    
-    def _validate_float(self, P):
-        if P == "" or P == "0" or P == "0.":
-            return True
-        try:
-            float(P)
-            return float(P) >= 0
-        except ValueError:
-            return False
-    
-    def _update_button_states(self, state):
-        if state == 'selected':
-            self.add_btn.config(state='disabled')
-            self.update_btn.config(state='normal')
-            self.delete_btn.config(state='normal')
-        elif state == 'clear':
-            self.add_btn.config(state='normal')
-            self.update_btn.config(state='disabled')
-            self.delete_btn.config(state='disabled')
-    
-    def populate_list(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        if not self.controller.current_user_id:
-            return
-        try:
-            products = database.view_products(self.controller.current_user_id)
-            try:
-                products = sorted(products, key=lambda p: p[0])
-            except Exception:
-                pass
-            for i, product in enumerate(products):
-                product_id, name, quantity, price = product
-                tag = 'even' if i % 2 == 0 else 'odd'
-                formatted_price = f"{float(price):.2f}"
-                self.tree.insert('', 'end', values=(product_id, name, quantity, formatted_price), 
-                               tags=(tag,))
-        except Exception as e:
-            messagebox.showerror("Database Error", f"Failed to load products: {str(e)}")
-    
-    def add_item(self):
-        name = self.product_name.get().strip()
-        quantity_str = self.quantity.get().strip()
-        price_str = self.price.get().strip()
-        if not name:
-            messagebox.showerror("Input Error", "Product name cannot be empty.")
-            self.name_entry.focus()
-            return
-        if not quantity_str or quantity_str == "0":
-            messagebox.showerror("Input Error", "Please enter a valid quantity (greater than 0).")
-            self.quantity_entry.focus()
-            return
-        if not price_str or price_str == "0" or price_str == "0.0" or price_str == "0.00":
-            messagebox.showerror("Input Error", "Please enter a valid price (greater than 0).")
-            self.price_entry.focus()
-            return
-        try:
-            quantity = int(quantity_str)
-            price = float(price_str)
-            
-            if quantity <= 0:
-                raise ValueError("Quantity must be greater than 0")
-            if price <= 0:
-                raise ValueError("Price must be greater than 0")
-        except ValueError as e:
-            messagebox.showerror("Input Error", f"Invalid input: {str(e)}")
-            return
-        if not self.controller.current_user_id:
-            messagebox.showerror("Error", "No user logged in. Please login again.")
-            self.logout()
-            return
-        try:
-            database.add_product(self.controller.current_user_id, name, quantity, price)
-            messagebox.showinfo("Success", "Product added successfully!")
-            self.populate_list()
-            self.clear_fields()
-        except Exception as e:
-            messagebox.showerror("Database Error", f"Failed to add product: {str(e)}")
-    
-    def select_item(self, event=None):
-        selected_items = self.tree.selection()
-        if not selected_items:
-            return
-        try:
-            selected_item = selected_items[0]
-            item_values = self.tree.item(selected_item)['values']
-            if len(item_values) >= 4:
-                self.selected_item_id = item_values[0]
-                self.product_name.set(item_values[1])
-                self.quantity.set(str(item_values[2]))
-                price_val = item_values[3]
-                try:
-                    float_price = float(price_val)
-                    self.price.set(f"{float_price:.2f}")
-                except:
-                    self.price.set(str(price_val))
-                
-                self._update_button_states('selected')
-        except (IndexError, ValueError) as e:
-            pass
-    
-    def update_item(self):
-        if not self.selected_item_id:
-            messagebox.showerror("Error", "Please select a product to update.")
-            return
-        name = self.product_name.get().strip()
-        quantity_str = self.quantity.get().strip()
-        price_str = self.price.get().strip()
-        if not name:
-            messagebox.showerror("Input Error", "Product name cannot be empty.")
-            self.name_entry.focus()
-            return
-        if not quantity_str or quantity_str == "0":
-            messagebox.showerror("Input Error", "Please enter a valid quantity (greater than 0).")
-            self.quantity_entry.focus()
-            return
-        if not price_str or price_str == "0" or price_str == "0.0" or price_str == "0.00":
-            messagebox.showerror("Input Error", "Please enter a valid price (greater than 0).")
-            self.price_entry.focus()
-            return
-        try:
-            quantity = int(quantity_str)
-            price = float(price_str)
-            
-            if quantity < 0:
-                raise ValueError("Quantity cannot be negative")
-            if price < 0:
-                raise ValueError("Price cannot be negative")
-        except ValueError as e:
-            messagebox.showerror("Input Error", f"Invalid input: {str(e)}")
-            return
-        try:
-            database.update_product(self.controller.current_user_id, self.selected_item_id, name, quantity, price)
-            messagebox.showinfo("Success", "Product updated successfully!")
-            self.populate_list()
-            self.clear_fields()
-        except Exception as e:
-            messagebox.showerror("Database Error", f"Failed to update product: {str(e)}")
-    
-    def delete_item(self):
-        if not self.selected_item_id:
-            messagebox.showerror("Error", "Please select a product to delete.")
-            return
-        product_name = self.product_name.get()
-        if messagebox.askyesno("Confirm Delete", 
-                               f"Are you sure you want to delete '{product_name}'?"):
-            try:
-                database.delete_product(self.controller.current_user_id, self.selected_item_id)
-                messagebox.showinfo("Success", "Product deleted successfully!")
-                self.populate_list()
-                self.clear_fields()
-            except Exception as e:
-                messagebox.showerror("Database Error", f"Failed to delete product: {str(e)}")
-    
-    def clear_fields(self):
-        self.product_name.set("")
-        self.quantity.set("0")
-        self.price.set("0.00")
-        self.selected_item_id = None
-        for item in self.tree.selection():
-            self.tree.selection_remove(item)
-        self._update_button_states('clear')
-        self.name_entry.focus()
-
-
-if __name__ == "__main__":
-    app = MainApplication()
+import time
+STARTUP_STARTED = time.perf_counter()
+
+import bisect
+import os
+import sys
+import threading
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog, simpledialog
+import backup
+import columnar
+import database
+import instrumentation
+import remote
+from db_worker import DBExecutor
+from startup_timing import StartupTimer
+
+class MainApplication(tk.Tk):
+    COMPACTION_DELAY_MS = 60 * 1000
+    COMPACTION_INTERVAL_MS = 6 * 60 * 60 * 1000
+    
+    def __init__(self, startup_timer=None, report_startup=False, backend=None):
+        super().__init__()
+        
+        self.startup_timer = startup_timer or StartupTimer()
+        self.report_startup = report_startup
+        self.title("Inventory Management GUI")
+        self.geometry("1000x700")
+        self.minsize(800, 600)
+        
+        self.current_user_id = None
+        # Either the database module itself or a remote.RemoteDatabase with the
+        # same functions, when several stations share one server.
+        self.db = backend or database
+        self.db_executor = DBExecutor(self)
+        # Imports, exports and ledger maintenance run here, so window fetches,
+        # searches and change polls never queue behind a long job.
+        self.long_executor = DBExecutor(self, name="db-long-worker")
+        # Snapshots of a shared database are the server's job.
+        self.backups = backup.BackupScheduler() if self.db is database else None
+        self._busy_widgets = {}
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.setup_styles()
+        self.container = ttk.Frame(self)
+        self.container.pack(side="top", fill="both", expand=True)
+        self.container.grid_rowconfigure(0, weight=1)
+        self.container.grid_columnconfigure(0, weight=1)
+        
+        self.page_classes = {F.__name__: F for F in (LoginPage, RegisterPage, InventoryPage)}
+        self.frames = {}
+        self.diagnostics = None
+        self.bind_all("<Control-Shift-D>", self.toggle_diagnostics)
+        self.show_frame("LoginPage")
+        self.after_idle(self._on_first_paint)
+    
+    def _on_first_paint(self):
+        self.startup_timer.mark("first_paint")
+        self.run_db(self.db.init_db, on_success=lambda created: self._on_db_ready(),
+                    on_error=self._on_db_init_error)
+        self._check_login_ready()
+    
+    def _on_db_ready(self):
+        self.startup_timer.mark("db_ready")
+        self._check_login_ready()
+        self.after(self.COMPACTION_DELAY_MS, self._compact_ledger)
+        if self.backups is not None:
+            self.backups.start()
+    
+    def _compact_ledger(self):
+        self.run_long(self.db.compact_movements,
+                      on_error=lambda e: print(f"Warning: Stock ledger compaction failed: {str(e)}"))
+        self.run_long(self.db.prune_changes,
+                      on_error=lambda e: print(f"Warning: Change feed pruning failed: {str(e)}"))
+        self.after(self.COMPACTION_INTERVAL_MS, self._compact_ledger)
+    
+    def _on_db_init_error(self, e):
+        print(f"Warning: Database initialization failed: {str(e)}")
+        messagebox.showwarning("Database", f"Database initialization failed: {str(e)}")
+    
+    def _check_login_ready(self):
+        if "login_ready" in self.startup_timer.marks:
+            return
+        if self.startup_timer.has("first_paint", "db_ready"):
+            self.startup_timer.mark("login_ready")
+            if self.report_startup:
+                self.startup_timer.report()
+    
+    def setup_styles(self):
+        style = ttk.Style()
+        style.theme_use('clam')
+        style.configure("Title.TLabel", font=("Segoe UI", 28, "bold"), foreground="#2c3e50")
+        style.configure("Header.TLabel", font=("Segoe UI", 18, "bold"), foreground="#34495e")
+        style.configure("Primary.TButton", font=("Segoe UI", 11, "bold"), padding=10)
+        style.map("Primary.TButton",
+                  background=[("active", "#3498db"), ("!disabled", "#3498db")],
+                  foreground=[("active", "white"), ("!disabled", "white")])
+        style.configure("Secondary.TButton", font=("Segoe UI", 10), padding=8)
+        style.configure("Secondary.TMenubutton", font=("Segoe UI", 10), padding=8)
+        style.configure("Link.TButton", font=("Segoe UI", 9), foreground="#3498db")
+        style.configure("Treeview", font=("Segoe UI", 10), rowheight=30)
+        style.configure("Treeview.Heading", font=("Segoe UI", 10, "bold"), background="#ecf0f1")
+        style.map("Treeview", background=[("selected", "#3498db")])
+        style.configure("Custom.TEntry", padding=8, font=("Segoe UI", 10))
+        style.configure("TLabelframe", font=("Segoe UI", 11, "bold"), borderwidth=1)
+        style.configure("TLabelframe.Label", font=("Segoe UI", 11, "bold"), foreground="#34495e")
+    
+    def run_db(self, func, *args, busy=None, on_success=None, on_error=None, **kwargs):
+        return self._submit(self.db_executor, func, *args, busy=busy, on_success=on_success,
+                            on_error=on_error, **kwargs)
+    
+    def run_long(self, func, *args, busy=None, on_success=None, on_error=None, **kwargs):
+        # Like run_db, for jobs that can take seconds or minutes.
+        return self._submit(self.long_executor, func, *args, busy=busy, on_success=on_success,
+                            on_error=on_error, **kwargs)
+    
+    def _submit(self, executor, func, *args, busy=None, on_success=None, on_error=None, **kwargs):
+        if busy is not None:
+            self.set_busy(busy, True)
+        
+        def finish(callback, value):
+            if busy is not None:
+                self.set_busy(busy, False)
+            if callback:
+                callback(value)
+        
+        return executor.submit(func, *args,
+                               on_success=lambda result: finish(on_success, result),
+                               on_error=lambda error: finish(on_error, error),
+                               **kwargs)
+    
+    def run_write(self, func, *args, busy=None, on_success=None, on_error=None, **kwargs):
+        # Like run_db, but the write joins the group-commit queue instead of
+        # taking its own transaction on the worker thread.
+        if busy is not None:
+            self.set_busy(busy, True)
+        
+        def finish(callback, value):
+            if busy is not None:
+                self.set_busy(busy, False)
+            if callback:
+                callback(value)
+        
+        try:
+            future = self.db.submit_write(func, *args, **kwargs)
+        except Exception as e:
+            self.after_idle(finish, on_error, e)
+            return None
+        return self.db_executor.watch(future,
+                                      on_success=lambda result: finish(on_success, result),
+                                      on_error=lambda error: finish(on_error, error))
+    
+    def set_busy(self, widget, busy):
+        if busy:
+            if widget not in self._busy_widgets:
+                self._busy_widgets[widget] = (widget.cget('text'), widget.instate(['disabled']))
+                widget.config(text="Working...")
+                widget.state(['disabled'])
+        elif widget in self._busy_widgets:
+            text, was_disabled = self._busy_widgets.pop(widget)
+            widget.config(text=text)
+            widget.state(['disabled'] if was_disabled else ['!disabled'])
+        self.config(cursor='watch' if self._busy_widgets else '')
+    
+    def toggle_diagnostics(self, event=None):
+        if self.diagnostics is not None and self.diagnostics.winfo_exists():
+            self.diagnostics.close()
+        else:
+            self.diagnostics = DiagnosticsPanel(self)
+    
+    def is_busy(self, widget):
+        return widget in self._busy_widgets
+    
+    def on_close(self):
+        try:
+            self.db.flush_writes(timeout=5)
+        except Exception:
+            pass
+        if self.backups is not None:
+            self.backups.stop()
+        self.db_executor.shutdown()
+        self.long_executor.shutdown()
+        self.destroy()
+    
+    def show_frame(self, page_name):
+        frame = self.frames.get(page_name)
+        if frame is None:
+            frame = self.page_classes[page_name](parent=self.container, controller=self)
+            frame.grid(row=0, column=0, sticky="nsew")
+            self.frames[page_name] = frame
+        if page_name == "InventoryPage":
+            frame.refresh_data()
+        frame.tkraise()
+
+
+class DiagnosticsPanel(tk.Toplevel):
+    REFRESH_MS = 1000
+    
+    def __init__(self, controller):
+        super().__init__(controller)
+        self.controller = controller
+        self.title("Diagnostics")
+        self.geometry("900x500")
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        toolbar = ttk.Frame(self, padding="10")
+        toolbar.pack(fill='x')
+        ttk.Button(toolbar, text="Refresh", command=self.refresh,
+                   style="Secondary.TButton").pack(side='left', padx=5)
+        self.trace_var = tk.BooleanVar(value=False)
+        trace_button = ttk.Checkbutton(toolbar, text="Trace SQL", variable=self.trace_var,
+                                       command=self.toggle_trace)
+        trace_button.pack(side='left', padx=5)
+        self.remote = controller.db is not database
+        if self.remote:
+            trace_button.state(['disabled'])
+        ttk.Button(toolbar, text="Dump to File...", command=self.dump,
+                   style="Secondary.TButton").pack(side='left', padx=5)
+        ttk.Button(toolbar, text="Reset", command=self.reset,
+                   style="Secondary.TButton").pack(side='left', padx=5)
+        if controller.backups is not None:
+            ttk.Button(toolbar, text="Back Up Now", command=controller.backups.run_now,
+                       style="Secondary.TButton").pack(side='left', padx=5)
+        text_frame = ttk.Frame(self, padding=(10, 0, 10, 10))
+        text_frame.pack(fill='both', expand=True)
+        self.text = tk.Text(text_frame, font=("Consolas", 9), wrap='none')
+        scrollbar = ttk.Scrollbar(text_frame, orient='vertical', command=self.text.yview)
+        self.text.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        self.text.pack(side='left', fill='both', expand=True)
+        self._refresh_id = None
+        self.refresh()
+    
+    def refresh(self):
+        if self._refresh_id is not None:
+            self.after_cancel(self._refresh_id)
+        timings = self.controller.startup_timer.marks
+        header = "Startup: " + "  ".join(f"{name} {elapsed * 1000:.0f} ms" for name, elapsed in
+                                          sorted(timings.items(), key=lambda item: item[1]))
+        if self.remote:
+            header += f"\nServer: {self.controller.db.url}"
+        if self.controller.backups is not None:
+            header += f"\n{self.controller.backups.status()}"
+        try:
+            shard_stats = self.controller.db.shard_stats()
+        except Exception:
+            shard_stats = None
+        if shard_stats is not None:
+            header += (f"\nShards: {shard_stats['open']} of {shard_stats['max_open']} open, "
+                       f"{shard_stats['opened']:,} opened, {shard_stats['evicted']:,} evicted")
+        try:
+            stats = self.controller.db.cache_stats()
+            header += (f"\nRead cache: {stats['users']} user(s), {stats['bytes'] / 1048576:.1f} of "
+                       f"{stats['max_bytes'] / 1048576:.0f} MB, {stats['hits']:,} hits, {stats['misses']:,} misses")
+            batches = self.controller.db.write_batch_stats()
+            header += (f"\nGroup commit: {batches['writes']:,} writes in {batches['batches']:,} commits "
+                       f"(avg {batches['average_batch']:.1f}, largest {batches['largest_batch']}, "
+                       f"{batches['pending']} queued)")
+            body = instrumentation.format_report(self.controller.db.stats() if self.remote else None)
+        except Exception as e:
+            body = f"Diagnostics unavailable: {str(e)}"
+        if self.trace_var.get():
+            body += "\n\nSQL trace (latest 50):\n" + "\n".join(instrumentation.trace_lines()[-50:])
+        position = self.text.yview()[0]
+        self.text.delete('1.0', 'end')
+        self.text.insert('end', f"{header}\n\n{body}\n")
+        self.text.yview_moveto(position)
+        self._refresh_id = self.after(self.REFRESH_MS, self.refresh)
+    
+    def toggle_trace(self):
+        callback = instrumentation.trace_statement if self.trace_var.get() else None
+        database.set_trace_callback(callback)
+        self.refresh()
+    
+    def dump(self):
+        path = filedialog.asksaveasfilename(parent=self, title="Dump Diagnostics", defaultextension=".json",
+                                            filetypes=[("JSON files", "*.json")])
+        if not path:
+            return
+        try:
+            instrumentation.dump(path)
+        except OSError as e:
+            messagebox.showerror("Diagnostics", f"Failed to write diagnostics: {str(e)}", parent=self)
+            return
+        messagebox.showinfo("Diagnostics", f"Diagnostics written to {path}.", parent=self)
+    
+    def reset(self):
+        instrumentation.reset()
+        self.refresh()
+    
+    def close(self):
+        if self._refresh_id is not None:
+            self.after_cancel(self._refresh_id)
+            self._refresh_id = None
+        if self.trace_var.get():
+            database.set_trace_callback(None)
+        self.destroy()
+
+
+class LoginPage(ttk.Frame):
+    def __init__(self, parent, controller):
+        super().__init__(parent)
+        self.controller = controller
+        main_container = ttk.Frame(self, padding="40")
+        main_container.place(relx=0.5, rely=0.5, anchor="center")
+        title = ttk.Label(main_container, text="Inventory Login", style="Title.TLabel")
+        title.pack(pady=(0, 30))
+        form_frame = ttk.Frame(main_container)
+        form_frame.pack()
+        ttk.Label(form_frame, text="Username:", font=("Segoe UI", 10)).pack(pady=(10, 5), anchor='w')
+        self.username_var = tk.StringVar()
+        self.username_entry = ttk.Entry(form_frame, textvariable=self.username_var, 
+                                        style="Custom.TEntry", width=35, font=("Segoe UI", 10))
+        self.username_entry.pack(pady=5, ipady=6)
+        self.username_entry.bind("<Return>", lambda e: self.password_entry.focus())
+        ttk.Label(form_frame, text="Password:", font=("Segoe UI", 10)).pack(pady=(15, 5), anchor='w')
+        self.password_var = tk.StringVar()
+        self.password_entry = ttk.Entry(form_frame, textvariable=self.password_var, 
+                                        style="Custom.TEntry", width=35, font=("Segoe UI", 10),
+                                        show="*")
+        self.password_entry.pack(pady=5, ipady=6)
+        self.password_entry.bind("<Return>", self.attempt_login)
+        button_frame = ttk.Frame(main_container)
+        button_frame.pack(pady=(20, 0))
+        self.login_button = ttk.Button(button_frame, text="Login", 
+                                       command=self.attempt_login, 
+                                       style="Primary.TButton", width=25)
+        self.login_button.pack(pady=10, fill='x')
+        register_button = ttk.Button(button_frame, text="Don't have an account? Register",
+                                     command=lambda: controller.show_frame("RegisterPage"),
+                                     style="Link.TButton")
+        register_button.pack(pady=5)
+        self.username_entry.focus()
+    
+    def attempt_login(self, event=None):
+        username = self.username_var.get().strip()
+        password = self.password_var.get()
+        if not username or not password:
+            messagebox.showerror("Login Error", "Please enter both username and password.")
+            return
+        if self.login_button.instate(['disabled']):
+            return
+        self.controller.run_db(self.controller.db.check_user, username, password, busy=self.login_button,
+                               on_success=self._on_login_result, on_error=self._on_login_error)
+    
+    def _on_login_result(self, user_id):
+        if user_id:
+            self.controller.current_user_id = user_id
+            self.username_var.set("")
+            self.password_var.set("")
+            self.controller.show_frame("InventoryPage")
+        else:
+            messagebox.showerror("Login Error", "Invalid username or password.")
+            self.password_var.set("")
+            self.password_entry.focus()
+    
+    def _on_login_error(self, e):
+        messagebox.showerror("Error", f"An error occurred during login: {str(e)}")
+
+
+class RegisterPage(ttk.Frame):
+    def __init__(self, parent, controller):
+        super().__init__(parent)
+        self.controller = controller
+        main_container = ttk.Frame(self, padding="40")
+        main_container.place(relx=0.5, rely=0.5, anchor="center")
+        title = ttk.Label(main_container, text="Create Account", style="Title.TLabel")
+        title.pack(pady=(0, 30))
+        form_frame = ttk.Frame(main_container)
+        form_frame.pack()
+        ttk.Label(form_frame, text="Username:", font=("Segoe UI", 10)).pack(pady=(10, 5), anchor='w')
+        self.username_var = tk.StringVar()
+        self.username_entry = ttk.Entry(form_frame, textvariable=self.username_var, 
+                                        style="Custom.TEntry", width=35, font=("Segoe UI", 10))
+        self.username_entry.pack(pady=5, ipady=6)
+        self.username_entry.bind("<Return>", lambda e: self.password_entry.focus())
+        ttk.Label(form_frame, text="Password:", font=("Segoe UI", 10)).pack(pady=(15, 5), anchor='w')
+        self.password_var = tk.StringVar()
+        self.password_entry = ttk.Entry(form_frame, textvariable=self.password_var, 
+                                       style="Custom.TEntry", width=35, font=("Segoe UI", 10),
+                                       show="*")
+        self.password_entry.pack(pady=5, ipady=6)
+        self.password_entry.bind("<Return>", lambda e: self.confirm_pass_entry.focus())
+        ttk.Label(form_frame, text="Confirm Password:", font=("Segoe UI", 10)).pack(pady=(15, 5), anchor='w')
+        self.confirm_pass_var = tk.StringVar()
+        self.confirm_pass_entry = ttk.Entry(form_frame, textvariable=self.confirm_pass_var, 
+                                           style="Custom.TEntry", width=35, font=("Segoe UI", 10),
+                                           show="*")
+        self.confirm_pass_entry.pack(pady=5, ipady=6)
+        self.confirm_pass_entry.bind("<Return>", self.attempt_register)
+        button_frame = ttk.Frame(main_container)
+        button_frame.pack(pady=(20, 0))
+        self.register_button = ttk.Button(button_frame, text="Register", 
+                                          command=self.attempt_register, 
+                                          style="Primary.TButton", width=25)
+        self.register_button.pack(pady=10, fill='x')
+        login_button = ttk.Button(button_frame, text="Already have an account? Login",
+                                 command=lambda: controller.show_frame("LoginPage"),
+                                 style="Link.TButton")
+        login_button.pack(pady=5)
+        self.username_entry.focus()
+    
+    def attempt_register(self, event=None):
+        username = self.username_var.get().strip()
+        password = self.password_var.get()
+        confirm_pass = self.confirm_pass_var.get()
+        if not username or not password or not confirm_pass:
+            messagebox.showerror("Input Error", "Please fill all fields.")
+            return
+        if len(username) < 3:
+            messagebox.showerror("Input Error", "Username must be at least 3 characters long.")
+            return
+        if len(password) < 4:
+            messagebox.showerror("Input Error", "Password must be at least 4 characters long.")
+            return
+        if password != confirm_pass:
+            messagebox.showerror("Input Error", "Passwords do not match.")
+            self.confirm_pass_var.set("")
+            self.confirm_pass_entry.focus()
+            return
+        if self.register_button.instate(['disabled']):
+            return
+        self.controller.run_db(self.controller.db.register_user, username, password, busy=self.register_button,
+                               on_success=self._on_register_result, on_error=self._on_register_error)
+    
+    def _on_register_result(self, success):
+        if success:
+            messagebox.showinfo("Success", "Account created successfully! Please login.")
+            self.username_var.set("")
+            self.password_var.set("")
+            self.confirm_pass_var.set("")
+            self.controller.show_frame("LoginPage")
+        else:
+            messagebox.showerror("Registration Error", "Username already exists. Please choose a different username.")
+            self.username_entry.focus()
+    
+    def _on_register_error(self, e):
+        messagebox.showerror("Error", f"An error occurred during registration: {str(e)}")
+
+
+def fetch_window(db, user_id, buffer, buffer_start, start, end, overscan):
+    buffer_end = buffer_start + len(buffer)
+    if buffer and buffer_start <= start <= buffer_end < end:
+        buffer.extend(db.products_page(user_id, buffer[-1][0], end - buffer_end + overscan, 'asc'))
+    elif buffer and start < buffer_start <= end <= buffer_end:
+        count = min(buffer_start, buffer_start - start + overscan)
+        before = db.products_page(user_id, buffer[0][0], count, 'desc')
+        before.reverse()
+        buffer[:0] = before
+        buffer_start -= len(before)
+    elif start < buffer_start or end > buffer_end:
+        buffer_start = max(0, start - overscan)
+        buffer = db.view_products_window(user_id, buffer_start, end - buffer_start + overscan)
+    trim = start - overscan - buffer_start
+    if trim > 0:
+        del buffer[:trim]
+        buffer_start += trim
+    del buffer[end + overscan - buffer_start:]
+    return buffer, buffer_start
+
+
+class InventoryPage(ttk.Frame):
+    OVERSCAN = 10
+    WHEEL_ROWS = 3
+    SEARCH_DELAY_MS = 150
+    NAVIGATION_KEYS = ('Up', 'Down', 'Prior', 'Next', 'Home', 'End')
+    CHANGE_POLL_MS = 2000
+    # Past this many changed products a reload is cheaper than replaying them.
+    CHANGE_REPLAY_MAX = 200
+    HEADINGS = {'ID': 'ID', 'Name': 'Product Name', 'Quantity': 'Quantity', 'Price': 'Price (₹)'}
+    SORT_KEYS = {'ID': 'product_no', 'Name': 'product_name', 'Quantity': 'quantity', 'Price': 'price'}
+
+    def __init__(self, parent, controller):
+        super().__init__(parent)
+        self.controller = controller
+        self.vcmd_numeric = (self.register(self._validate_numeric), '%P')
+        self.vcmd_float = (self.register(self._validate_float), '%P')
+        self.main_frame = ttk.Frame(self, padding="20")
+        self.main_frame.pack(fill='both', expand=True)
+        self.header_frame = ttk.Frame(self.main_frame)
+        self.header_frame.pack(fill='x', pady=(0, 20))
+        self.header_label = ttk.Label(self.header_frame, text="Inventory Management", style="Header.TLabel")
+        self.header_label.pack(side='left')
+        self.logout_btn = ttk.Button(self.header_frame, text="Logout",
+                                     command=self.logout, style="Secondary.TButton")
+        self.logout_btn.pack(side='right')
+        self.entry_frame = ttk.LabelFrame(self.main_frame, text="Product Details", padding="20")
+        self.entry_frame.pack(fill='x', pady=(0, 15))
+        self.entry_frame.columnconfigure(1, weight=1)
+        self.entry_frame.columnconfigure(3, weight=1)
+        ttk.Label(self.entry_frame, text="Product Name:", font=("Segoe UI", 10)).grid(
+            row=0, column=0, padx=10, pady=10, sticky='w')
+        self.product_name = tk.StringVar()
+        self.name_entry = ttk.Entry(self.entry_frame, textvariable=self.product_name, 
+                                   style="Custom.TEntry", width=30, font=("Segoe UI", 10))
+        self.name_entry.grid(row=0, column=1, padx=10, pady=10, sticky='ew')
+        self.name_entry.bind("<Return>", lambda e: self.quantity_entry.focus())
+        ttk.Label(self.entry_frame, text="Quantity:", font=("Segoe UI", 10)).grid(
+            row=0, column=2, padx=10, pady=10, sticky='w')
+        self.quantity = tk.StringVar(value='0')
+        self.quantity_entry = ttk.Entry(self.entry_frame, textvariable=self.quantity, 
+                                        style="Custom.TEntry", width=20, font=("Segoe UI", 10),
+                                        validate='key', validatecommand=self.vcmd_numeric)
+        self.quantity_entry.grid(row=0, column=3, padx=10, pady=10, sticky='ew')
+        self.quantity_entry.bind("<Return>", lambda e: self.price_entry.focus())
+        ttk.Label(self.entry_frame, text="Price (₹):", font=("Segoe UI", 10)).grid(
+            row=1, column=0, padx=10, pady=10, sticky='w')
+        self.price = tk.StringVar(value='0.00')
+        self.price_entry = ttk.Entry(self.entry_frame, textvariable=self.price, 
+                                    style="Custom.TEntry", width=20, font=("Segoe UI", 10),
+                                    validate='key', validatecommand=self.vcmd_float)
+        self.price_entry.grid(row=1, column=1, padx=10, pady=10, sticky='ew')
+        self.price_entry.bind("<Return>", lambda e: self.add_item() if self.add_btn['state'] == 'normal' else None)
+        self.button_frame = ttk.Frame(self.main_frame)
+        self.button_frame.pack(fill='x', pady=(0, 15))
+        self.add_btn = ttk.Button(self.button_frame, text="Add Product", 
+                                  command=self.add_item, style="Primary.TButton")
+        self.add_btn.grid(row=0, column=0, padx=5, pady=5, sticky='w')
+        self.update_btn = ttk.Button(self.button_frame, text="Update Product", 
+                                     command=self.update_item, style="Secondary.TButton")
+        self.update_btn.grid(row=0, column=1, padx=5, pady=5, sticky='w')
+        self.delete_btn = ttk.Button(self.button_frame, text="Delete Product", 
+                                    command=self.delete_item, style="Secondary.TButton")
+        self.delete_btn.grid(row=0, column=2, padx=5, pady=5, sticky='w')
+        self.clear_btn = ttk.Button(self.button_frame, text="Clear Fields", 
+                                   command=self.clear_fields, style="Secondary.TButton")
+        self.clear_btn.grid(row=0, column=3, padx=5, pady=5, sticky='w')
+        self.import_btn = ttk.Button(self.button_frame, text="Import...",
+                                     command=self.import_items, style="Secondary.TButton")
+        self.import_btn.grid(row=0, column=4, padx=5, pady=5, sticky='w')
+        self.export_btn = ttk.Menubutton(self.button_frame, text="Export", style="Secondary.TMenubutton")
+        export_menu = tk.Menu(self.export_btn, tearoff=False)
+        export_menu.add_command(label="My Inventory...", command=lambda: self.export_items(all_users=False))
+        export_menu.add_command(label="All Users...", command=lambda: self.export_items(all_users=True))
+        self.export_btn['menu'] = export_menu
+        self.export_btn.grid(row=0, column=5, padx=5, pady=5, sticky='w')
+        self.bulk_btn = ttk.Menubutton(self.button_frame, text="Bulk Edit", style="Secondary.TMenubutton")
+        bulk_menu = tk.Menu(self.bulk_btn, tearoff=False)
+        bulk_menu.add_command(label="Set Quantity...", command=self.bulk_set_quantity)
+        bulk_menu.add_command(label="Adjust Price by %...", command=self.bulk_adjust_price)
+        bulk_menu.add_separator()
+        bulk_menu.add_command(label="Delete Selected", command=self.delete_item)
+        self.bulk_btn['menu'] = bulk_menu
+        self.bulk_btn.grid(row=0, column=6, padx=5, pady=5, sticky='w')
+        self.status_var = tk.StringVar()
+        ttk.Label(self.button_frame, textvariable=self.status_var, font=("Segoe UI", 9)).grid(
+            row=0, column=7, padx=10, pady=5, sticky='w')
+        scan_frame = ttk.Frame(self.main_frame)
+        scan_frame.pack(fill='x', pady=(0, 10))
+        ttk.Label(scan_frame, text="Scan SKU:", font=("Segoe UI", 10)).pack(side='left', padx=(0, 10))
+        self.scan_var = tk.StringVar()
+        self.scan_entry = ttk.Entry(scan_frame, textvariable=self.scan_var,
+                                    style="Custom.TEntry", width=24, font=("Segoe UI", 10))
+        self.scan_entry.pack(side='left')
+        # Scanners end each code with Enter; the entry is cleared at once so
+        # the next scan can follow while this one is still being written.
+        self.scan_entry.bind("<Return>", self.scan_item)
+        self.scan_entry.bind("<KP_Enter>", self.scan_item)
+        self.scan_kind = tk.StringVar(value='receive')
+        for text, kind in (("Receive", 'receive'), ("Issue", 'issue')):
+            ttk.Radiobutton(scan_frame, text=text, value=kind, variable=self.scan_kind).pack(side='left', padx=(10, 0))
+        ttk.Label(scan_frame, text="Qty per scan:", font=("Segoe UI", 10)).pack(side='left', padx=(15, 5))
+        self.scan_quantity = tk.StringVar(value='1')
+        ttk.Entry(scan_frame, textvariable=self.scan_quantity, style="Custom.TEntry", width=5,
+                  font=("Segoe UI", 10), validate='key', validatecommand=self.vcmd_numeric).pack(side='left')
+        self.assign_sku_btn = ttk.Button(scan_frame, text="Assign to Selected", command=self.assign_sku,
+                                         style="Secondary.TButton")
+        self.assign_sku_btn.pack(side='left', padx=10)
+        self.scan_status_var = tk.StringVar()
+        self.scan_status = ttk.Label(scan_frame, textvariable=self.scan_status_var, font=("Segoe UI", 10, "bold"))
+        self.scan_status.pack(side='left', padx=10)
+        search_frame = ttk.Frame(self.main_frame)
+        search_frame.pack(fill='x', pady=(0, 10))
+        ttk.Label(search_frame, text="Search:", font=("Segoe UI", 10)).pack(side='left', padx=(0, 10))
+        self.search_var = tk.StringVar()
+        self.search_entry = ttk.Entry(search_frame, textvariable=self.search_var,
+                                      style="Custom.TEntry", width=40, font=("Segoe UI", 10))
+        self.search_entry.pack(side='left', fill='x', expand=True)
+        self.search_entry.bind("<Escape>", lambda e: self.search_var.set(""))
+        self.search_var.trace_add('write', self._on_search_changed)
+        self._search_text = ""
+        self._search_after_id = None
+        self._search_job = None
+        self._search_cancel = None
+        filter_frame = ttk.Frame(self.main_frame)
+        filter_frame.pack(fill='x', pady=(0, 10))
+        self.filter_vars = {}
+        for label, low, high, vcmd in (("Quantity from:", 'quantity_min', 'quantity_max', self.vcmd_numeric),
+                                       ("Price from:", 'price_min', 'price_max', self.vcmd_float)):
+            ttk.Label(filter_frame, text=label, font=("Segoe UI", 10)).pack(side='left', padx=(0, 5))
+            for key in (low, high):
+                var = tk.StringVar()
+                entry = ttk.Entry(filter_frame, textvariable=var, style="Custom.TEntry", width=8,
+                                  font=("Segoe UI", 10), validate='key', validatecommand=vcmd)
+                entry.pack(side='left')
+                entry.bind("<Return>", lambda e: self.apply_filters())
+                self.filter_vars[key] = var
+                if key == low:
+                    ttk.Label(filter_frame, text="to", font=("Segoe UI", 10)).pack(side='left', padx=5)
+            ttk.Frame(filter_frame, width=15).pack(side='left')
+        ttk.Button(filter_frame, text="Filter", command=self.apply_filters,
+                   style="Secondary.TButton").pack(side='left', padx=5)
+        ttk.Button(filter_frame, text="Clear Filter", command=self.clear_filters,
+                   style="Secondary.TButton").pack(side='left', padx=5)
+        self.sort_column = 'ID'
+        self.sort_descending = False
+        self._filters = {}
+        self._snapshot = None
+        self.totals_var = tk.StringVar()
+        ttk.Label(self.main_frame, textvariable=self.totals_var, font=("Segoe UI", 10, "bold"),
+                  foreground="#34495e").pack(side='bottom', fill='x', pady=(10, 0))
+        tree_container = ttk.Frame(self.main_frame)
+        tree_container.pack(fill='both', expand=True)
+        self.tree = ttk.Treeview(tree_container, columns=('ID', 'Name', 'Quantity', 'Price'), 
+                                show='headings', style="Treeview", selectmode='extended')
+        for column, text in self.HEADINGS.items():
+            self.tree.heading(column, text=text, command=lambda c=column: self.sort_by(c))
+        self.tree.column('ID', width=60, anchor='center', stretch=False)
+        self.tree.column('Name', width=400, anchor='w')
+        self.tree.column('Quantity', width=150, anchor='center')
+        self.tree.column('Price', width=150, anchor='e')
+        self.scrollbar = ttk.Scrollbar(tree_container, orient='vertical', command=self._on_scrollbar)
+        self.tree.configure(yscrollcommand=self._on_tree_scroll)
+        self.scrollbar.pack(side='right', fill='y')
+        self.tree.pack(side='left', fill='both', expand=True)
+        self.tree.tag_configure('even', background='#f8f9fa')
+        self.tree.tag_configure('odd', background='white')
+        self.tree.bind('<<TreeviewSelect>>', self.select_item)
+        self.tree.bind('<Double-1>', lambda e: self.select_item())
+        self.tree.bind('<Configure>', self._on_tree_resize)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self._scroll_rows(-self.WHEEL_ROWS))
+        self.tree.bind('<Button-5>', lambda e: self._scroll_rows(self.WHEEL_ROWS))
+        self.tree.bind('<Up>', self._on_key_up)
+        self.tree.bind('<ButtonPress-1>', self._on_tree_input)
+        self.tree.bind('<KeyPress>', self._on_tree_input)
+        self.tree.bind('<Control-a>', self.select_all)
+        self.row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 30)
+        self.total_rows = 0
+        self.view_offset = 0
+        self.visible_rows = 1
+        self._buffer = []
+        self._buffer_start = 0
+        self._load_generation = 0
+        self._window_job = None
+        self._change_seq = None
+        self._change_epoch = 0
+        self._change_poll_id = None
+        self._change_job = None
+        # Rows this page wrote itself since the feed was last read, so the
+        # feed does not apply them a second time.
+        self._local_changes = {}
+        # Rows the feed showed while writes of our own were in flight, and the
+        # feed position they were read from.
+        self._feed_rows = {}
+        self._feed_start = None
+        self._writes_in_flight = 0
+        self.selected_item_id = None
+        # Rows only exist in the tree while they are on screen, so the
+        # selection is kept here and re-applied as the window scrolls.
+        self.selected_product_nos = set()
+        self._replace_selection = False
+        self._update_button_states('clear')
+    
+    def refresh_data(self):
+        if not self.controller.current_user_id:
+            self.logout()
+            return
+        self.populate_list()
+        self.clear_fields()
+    
+    def logout(self):
+        self.controller.current_user_id = None
+        self._cancel_search()
+        self._search_text = ""
+        self.search_var.set("")
+        self.sort_column = 'ID'
+        self.sort_descending = False
+        self._filters = {}
+        self._snapshot = None
+        for var in self.filter_vars.values():
+            var.set("")
+        self._update_headings()
+        self.clear_fields()
+        for item in self.tree.get_children():
+            self.tree.delete(item)
+        self.total_rows = 0
+        self.view_offset = 0
+        self._load_generation += 1
+        self._invalidate_buffer()
+        self._stop_change_poll()
+        self.scrollbar.set(0.0, 1.0)
+        self.totals_var.set("")
+        self.scan_var.set("")
+        self.scan_status_var.set("")
+        self.controller.show_frame("LoginPage")
+    
+    def _validate_numeric(self, P):
+        if P == "" or P == "0":
+            return True
+        return P.isdigit() and int(P) >= 0
+    
+    def _validate_float(self, P):
+        if P == "" or P == "0" or P == "0.":
+            return True
+        try:
+            float(P)
+            return float(P) >= 0
+        except ValueError:
+            return False
+    
+    def _update_button_states(self, state):
+        if state == 'selected':
+            states = {self.add_btn: 'disabled', self.update_btn: 'normal', self.delete_btn: 'normal',
+                      self.bulk_btn: 'normal'}
+        elif state == 'multiple':
+            states = {self.add_btn: 'disabled', self.update_btn: 'disabled', self.delete_btn: 'normal',
+                      self.bulk_btn: 'normal'}
+        elif state == 'clear':
+            states = {self.add_btn: 'normal', self.update_btn: 'disabled', self.delete_btn: 'disabled',
+                      self.bulk_btn: 'disabled'}
+        else:
+            return
+        for button, button_state in states.items():
+            if not self.controller.is_busy(button):
+                button.config(state=button_state)
+    
+    def _restore_button_states(self):
+        if len(self.selected_product_nos) > 1:
+            self._update_button_states('multiple')
+        else:
+            self._update_button_states('selected' if self.selected_item_id else 'clear')
+    
+    def _reset_selection(self):
+        # A new view drops a multi-selection, since it may hold products the
+        # view no longer shows; a single product being edited stays selected.
+        if len(self.selected_product_nos) > 1:
+            self.selected_product_nos = set()
+            self.tree.selection_set(())
+            self.status_var.set("")
+            self._restore_button_states()
+    
+    def populate_list(self):
+        self._reset_selection()
+        for item in self.tree.get_children():
+            self.tree.delete(item)
+        self._invalidate_buffer()
+        self._load_generation += 1
+        if not self.controller.current_user_id:
+            self.total_rows = 0
+            self.scrollbar.set(0.0, 1.0)
+            return
+        self.refresh_totals()
+        self._snapshot = None
+        user_id = self.controller.current_user_id
+        generation = self._load_generation
+        self._change_epoch += 1
+        epoch = self._change_epoch
+        self._change_seq = None
+        self._local_changes = {}
+        self._feed_rows = {}
+        self._feed_start = None
+        self._schedule_change_poll()
+        if not self._search_text and not self._view_active():
+            # The count comes with the feed position it was read at: the
+            # window's row count is adjusted by every replayed insert and
+            # delete, so replaying one the count already has would drift.
+            self.controller.run_db(self.controller.db.load_products, user_id,
+                                   on_success=lambda loaded: self._on_count_loaded(generation, user_id, epoch,
+                                                                                   *loaded),
+                                   on_error=self._on_load_error)
+            return
+        # Read the feed position before the rows: the worker runs jobs in
+        # order, so anything committed after it is replayed by the next poll.
+        # Searches and snapshots apply a replayed change idempotently.
+        self.controller.run_db(self.controller.db.change_seq, user_id,
+                               on_success=lambda seq: self._on_change_seq(epoch, seq),
+                               on_error=lambda e: None)
+        if self._search_text:
+            self._run_search()
+            return
+        self.controller.run_db(self.controller.db.product_snapshot, user_id,
+                               on_success=lambda snapshot: self._on_snapshot_loaded(generation, user_id, snapshot),
+                               on_error=self._on_load_error)
+    
+    def refresh_totals(self):
+        user_id = self.controller.current_user_id
+        if not user_id:
+            return
+        
+        def show(summary):
+            if user_id != self.controller.current_user_id:
+                return
+            sku_count, total_units, total_value = summary
+            self.totals_var.set(f"Products: {sku_count:,}    Units: {total_units:,}    "
+                                f"Stock Value: ₹{float(total_value):,.2f}")
+        
+        self.controller.run_db(self.controller.db.get_inventory_summary, user_id, on_success=show,
+                               on_error=lambda e: self.totals_var.set(""))
+    
+    def _on_change_seq(self, epoch, seq):
+        if epoch == self._change_epoch:
+            self._change_seq = seq
+    
+    def _schedule_change_poll(self):
+        if self._change_poll_id is None:
+            self._change_poll_id = self.after(self.CHANGE_POLL_MS, self._poll_changes)
+    
+    def _stop_change_poll(self):
+        if self._change_poll_id is not None:
+            self.after_cancel(self._change_poll_id)
+            self._change_poll_id = None
+        if self._change_job is not None:
+            self._change_job.cancel()
+            self._change_job = None
+        self._change_epoch += 1
+        self._change_seq = None
+        self._local_changes = {}
+        self._feed_rows = {}
+        self._feed_start = None
+    
+    def _poll_changes(self):
+        self._change_poll_id = None
+        user_id = self.controller.current_user_id
+        if not user_id:
+            return
+        if self._change_seq is None or self._change_job is not None or not self.winfo_viewable():
+            self._schedule_change_poll()
+            return
+        epoch = self._change_epoch
+        self._change_job = self.controller.run_db(
+            self.controller.db.changes_since, user_id, self._change_seq, self.CHANGE_REPLAY_MAX,
+            on_success=lambda feed: self._on_changes(epoch, feed),
+            on_error=self._on_changes_error)
+    
+    def _on_changes(self, epoch, feed):
+        self._change_job = None
+        self._schedule_change_poll()
+        if epoch != self._change_epoch:
+            return
+        if feed['reset']:
+            self.populate_list()
+            return
+        if self._writes_in_flight and self._feed_start is None:
+            self._feed_start = self._change_seq
+        changed = False
+        for product_no, existed, name, quantity, price in feed['changes']:
+            row = (product_no, name, quantity, price) if name is not None else None
+            if self._writes_in_flight:
+                self._feed_rows[product_no] = row
+            if product_no in self._local_changes:
+                # The page shows what it wrote; move it on only if the
+                # product has changed since.
+                shown = self._local_changes.pop(product_no)
+                if shown == row:
+                    continue
+                existed = shown is not None
+            if row is None:
+                if existed:
+                    self._apply_delete(product_no)
+                    changed = True
+            elif existed:
+                self._apply_update(row)
+                changed = True
+            else:
+                self._apply_insert(row)
+                changed = True
+        self._change_seq = feed['seq']
+        if changed:
+            self.refresh_totals()
+    
+    def _on_changes_error(self, e):
+        self._change_job = None
+        self._schedule_change_poll()
+    
+    def _record_local(self, product_no, row):
+        # Returns whether a write's result should be applied to the page. If
+        # the feed already showed this product while the write was in flight,
+        # it cannot tell which of the two is newer, so it keeps the feed's row
+        # and reads the feed again from before that row.
+        if product_no not in self._feed_rows:
+            self._local_changes[product_no] = row
+            return True
+        shown = self._feed_rows[product_no]
+        self._local_changes[product_no] = shown
+        if shown != row:
+            self._local_changes.update(self._feed_rows)
+            self._change_epoch += 1
+            self._change_seq = self._feed_start
+        return False
+    
+    def _run_write(self, func, *args, on_success=None, on_error=None, **kwargs):
+        self._writes_in_flight += 1
+        
+        def finish(callback, value):
+            self._writes_in_flight -= 1
+            callback(value)
+            if not self._writes_in_flight:
+                self._feed_rows = {}
+                self._feed_start = None
+        
+        return self.controller.run_write(func, *args, on_success=lambda result: finish(on_success, result),
+                                         on_error=lambda error: finish(on_error, error), **kwargs)
+    
+    def _is_current_load(self, generation, user_id):
+        return generation == self._load_generation and user_id == self.controller.current_user_id
+    
+    def _on_count_loaded(self, generation, user_id, epoch, total, seq):
+        self._on_change_seq(epoch, seq)
+        if not self._is_current_load(generation, user_id):
+            return
+        self.total_rows = total
+        self._render_window()
+    
+    def _on_snapshot_loaded(self, generation, user_id, snapshot):
+        if not self._is_current_load(generation, user_id):
+            return
+        self._snapshot = snapshot
+        self._show_view()
+    
+    def _view_active(self):
+        return self.sort_column != 'ID' or self.sort_descending or bool(self._filters)
+    
+    def _show_view(self, keep_offset=False):
+        view = self._snapshot.select(self.SORT_KEYS[self.sort_column], self.sort_descending, **self._filters)
+        self._invalidate_buffer()
+        # The view only materialises the rows that are sliced out of it, so
+        # the whole ordering can stand in for the window buffer.
+        self._buffer = view
+        self.total_rows = len(view)
+        if not keep_offset:
+            self.view_offset = 0
+        if self._filters:
+            self.status_var.set(f"{len(view):,} of {len(self._snapshot):,} products match the filter")
+        self._render_window()
+    
+    def _update_headings(self):
+        for column, text in self.HEADINGS.items():
+            if column == self.sort_column and self._view_active():
+                text += " ▼" if self.sort_descending else " ▲"
+            self.tree.heading(column, text=text)
+    
+    def sort_by(self, column):
+        if not self.controller.current_user_id:
+            return
+        if column == self.sort_column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+        self._update_headings()
+        self._refresh_view()
+    
+    def _read_filters(self):
+        filters = {}
+        for key, var in self.filter_vars.items():
+            text = var.get().strip()
+            if text:
+                filters[key] = int(text) if key.startswith('quantity') else float(text)
+        for low, high in (('quantity_min', 'quantity_max'), ('price_min', 'price_max')):
+            if low in filters and high in filters and filters[low] > filters[high]:
+                raise ValueError("The lower bound must not exceed the upper bound")
+        return filters
+    
+    def apply_filters(self):
+        if not self.controller.current_user_id:
+            return
+        try:
+            self._filters = self._read_filters()
+        except ValueError as e:
+            messagebox.showerror("Input Error", f"Invalid filter: {str(e)}")
+            return
+        self._reset_selection()
+        self._update_headings()
+        self._refresh_view()
+    
+    def clear_filters(self):
+        for var in self.filter_vars.values():
+            var.set("")
+        if self._filters:
+            self._reset_selection()
+            self._filters = {}
+            self.status_var.set("")
+            self._update_headings()
+            self._refresh_view()
+    
+    def _refresh_view(self):
+        if self._view_active() and self._snapshot is not None:
+            self._show_view()
+        elif self._search_text:
+            # Search results are already in memory; re-order them locally.
+            rows = self._snapshot.columns.rows() if self._snapshot is not None else list(self._buffer)
+            self._on_search_results(self._load_generation, self.controller.current_user_id, rows)
+        else:
+            self.view_offset = 0
+            self.populate_list()
+    
+    def _on_load_error(self, e):
+        messagebox.showerror("Database Error", f"Failed to load products: {str(e)}")
+    
+    def _invalidate_buffer(self):
+        self._buffer = []
+        self._buffer_start = 0
+        if self._window_job is not None:
+            self._window_job.cancel()
+            self._window_job = None
+    
+    def _max_offset(self):
+        return max(0, self.total_rows - self.visible_rows)
+    
+    def _request_window(self, start, end):
+        if self._window_job is not None:
+            self._window_job.cancel()
+        user_id = self.controller.current_user_id
+        generation = self._load_generation
+        
+        def loaded(result):
+            self._window_job = None
+            if not self._is_current_load(generation, user_id):
+                return
+            self._buffer, self._buffer_start = result
+            buffer_end = self._buffer_start + len(self._buffer)
+            if buffer_end < end:
+                self.total_rows = buffer_end
+            self._render_window()
+        
+        self._window_job = self.controller.run_db(fetch_window, self.controller.db, user_id, list(self._buffer),
+                                                  self._buffer_start, start, end, self.OVERSCAN,
+                                                  on_success=loaded, on_error=self._on_load_error)
+    
+    def _render_window(self):
+        self.view_offset = min(max(0, self.view_offset), self._max_offset())
+        start = self.view_offset
+        end = min(self.total_rows, start + self.visible_rows + self.OVERSCAN)
+        if start < self._buffer_start or end > self._buffer_start + len(self._buffer):
+            self._request_window(start, end)
+            return
+        first = start - self._buffer_start
+        rows = self._buffer[first:first + end - start]
+        wanted = {str(row[0]) for row in rows}
+        stale = [iid for iid in self.tree.get_children() if iid not in wanted]
+        if stale:
+            self.tree.delete(*stale)
+        for i, product in enumerate(rows):
+            iid = str(product[0])
+            tag = 'even' if (self.view_offset + i) % 2 == 0 else 'odd'
+            values = self._row_values(product)
+            if self.tree.exists(iid):
+                if self.tree.index(iid) != i:
+                    self.tree.move(iid, '', i)
+                self.tree.item(iid, values=values, tags=(tag,))
+            else:
+                self.tree.insert('', i, iid=iid, values=values, tags=(tag,))
+        selected = [str(row[0]) for row in rows if row[0] in self.selected_product_nos]
+        if set(selected) != set(self.tree.selection()):
+            self.tree.selection_set(selected)
+            if len(selected) == 1:
+                self.tree.focus(selected[0])
+        self.tree.yview_moveto(0)
+        self._update_scrollbar()
+    
+    def _row_values(self, product):
+        product_id, name, quantity, price = product
+        return (product_id, name, quantity, f"{float(price):.2f}")
+    
+    def _buffer_position(self, product_no):
+        keys = [row[0] for row in self._buffer]
+        pos = bisect.bisect_left(keys, product_no)
+        found = pos < len(keys) and keys[pos] == product_no
+        return pos, found
+    
+    def _apply_insert(self, row):
+        if self._search_text:
+            self._run_search()
+            return
+        if self._snapshot is not None:
+            self._snapshot.insert(tuple(row))
+            self._show_view(keep_offset=True)
+            return
+        pos, found = self._buffer_position(row[0])
+        buffer_end = self._buffer_start + len(self._buffer)
+        if found:
+            # A window fetched after the count was read can already hold the
+            # row; it is still missing from the count.
+            self._buffer[pos] = tuple(row)
+        elif pos == 0 and self._buffer and self._buffer_start > 0:
+            self._buffer_start += 1
+            self.view_offset += 1
+        elif pos < len(self._buffer) or buffer_end == self.total_rows:
+            self._buffer.insert(pos, tuple(row))
+        self.total_rows += 1
+        self._render_window()
+    
+    def _apply_update(self, row):
+        if self._snapshot is not None:
+            # Under a search the snapshot holds only the hits; like the plain
+            # search buffer, an edit must not pull in a product that missed.
+            if self._search_text and row[0] not in self._snapshot:
+                return
+            self._snapshot.update(tuple(row))
+            self._show_view(keep_offset=True)
+            return
+        pos, found = self._buffer_position(row[0])
+        if found:
+            self._buffer[pos] = tuple(row)
+        iid = str(row[0])
+        if self.tree.exists(iid):
+            self.tree.item(iid, values=self._row_values(row))
+    
+    def _apply_delete(self, product_no):
+        if self._search_text:
+            self._run_search()
+            return
+        if self._snapshot is not None:
+            self._snapshot.delete(product_no)
+            self._show_view(keep_offset=True)
+            return
+        pos, found = self._buffer_position(product_no)
+        if found:
+            del self._buffer[pos]
+        elif pos == 0 and self._buffer and self._buffer_start > 0:
+            self._buffer_start -= 1
+            self.view_offset = max(0, self.view_offset - 1)
+        self.total_rows = max(0, self.total_rows - 1)
+        self._render_window()
+    
+    def _apply_updates(self, rows):
+        if self._snapshot is not None:
+            if self._search_text:
+                rows = [row for row in rows if row[0] in self._snapshot]
+                if not rows:
+                    return
+            self._snapshot.update_many([tuple(row) for row in rows])
+            self._show_view(keep_offset=True)
+            return
+        positions = {row[0]: pos for pos, row in enumerate(self._buffer)}
+        for row in rows:
+            pos = positions.get(row[0])
+            if pos is not None:
+                self._buffer[pos] = tuple(row)
+            iid = str(row[0])
+            if self.tree.exists(iid):
+                self.tree.item(iid, values=self._row_values(row))
+    
+    def _apply_deletes(self, product_nos):
+        self.selected_product_nos.difference_update(product_nos)
+        if self._search_text:
+            self._run_search()
+            return
+        if self._snapshot is not None:
+            self._snapshot.delete_many(product_nos)
+            self._show_view(keep_offset=True)
+            return
+        deleted = set(product_nos)
+        # Products before the buffer shift it up, as in _apply_delete.
+        if self._buffer and self._buffer_start > 0:
+            before = sum(1 for product_no in deleted if product_no < self._buffer[0][0])
+            self._buffer_start -= before
+            self.view_offset = max(0, self.view_offset - before)
+        self._buffer = [row for row in self._buffer if row[0] not in deleted]
+        self.total_rows = max(0, self.total_rows - len(deleted))
+        self._render_window()
+    
+    def _on_search_changed(self, *args):
+        self._reset_selection()
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+        self._search_after_id = self.after(self.SEARCH_DELAY_MS, self._run_search)
+    
+    def _cancel_search(self):
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+            self._search_after_id = None
+        if self._search_job is not None:
+            self._search_job.cancel()
+            self._search_job = None
+        if self._search_cancel is not None:
+            self._search_cancel.set()
+            self._search_cancel = None
+    
+    def _run_search(self):
+        self._cancel_search()
+        if not self.controller.current_user_id:
+            return
+        text = self.search_var.get().strip()
+        if not text:
+            if self._search_text:
+                self._search_text = ""
+                self.status_var.set("")
+                self.view_offset = 0
+                self.populate_list()
+            return
+        self._search_text = text
+        self._load_generation += 1
+        generation = self._load_generation
+        user_id = self.controller.current_user_id
+        cancel = threading.Event()
+        self._search_cancel = cancel
+        self._search_job = self.controller.run_db(
+            self.controller.db.search_products, user_id, text, cancel=cancel,
+            on_success=lambda rows: self._on_search_results(generation, user_id, rows),
+            on_error=self._on_search_error)
+    
+    def _on_search_results(self, generation, user_id, rows):
+        if rows is None or not self._is_current_load(generation, user_id):
+            return
+        self._search_job = None
+        self._search_cancel = None
+        if len(rows) >= self.controller.db.SEARCH_LIMIT:
+            self.status_var.set(f"Showing first {len(rows):,} matches")
+        else:
+            self.status_var.set(f"{len(rows):,} matches")
+        if self._view_active():
+            self._snapshot = columnar.ColumnarSnapshot.from_rows(rows)
+            self._show_view()
+            return
+        self._snapshot = None
+        self._invalidate_buffer()
+        self._buffer = list(rows)
+        self.total_rows = len(rows)
+        self.view_offset = 0
+        self._render_window()
+    
+    def _on_search_error(self, e):
+        self._search_job = None
+        self._search_cancel = None
+        messagebox.showerror("Search Error", f"Failed to search products: {str(e)}")
+    
+    def _update_scrollbar(self):
+        if self.total_rows <= self.visible_rows:
+            self.scrollbar.set(0.0, 1.0)
+            return
+        first = self.view_offset / self.total_rows
+        last = min(1.0, (self.view_offset + self.visible_rows) / self.total_rows)
+        self.scrollbar.set(first, last)
+    
+    def _scroll_to(self, offset):
+        if not self.controller.current_user_id:
+            return
+        offset = min(max(0, offset), self._max_offset())
+        if offset == self.view_offset:
+            return
+        self.view_offset = offset
+        self._render_window()
+    
+    def _scroll_rows(self, delta):
+        self._scroll_to(self.view_offset + delta)
+        return "break"
+    
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == 'moveto':
+            self._scroll_to(int(float(amount) * self.total_rows))
+        elif action == 'scroll':
+            step = self.visible_rows if unit == 'pages' else 1
+            self._scroll_rows(int(amount) * step)
+    
+    def _on_tree_scroll(self, first, last):
+        # Fold native Treeview scrolling (e.g. keyboard navigation into the
+        # overscan rows) back into the window offset.
+        children = self.tree.get_children()
+        shift = round(float(first) * len(children))
+        if shift > 0:
+            self._scroll_rows(shift)
+    
+    def _on_tree_resize(self, event):
+        visible = max(1, (event.height - self.row_height) // self.row_height)
+        if visible != self.visible_rows:
+            self.visible_rows = visible
+            if self.controller.current_user_id and self.total_rows:
+                self.view_offset = min(self.view_offset, self._max_offset())
+                self._render_window()
+    
+    def _on_mousewheel(self, event):
+        if abs(event.delta) >= 120:
+            notches = -event.delta // 120
+        else:
+            notches = -event.delta
+        return self._scroll_rows(notches * self.WHEEL_ROWS)
+    
+    def _on_tree_input(self, event):
+        # Only Shift and Control extend the selection; a plain click on a row
+        # or arrow key starts a new one, which also drops products selected
+        # off screen.
+        if event.type == tk.EventType.KeyPress:
+            if event.keysym not in self.NAVIGATION_KEYS:
+                return
+        elif self.tree.identify_region(event.x, event.y) not in ('cell', 'tree'):
+            return
+        self._replace_selection = not event.state & 0x0005
+    
+    def _on_key_up(self, event):
+        self._on_tree_input(event)
+        children = self.tree.get_children()
+        if children and self.tree.focus() == children[0] and self.view_offset > 0:
+            self._scroll_rows(-1)
+            children = self.tree.get_children()
+            if children:
+                self.tree.focus(children[0])
+                self.tree.selection_set(children[0])
+            return "break"
+    
+    def add_item(self):
+        name = self.product_name.get().strip()
+        quantity_str = self.quantity.get().strip()
+        price_str = self.price.get().strip()
+        if not name:
+            messagebox.showerror("Input Error", "Product name cannot be empty.")
+            self.name_entry.focus()
+            return
+        if not quantity_str or quantity_str == "0":
+            messagebox.showerror("Input Error", "Please enter a valid quantity (greater than 0).")
+            self.quantity_entry.focus()
+            return
+        if not price_str or price_str == "0" or price_str == "0.0" or price_str == "0.00":
+            messagebox.showerror("Input Error", "Please enter a valid price (greater than 0).")
+            self.price_entry.focus()
+            return
+        try:
+            quantity = int(quantity_str)
+            price = float(price_str)
+            
+            if quantity <= 0:
+                raise ValueError("Quantity must be greater than 0")
+            if price <= 0:
+                raise ValueError("Price must be greater than 0")
+        except ValueError as e:
+            messagebox.showerror("Input Error", f"Invalid input: {str(e)}")
+            return
+        if not self.controller.current_user_id:
+            messagebox.showerror("Error", "No user logged in. Please login again.")
+            self.logout()
+            return
+        self._run_write(self.controller.db.add_product, self.controller.current_user_id, name, quantity, price,
+                        busy=self.add_btn, on_success=self._on_item_added,
+                        on_error=lambda e: self._on_write_error("add", e))
+    
+    def _on_item_added(self, row):
+        self.refresh_totals()
+        messagebox.showinfo("Success", "Product added successfully!")
+        if self._record_local(row[0], tuple(row)):
+            self._apply_insert(row)
+        self.clear_fields()
+    
+    def _on_write_error(self, action, e):
+        self._restore_button_states()
+        messagebox.showerror("Database Error", f"Failed to {action} product: {str(e)}")
+    
+    def scan_item(self, event=None):
+        sku = self.scan_var.get().strip()
+        self.scan_var.set("")
+        if not sku:
+            return "break"
+        user_id = self.controller.current_user_id
+        if not user_id:
+            self.logout()
+            return "break"
+        quantity_str = self.scan_quantity.get().strip()
+        if not quantity_str or int(quantity_str) <= 0:
+            self._scan_feedback("Quantity per scan must be greater than 0", error=True)
+            return "break"
+        quantity = int(quantity_str)
+        kind = self.scan_kind.get()
+        self._run_write(self.controller.db.scan_product, user_id, sku, quantity, kind,
+                        on_success=lambda row: self._on_scanned(kind, quantity, row),
+                        on_error=lambda e: self._on_scan_error(sku, e))
+        return "break"
+    
+    def _on_scanned(self, kind, quantity, row):
+        if self._record_local(row[0], tuple(row)):
+            self._apply_update(row)
+        sign = '+' if kind == 'receive' else '-'
+        self._scan_feedback(f"{sign}{quantity}  {row[1]}  (now {row[2]:,})")
+        # Totals are read once a burst of scans has drained, not per scan.
+        if not self._writes_in_flight:
+            self.refresh_totals()
+    
+    def _on_scan_error(self, sku, e):
+        self._scan_feedback(f"{sku}: {str(e)}", error=True)
+    
+    def _scan_feedback(self, text, error=False):
+        self.scan_status_var.set(text)
+        self.scan_status.config(foreground="#c0392b" if error else "#27ae60")
+        if error:
+            self.bell()
+    
+    def assign_sku(self):
+        if not self.selected_item_id:
+            messagebox.showerror("Error", "Please select a product to assign the SKU to.")
+            return
+        sku = self.scan_var.get().strip()
+        if not sku:
+            messagebox.showerror("Input Error", "Scan or type the SKU to assign first.")
+            self.scan_entry.focus()
+            return
+        product_no = self.selected_item_id
+        self._run_write(self.controller.db.set_product_sku, self.controller.current_user_id, product_no, sku,
+                        busy=self.assign_sku_btn, on_success=lambda sku: self._on_sku_assigned(product_no, sku),
+                        on_error=lambda e: self._on_write_error("assign SKU to", e))
+    
+    def _on_sku_assigned(self, product_no, sku):
+        self.scan_var.set("")
+        self._scan_feedback(f"SKU {sku} assigned to product {product_no}")
+        self.scan_entry.focus()
+    
+    def _show_selected_sku(self, product_no, sku):
+        if product_no == self.selected_item_id:
+            self.scan_status_var.set(f"Product {product_no} SKU: {sku}" if sku else f"Product {product_no} has no SKU")
+            self.scan_status.config(foreground="#34495e")
+    
+    def import_items(self):
+        if not self.controller.current_user_id:
+            messagebox.showerror("Error", "No user logged in. Please login again.")
+            self.logout()
+            return
+        path = filedialog.askopenfilename(title="Import Products",
+                                          filetypes=[("CSV files", "*.csv"), ("JSON Lines", "*.jsonl"),
+                                                     ("All files", "*.*")])
+        if not path:
+            return
+        
+        def report(lines, imported):
+            self.controller.long_executor.call_soon(self.status_var.set,
+                                                    f"Imported {imported:,} of {lines:,} lines...")
+        
+        self.controller.run_long(self.controller.db.import_products, self.controller.current_user_id, path,
+                                 progress=report, busy=self.import_btn, on_success=self._on_import_finished,
+                                 on_error=self._on_import_error)
+    
+    def _on_import_error(self, e):
+        self.status_var.set("")
+        messagebox.showerror("Import Error", f"Failed to import products: {str(e)}")
+    
+    def _on_import_finished(self, result):
+        self.status_var.set(f"Imported {result['imported']:,} products")
+        self.populate_list()
+        message = f"Imported {result['imported']:,} products."
+        errors = result['errors']
+        skipped = result['error_count']
+        if skipped:
+            shown = "\n".join(f"Line {line}: {error}" for line, error in errors[:10])
+            more = f"\n...and {skipped - 10:,} more" if skipped > 10 else ""
+            messagebox.showwarning("Import Finished", f"{message}\n\n{skipped:,} lines skipped:\n{shown}{more}")
+        else:
+            messagebox.showinfo("Import Finished", message)
+    
+    def export_items(self, all_users=False):
+        if not self.controller.current_user_id:
+            messagebox.showerror("Error", "No user logged in. Please login again.")
+            self.logout()
+            return
+        path = filedialog.asksaveasfilename(title="Export Products", defaultextension=".csv",
+                                            filetypes=[("CSV files", "*.csv"), ("JSON Lines", "*.jsonl")])
+        if not path:
+            return
+        
+        def report(rows):
+            self.controller.long_executor.call_soon(self.status_var.set, f"Exported {rows:,} rows...")
+        
+        def finished(stats):
+            self.status_var.set(f"Exported {stats['rows']:,} rows ({stats['rows_per_sec']:,.0f} rows/sec)")
+            messagebox.showinfo("Export Finished", f"Exported {stats['rows']:,} products to {path}.")
+        
+        user_id = None if all_users else self.controller.current_user_id
+        self.controller.run_long(self.controller.db.export_products, path, user_id=user_id, progress=report,
+                                 busy=self.export_btn, on_success=finished, on_error=self._on_export_error)
+    
+    def _on_export_error(self, e):
+        self.status_var.set("")
+        messagebox.showerror("Export Error", f"Failed to export products: {str(e)}")
+    
+    def select_item(self, event=None):
+        rendered = {int(iid) for iid in self.tree.get_children()}
+        visible = {int(iid) for iid in self.tree.selection()}
+        was_multiple = len(self.selected_product_nos) > 1
+        if self._replace_selection:
+            self.selected_product_nos = visible
+        else:
+            self.selected_product_nos = (self.selected_product_nos - rendered) | visible
+        self._replace_selection = False
+        if len(self.selected_product_nos) > 1:
+            if self.selected_item_id is not None:
+                self.selected_item_id = None
+                self.product_name.set("")
+                self.quantity.set("0")
+                self.price.set("0.00")
+            self.status_var.set(f"{len(self.selected_product_nos):,} products selected")
+            self._update_button_states('multiple')
+            return
+        if was_multiple:
+            self.status_var.set("")
+            self._restore_button_states()
+        selected_items = self.tree.selection()
+        if not selected_items:
+            return
+        try:
+            selected_item = selected_items[0]
+            item_values = self.tree.item(selected_item)['values']
+            if event is not None and str(self.selected_item_id) == selected_item:
+                return
+            if len(item_values) >= 4:
+                self.selected_item_id = item_values[0]
+                self.product_name.set(item_values[1])
+                self.quantity.set(str(item_values[2]))
+                price_val = item_values[3]
+                try:
+                    float_price = float(price_val)
+                    self.price.set(f"{float_price:.2f}")
+                except:
+                    self.price.set(str(price_val))
+                
+                self._update_button_states('selected')
+                product_no = self.selected_item_id
+                self.controller.run_db(self.controller.db.product_sku, self.controller.current_user_id, product_no,
+                                       on_success=lambda sku: self._show_selected_sku(product_no, sku))
+        except (IndexError, ValueError) as e:
+            pass
+    
+    def update_item(self):
+        if not self.selected_item_id:
+            messagebox.showerror("Error", "Please select a product to update.")
+            return
+        name = self.product_name.get().strip()
+        quantity_str = self.quantity.get().strip()
+        price_str = self.price.get().strip()
+        if not name:
+            messagebox.showerror("Input Error", "Product name cannot be empty.")
+            self.name_entry.focus()
+            return
+        if not quantity_str or quantity_str == "0":
+            messagebox.showerror("Input Error", "Please enter a valid quantity (greater than 0).")
+            self.quantity_entry.focus()
+            return
+        if not price_str or price_str == "0" or price_str == "0.0" or price_str == "0.00":
+            messagebox.showerror("Input Error", "Please enter a valid price (greater than 0).")
+            self.price_entry.focus()
+            return
+        try:
+            quantity = int(quantity_str)
+            price = float(price_str)
+            
+            if quantity < 0:
+                raise ValueError("Quantity cannot be negative")
+            if price < 0:
+                raise ValueError("Price cannot be negative")
+        except ValueError as e:
+            messagebox.showerror("Input Error", f"Invalid input: {str(e)}")
+            return
+        self._run_write(self.controller.db.update_product, self.controller.current_user_id, self.selected_item_id,
+                        name, quantity, price, busy=self.update_btn, on_success=self._on_item_updated,
+                        on_error=lambda e: self._on_write_error("update", e))
+    
+    def _on_item_updated(self, row):
+        self.refresh_totals()
+        messagebox.showinfo("Success", "Product updated successfully!")
+        if self._record_local(row[0], tuple(row)):
+            self._apply_update(row)
+        self.clear_fields()
+    
+    def delete_item(self):
+        product_nos = self._selected_products()
+        if len(product_nos) > 1:
+            if messagebox.askyesno("Confirm Delete",
+                                   f"Are you sure you want to delete {len(product_nos):,} selected products?"):
+                self._run_write(self.controller.db.delete_products, self.controller.current_user_id, product_nos,
+                                busy=self.delete_btn, on_success=self._on_items_deleted,
+                                on_error=lambda e: self._on_write_error("delete", e))
+            return
+        if not self.selected_item_id:
+            messagebox.showerror("Error", "Please select a product to delete.")
+            return
+        product_name = self.product_name.get()
+        if messagebox.askyesno("Confirm Delete", 
+                               f"Are you sure you want to delete '{product_name}'?"):
+            self._run_write(self.controller.db.delete_product, self.controller.current_user_id, self.selected_item_id,
+                            busy=self.delete_btn, on_success=self._on_item_deleted,
+                            on_error=lambda e: self._on_write_error("delete", e))
+    
+    def _on_item_deleted(self, row):
+        self.refresh_totals()
+        messagebox.showinfo("Success", "Product deleted successfully!")
+        if self._record_local(row[0], None):
+            self._apply_delete(row[0])
+        self.clear_fields()
+    
+    def _on_items_deleted(self, product_nos):
+        self.refresh_totals()
+        self.selected_product_nos.difference_update(product_nos)
+        self._apply_deletes([product_no for product_no in product_nos if self._record_local(product_no, None)])
+        self.clear_fields()
+        self.status_var.set("")
+        messagebox.showinfo("Success", f"Deleted {len(product_nos):,} products.")
+    
+    def _selected_products(self):
+        if self.selected_product_nos:
+            return sorted(self.selected_product_nos)
+        return [self.selected_item_id] if self.selected_item_id else []
+    
+    def select_all(self, event=None):
+        # Only a view that is fully in memory can be selected as a whole:
+        # a sorted or filtered view, search results, or a short list.
+        if isinstance(self._buffer, columnar.ProductView):
+            product_nos = self._buffer.product_nos()
+        elif self._buffer_start == 0 and len(self._buffer) >= self.total_rows:
+            product_nos = [row[0] for row in self._buffer]
+        else:
+            self.status_var.set("Sort, filter or search to select all products")
+            return "break"
+        self.selected_product_nos = set(product_nos)
+        self._replace_selection = False
+        self._render_window()
+        self.select_item()
+        return "break"
+    
+    def bulk_set_quantity(self):
+        product_nos = self._selected_products()
+        if not product_nos:
+            messagebox.showerror("Error", "Please select the products to update.")
+            return
+        quantity = simpledialog.askinteger("Set Quantity", f"New quantity for {len(product_nos):,} products:",
+                                           parent=self, minvalue=0)
+        if quantity is None:
+            return
+        self._run_write(self.controller.db.set_products_quantity, self.controller.current_user_id, product_nos,
+                        quantity, busy=self.bulk_btn, on_success=self._on_items_updated,
+                        on_error=lambda e: self._on_write_error("update", e))
+    
+    def bulk_adjust_price(self):
+        product_nos = self._selected_products()
+        if not product_nos:
+            messagebox.showerror("Error", "Please select the products to update.")
+            return
+        percent = simpledialog.askfloat("Adjust Price",
+                                        f"Change the price of {len(product_nos):,} products by percent "
+                                        f"(e.g. 10 or -5):", parent=self, minvalue=-100)
+        if not percent:
+            return
+        self._run_write(self.controller.db.adjust_products_price, self.controller.current_user_id, product_nos,
+                        percent, busy=self.bulk_btn, on_success=self._on_items_updated,
+                        on_error=lambda e: self._on_write_error("update", e))
+    
+    def _on_items_updated(self, rows):
+        self.refresh_totals()
+        self._apply_updates([row for row in rows if self._record_local(row[0], tuple(row))])
+        if self.selected_item_id:
+            self.select_item()
+        self.status_var.set(f"Updated {len(rows):,} products")
+    
+    def clear_fields(self):
+        self.product_name.set("")
+        self.quantity.set("0")
+        self.price.set("0.00")
+        self.selected_item_id = None
+        self.selected_product_nos = set()
+        for item in self.tree.selection():
+            self.tree.selection_remove(item)
+        self._update_button_states('clear')
+        self.name_entry.focus()
+
+
+if __name__ == "__main__":
+    timer = StartupTimer(STARTUP_STARTED)
+    timer.mark("import")
+    report = "--startup-timing" in sys.argv or os.environ.get("INVENTORY_STARTUP_TIMING") == "1"
+    server_url = os.environ.get("INVENTORY_SERVER")
+    if "--server" in sys.argv[:-1]:
+        server_url = sys.argv[sys.argv.index("--server") + 1]
+    backend = remote.RemoteDatabase(server_url) if server_url else None
+    shard_dir = os.environ.get("INVENTORY_SHARDS")
+    if "--shards" in sys.argv[:-1]:
+        shard_dir = sys.argv[sys.argv.index("--shards") + 1]
+    if "--db" in sys.argv[:-1]:
+        database.configure(db_file=sys.argv[sys.argv.index("--db") + 1])
+    if shard_dir and backend is None:
+        database.configure(shard_dir=shard_dir)
+    app = MainApplication(startup_timer=timer, report_startup=report, backend=backend)
     app.mainloop()
\ No newline at end of file
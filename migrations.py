@@ -0,0 +1,300 @@
+import passwords
+
+
+def _table_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def _fts5_available(cursor):
+    cursor.execute("PRAGMA compile_options")
+    return any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall())
+
+
+def create_base_tables(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS inventory (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        product_name TEXT NOT NULL,
+        quantity INTEGER NOT NULL CHECK(quantity >= 0),
+        price REAL NOT NULL CHECK(price >= 0),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_user_id ON inventory(user_id)
+    ''')
+
+
+def add_product_numbers(cursor):
+    cursor.execute("PRAGMA table_info(inventory)")
+    cols = [row[1] for row in cursor.fetchall()]
+    if 'product_no' not in cols:
+        cursor.execute("ALTER TABLE inventory ADD COLUMN product_no INTEGER")
+    # Rows still missing a number continue after the user's highest one, so a
+    # partly numbered table cannot collide with the numbers already taken.
+    cursor.execute('''
+    UPDATE inventory SET product_no = ranked.product_no
+    FROM (
+        SELECT i.id, COALESCE(m.max_no, 0) + ROW_NUMBER() OVER (PARTITION BY i.user_id ORDER BY i.id) AS product_no
+        FROM inventory i
+        LEFT JOIN (SELECT user_id, MAX(product_no) AS max_no FROM inventory GROUP BY user_id) AS m
+            ON m.user_id = i.user_id
+        WHERE i.product_no IS NULL
+    ) AS ranked
+    WHERE inventory.id = ranked.id
+    ''')
+    cursor.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_inventory_user_product_no
+    ON inventory(user_id, product_no)
+    ''')
+
+
+def create_search_index(cursor):
+    # SQLite builds without FTS5 fall back to LIKE scans in search_products.
+    if not _fts5_available(cursor):
+        return
+    exists = _table_exists(cursor, 'inventory_fts')
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS inventory_fts USING fts5(
+        product_name, content='inventory', content_rowid='id', prefix='2 3'
+    )
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS inventory_fts_ai AFTER INSERT ON inventory BEGIN
+        INSERT INTO inventory_fts(rowid, product_name) VALUES (new.id, new.product_name);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS inventory_fts_ad AFTER DELETE ON inventory BEGIN
+        INSERT INTO inventory_fts(inventory_fts, rowid, product_name) VALUES ('delete', old.id, old.product_name);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS inventory_fts_au AFTER UPDATE OF product_name ON inventory BEGIN
+        INSERT INTO inventory_fts(inventory_fts, rowid, product_name) VALUES ('delete', old.id, old.product_name);
+        INSERT INTO inventory_fts(rowid, product_name) VALUES (new.id, new.product_name);
+    END
+    ''')
+    if not exists:
+        cursor.execute("INSERT INTO inventory_fts(inventory_fts) VALUES ('rebuild')")
+
+
+def create_summary_table(cursor):
+    exists = _table_exists(cursor, 'inventory_summary')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS inventory_summary (
+        user_id INTEGER PRIMARY KEY,
+        sku_count INTEGER NOT NULL DEFAULT 0,
+        total_units INTEGER NOT NULL DEFAULT 0,
+        total_value REAL NOT NULL DEFAULT 0,
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    )
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS inventory_summary_ai AFTER INSERT ON inventory BEGIN
+        INSERT INTO inventory_summary (user_id, sku_count, total_units, total_value)
+        VALUES (new.user_id, 1, new.quantity, new.quantity * new.price)
+        ON CONFLICT(user_id) DO UPDATE SET
+            sku_count = sku_count + 1,
+            total_units = total_units + excluded.total_units,
+            total_value = total_value + excluded.total_value;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS inventory_summary_ad AFTER DELETE ON inventory BEGIN
+        UPDATE inventory_summary SET
+            sku_count = sku_count - 1,
+            total_units = total_units - old.quantity,
+            total_value = total_value - old.quantity * old.price
+        WHERE user_id = old.user_id;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS inventory_summary_au AFTER UPDATE OF user_id, quantity, price ON inventory BEGIN
+        UPDATE inventory_summary SET
+            sku_count = sku_count - 1,
+            total_units = total_units - old.quantity,
+            total_value = total_value - old.quantity * old.price
+        WHERE user_id = old.user_id;
+        INSERT INTO inventory_summary (user_id, sku_count, total_units, total_value)
+        VALUES (new.user_id, 1, new.quantity, new.quantity * new.price)
+        ON CONFLICT(user_id) DO UPDATE SET
+            sku_count = sku_count + 1,
+            total_units = total_units + excluded.total_units,
+            total_value = total_value + excluded.total_value;
+    END
+    ''')
+    if not exists:
+        cursor.execute('''
+        INSERT INTO inventory_summary (user_id, sku_count, total_units, total_value)
+        SELECT user_id, COUNT(*), SUM(quantity), SUM(quantity * price) FROM inventory GROUP BY user_id
+        ''')
+
+
+def create_stock_ledger(cursor):
+    # Movements reference inventory.id rather than product_no: product numbers
+    # can be reused after a delete, row ids never are.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS stock_movements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        inventory_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        product_no INTEGER NOT NULL,
+        kind TEXT NOT NULL CHECK(kind IN ('receive', 'issue', 'adjust', 'remove')),
+        delta INTEGER NOT NULL,
+        created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+        note TEXT
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_movements_user_created ON stock_movements(user_id, created_at)
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS stock_snapshots (
+        inventory_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        product_no INTEGER NOT NULL,
+        as_of TEXT NOT NULL,
+        last_movement_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        PRIMARY KEY (inventory_id, as_of)
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_snapshots_user_as_of ON stock_snapshots(user_id, as_of)
+    ''')
+    # Existing stock becomes the opening balance of the ledger.
+    cursor.execute('''
+    INSERT OR IGNORE INTO stock_snapshots (inventory_id, user_id, product_no, as_of, last_movement_id, quantity)
+    SELECT id, user_id, product_no, strftime('%Y-%m-%dT%H:%M:%f', 'now'), 0, quantity FROM inventory
+    ''')
+
+
+def create_change_feed(cursor):
+    # One row per change to a product, in commit order. Readers keep the last
+    # seq they have seen and ask only for what came after it.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS inventory_changes (
+        seq INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        product_no INTEGER NOT NULL,
+        op TEXT NOT NULL CHECK(op IN ('insert', 'update', 'delete', 'reload'))
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_changes_user_seq ON inventory_changes(user_id, seq)
+    ''')
+    # Bulk loads park their user here for the length of their transaction and
+    # log a single 'reload' instead of one change per row.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS change_feed_paused (
+        user_id INTEGER PRIMARY KEY
+    )
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS inventory_changes_ai AFTER INSERT ON inventory
+    WHEN NOT EXISTS (SELECT 1 FROM change_feed_paused WHERE user_id = new.user_id) BEGIN
+        INSERT INTO inventory_changes (user_id, product_no, op) VALUES (new.user_id, new.product_no, 'insert');
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS inventory_changes_ad AFTER DELETE ON inventory
+    WHEN NOT EXISTS (SELECT 1 FROM change_feed_paused WHERE user_id = old.user_id) BEGIN
+        INSERT INTO inventory_changes (user_id, product_no, op) VALUES (old.user_id, old.product_no, 'delete');
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS inventory_changes_au AFTER UPDATE OF product_name, quantity, price ON inventory
+    WHEN NOT EXISTS (SELECT 1 FROM change_feed_paused WHERE user_id = new.user_id) BEGIN
+        INSERT INTO inventory_changes (user_id, product_no, op) VALUES (new.user_id, new.product_no, 'update');
+    END
+    ''')
+
+
+def create_product_sequences(cursor):
+    # The next free product_no per user, bumped in the same transaction as the
+    # insert that uses it. Numbers are never handed out twice, even after the
+    # highest product is deleted.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS product_sequences (
+        user_id INTEGER PRIMARY KEY,
+        next_no INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    INSERT OR IGNORE INTO product_sequences (user_id, next_no)
+    SELECT user_id, MAX(product_no) + 1 FROM inventory GROUP BY user_id
+    ''')
+
+
+def add_product_skus(cursor):
+    # Optional barcode/SKU per product, unique within a user. Most products
+    # have none, so the index only holds the ones that do.
+    cursor.execute("PRAGMA table_info(inventory)")
+    cols = [row[1] for row in cursor.fetchall()]
+    if 'sku' not in cols:
+        cursor.execute("ALTER TABLE inventory ADD COLUMN sku TEXT")
+    cursor.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_inventory_user_sku
+    ON inventory(user_id, sku) WHERE sku IS NOT NULL
+    ''')
+
+
+def hash_legacy_passwords(cursor):
+    # Accounts created before hashing still hold their password in plain
+    # text; hash them all now rather than waiting for each user's next login.
+    # Shards keep an empty password on their copy of the user row, which is
+    # not a credential and stays as it is.
+    cursor.execute("SELECT id, password FROM users WHERE password != ''")
+    legacy = [(user_id, password) for user_id, password in cursor.fetchall() if not passwords.is_hashed(password)]
+    if not legacy:
+        return
+    hashes = passwords.map_hash([password for _, password in legacy])
+    cursor.executemany("UPDATE users SET password = ? WHERE id = ?",
+                       [(password_hash, user_id) for (user_id, _), password_hash in zip(legacy, hashes)])
+
+
+# Append only: a migration's position is its schema version, stored in
+# PRAGMA user_version once it has been applied.
+MIGRATIONS = [
+    create_base_tables,
+    add_product_numbers,
+    create_search_index,
+    create_summary_table,
+    create_stock_ledger,
+    create_change_feed,
+    create_product_sequences,
+    add_product_skus,
+    hash_legacy_passwords,
+]
+
+LATEST_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(manager):
+    with manager.reader() as conn:
+        if schema_version(conn) >= LATEST_VERSION:
+            return False
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        with manager.writer() as conn:
+            # Re-check under the write lock; another process may have
+            # applied this step since the read above.
+            if schema_version(conn) >= version:
+                continue
+            cursor = conn.cursor()
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {version}")
+    return True
@@ -0,0 +1,149 @@
+import base64
+import hashlib
+import hmac
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+DEFAULT_TARGET_MS = 100
+
+# Cost is log2(N) for scrypt and log2(iterations) for the PBKDF2 fallback.
+DEFAULT_COSTS = {'scrypt': 14, 'pbkdf2_sha256': 20}
+COST_RANGES = {'scrypt': (10, 20), 'pbkdf2_sha256': (16, 24)}
+
+ALGORITHM = 'scrypt' if hasattr(hashlib, 'scrypt') else 'pbkdf2_sha256'
+COST = int(os.environ.get("INVENTORY_PASSWORD_COST", DEFAULT_COSTS[ALGORITHM]))
+
+_pool = None
+
+
+def configure(cost=None, algorithm=None):
+    global COST, ALGORITHM
+    if algorithm is not None:
+        if algorithm not in COST_RANGES:
+            raise ValueError("Algorithm must be 'scrypt' or 'pbkdf2_sha256'")
+        ALGORITHM = algorithm
+        if cost is None:
+            COST = DEFAULT_COSTS[algorithm]
+    if cost is not None:
+        low, high = COST_RANGES[ALGORITHM]
+        if not low <= cost <= high:
+            raise ValueError(f"Cost must be between {low} and {high}")
+        COST = cost
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def _derive(algorithm, password, salt, cost):
+    secret = password.encode('utf-8')
+    if algorithm == 'scrypt':
+        n = 1 << cost
+        return hashlib.scrypt(secret, salt=salt, n=n, r=SCRYPT_R, p=SCRYPT_P,
+                              maxmem=256 * SCRYPT_R * n, dklen=KEY_BYTES)
+    if algorithm == 'pbkdf2_sha256':
+        return hashlib.pbkdf2_hmac('sha256', secret, salt, 1 << cost, dklen=KEY_BYTES)
+    raise ValueError(f"Unsupported password algorithm: {algorithm}")
+
+
+def _parse(stored):
+    parts = stored.split('$')
+    if len(parts) != 4 or parts[0] not in ('scrypt', 'pbkdf2_sha256') or not parts[1].isdigit():
+        return None
+    try:
+        return parts[0], int(parts[1]), base64.b64decode(parts[2]), base64.b64decode(parts[3])
+    except ValueError:
+        return None
+
+
+def hash_password(password, cost=None, algorithm=None):
+    algorithm = algorithm or ALGORITHM
+    cost = COST if cost is None else cost
+    salt = os.urandom(SALT_BYTES)
+    key = _derive(algorithm, password, salt, cost)
+    return f"{algorithm}${cost}${_b64(salt)}${_b64(key)}"
+
+
+def is_hashed(stored):
+    return _parse(stored) is not None
+
+
+def verify_password(password, stored):
+    parsed = _parse(stored)
+    if parsed is None:
+        # Plaintext rows are hashed by the schema migration; anything else
+        # that does not parse is never a match.
+        return False
+    algorithm, cost, salt, key = parsed
+    return hmac.compare_digest(_derive(algorithm, password, salt, cost), key)
+
+
+def needs_rehash(stored):
+    parsed = _parse(stored)
+    return parsed is None or parsed[0] != ALGORITHM or parsed[1] != COST
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # hashlib releases the GIL while deriving keys, so threads run in parallel.
+        _pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 2, thread_name_prefix="password")
+    return _pool
+
+
+def submit(func, *args):
+    return _get_pool().submit(func, *args)
+
+
+def verify_async(password, stored):
+    return submit(verify_password, password, stored)
+
+
+def hash_async(password, cost=None):
+    return submit(hash_password, password, cost)
+
+
+def map_hash(plaintexts):
+    return list(_get_pool().map(hash_password, plaintexts))
+
+
+def benchmark(cost, algorithm=None, rounds=3):
+    algorithm = algorithm or ALGORITHM
+    salt = os.urandom(SALT_BYTES)
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        _derive(algorithm, "calibration-password", salt, cost)
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+def calibrate(target_ms=DEFAULT_TARGET_MS, algorithm=None, rounds=3):
+    algorithm = algorithm or ALGORITHM
+    cost, max_cost = COST_RANGES[algorithm]
+    results = []
+    while cost <= max_cost:
+        elapsed = benchmark(cost, algorithm, rounds)
+        results.append((cost, elapsed))
+        if elapsed >= target_ms:
+            break
+        cost += 1
+    best = min(results, key=lambda item: abs(item[1] - target_ms))
+    return best[0], results
+
+
+if __name__ == "__main__":
+    target = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_TARGET_MS
+    if len(sys.argv) > 1 and sys.argv[1] == 'calibrate':
+        chosen, measured = calibrate(target)
+        for measured_cost, measured_ms in measured:
+            print(f"{ALGORITHM} cost {measured_cost}: {measured_ms:.1f} ms")
+        print(f"Recommended: INVENTORY_PASSWORD_COST={chosen} (target {target:.0f} ms)")
+    else:
+        print("Usage: python passwords.py calibrate [TARGET_MS]")
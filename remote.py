@@ -0,0 +1,346 @@
+import csv
+import http.client
+import json
+import socket
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import columnar
+import database
+
+DEFAULT_TIMEOUT = 30.0
+IMPORT_CHUNK_RECORDS = database.IMPORT_BATCH_SIZE
+EXPORT_READ_BYTES = 1 << 20
+WRITE_WORKERS = 4
+PAGE_SIZE = database.PAGE_SIZE
+SEARCH_LIMIT = database.SEARCH_LIMIT
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=DEFAULT_TIMEOUT):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def _decode(value):
+    # JSON has no tuples; rows come back as flat lists and are turned back
+    # into the tuples the local database functions return.
+    if isinstance(value, list):
+        if value and all(not isinstance(item, (list, dict)) for item in value):
+            return tuple(value)
+        return [_decode(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _decode(item) for key, item in value.items()}
+    return value
+
+
+def _reply(response, data):
+    try:
+        reply = json.loads(data)
+    except ValueError:
+        raise Exception(f"Invalid response from inventory server (HTTP {response.status})")
+    if response.status == 200:
+        return _decode(reply['result'])
+    if reply.get('type') == 'ValueError':
+        raise ValueError(reply['error'])
+    raise Exception(reply.get('error', f"HTTP {response.status}"))
+
+
+def _import_chunks(stream, fmt, size=IMPORT_CHUNK_RECORDS):
+    # Yields (text, line_offset): pieces of the file of about `size` records
+    # each, cut only between records, and what to add to a line number within
+    # a piece to get the line in the file. CSV pieces repeat the header.
+    if fmt == 'jsonl':
+        lines = []
+        start = 1
+        for line_no, line in enumerate(stream, start=1):
+            lines.append(line)
+            if len(lines) >= size:
+                yield ''.join(lines), start - 1
+                lines = []
+                start = line_no + 1
+        if lines:
+            yield ''.join(lines), start - 1
+        return
+    raw = []
+
+    def source():
+        for line in stream:
+            raw.append(line)
+            yield line
+
+    reader = csv.reader(source())
+    try:
+        next(reader)
+    except StopIteration:
+        return
+    except csv.Error:
+        pass
+    header = ''.join(raw)
+    raw.clear()
+    start = reader.line_num + 1
+    records = 0
+    while True:
+        try:
+            next(reader)
+        except StopIteration:
+            break
+        except csv.Error:
+            # Passed through as it is; the server reports it for its line.
+            pass
+        records += 1
+        if records >= size:
+            yield header + ''.join(raw), start - 2
+            raw.clear()
+            start = reader.line_num + 1
+            records = 0
+    if raw:
+        yield header + ''.join(raw), start - 2
+
+
+class RemoteDatabase:
+    PAGE_SIZE = PAGE_SIZE
+    SEARCH_LIMIT = SEARCH_LIMIT
+
+    def __init__(self, url, timeout=DEFAULT_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        parsed = urllib.parse.urlparse(url)
+        if parsed.scheme == 'unix':
+            self._connect = lambda: UnixHTTPConnection(parsed.path, timeout)
+        elif parsed.scheme == 'http':
+            host, port = parsed.hostname, parsed.port or 80
+            self._connect = lambda: http.client.HTTPConnection(host, port, timeout=timeout)
+        else:
+            raise ValueError("Server URL must start with http:// or unix://")
+        self._local = threading.local()
+        self._writes = None
+        self._pending_writes = set()
+        self._writes_lock = threading.Lock()
+
+    def _request(self, method, path, payload=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        while True:
+            conn = getattr(self._local, 'conn', None)
+            reused = conn is not None
+            if conn is None:
+                conn = self._local.conn = self._connect()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    conn.close()
+                    self._local.conn = None
+                break
+            except (ConnectionError, http.client.HTTPException, OSError) as e:
+                conn.close()
+                self._local.conn = None
+                # A kept-alive connection the server dropped (e.g. after a
+                # restart) fails before the request is read, so it is safe to
+                # resend on a fresh connection; anything else is reported.
+                stale = isinstance(e, (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError))
+                if not (reused and stale):
+                    raise Exception(f"Failed to reach inventory server at {self.url}: {str(e)}")
+        return _reply(response, data)
+
+    def call(self, name, *args, **kwargs):
+        return self._request('POST', f"/api/{name}", {'args': list(args), 'kwargs': kwargs})
+
+    def submit_write(self, func, *args, **kwargs):
+        # The server already group-commits concurrent requests, so the client
+        # only needs to keep several writes in flight at once.
+        with self._writes_lock:
+            if self._writes is None:
+                self._writes = ThreadPoolExecutor(max_workers=WRITE_WORKERS, thread_name_prefix="remote-write")
+            future = self._writes.submit(func, *args, **kwargs)
+            self._pending_writes.add(future)
+        future.add_done_callback(self._write_done)
+        return future
+
+    def _write_done(self, future):
+        with self._writes_lock:
+            self._pending_writes.discard(future)
+
+    def flush_writes(self, timeout=None):
+        with self._writes_lock:
+            pending = list(self._pending_writes)
+        return not wait(pending, timeout).not_done
+
+    def write_batch_stats(self):
+        return self.call('write_batch_stats')
+
+    def init_db(self):
+        self._request('GET', '/health')
+        return False
+
+    def register_user(self, username, password):
+        return self.call('register_user', username, password)
+
+    def check_user(self, username, password):
+        return self.call('check_user', username, password)
+
+    def add_product(self, user_id, name, quantity, price, sku=None):
+        return self.call('add_product', user_id, name, quantity, price, sku)
+
+    def reserve_product_nos(self, user_id, count):
+        return tuple(self.call('reserve_product_nos', user_id, count))
+
+    def update_product(self, user_id, product_no, name, quantity, price):
+        return self.call('update_product', user_id, product_no, name, quantity, price)
+
+    def delete_product(self, user_id, product_no):
+        return self.call('delete_product', user_id, product_no)
+
+    def delete_products(self, user_id, product_nos):
+        return self.call('delete_products', user_id, list(product_nos))
+
+    def set_products_quantity(self, user_id, product_nos, quantity):
+        return self.call('set_products_quantity', user_id, list(product_nos), quantity)
+
+    def adjust_products_price(self, user_id, product_nos, percent):
+        return self.call('adjust_products_price', user_id, list(product_nos), percent)
+
+    def receive_stock(self, user_id, product_no, quantity, note=None):
+        return self.call('receive_stock', user_id, product_no, quantity, note=note)
+
+    def issue_stock(self, user_id, product_no, quantity, note=None):
+        return self.call('issue_stock', user_id, product_no, quantity, note=note)
+
+    def adjust_stock(self, user_id, product_no, delta, note=None):
+        return self.call('adjust_stock', user_id, product_no, delta, note=note)
+
+    def scan_product(self, user_id, sku, quantity=1, kind='receive', note=None):
+        return self.call('scan_product', user_id, sku, quantity, kind, note=note)
+
+    def set_product_sku(self, user_id, product_no, sku):
+        return self.call('set_product_sku', user_id, product_no, sku)
+
+    def find_product_by_sku(self, user_id, sku):
+        return self.call('find_product_by_sku', user_id, sku)
+
+    def product_sku(self, user_id, product_no):
+        return self.call('product_sku', user_id, product_no)
+
+    def view_products(self, user_id):
+        return self.call('view_products', user_id)
+
+    def products_page(self, user_id, after_product_no=None, limit=PAGE_SIZE, direction='asc'):
+        return self.call('products_page', user_id, after_product_no, limit, direction)
+
+    def view_products_window(self, user_id, offset, limit):
+        return self.call('view_products_window', user_id, offset, limit)
+
+    def load_products(self, user_id):
+        return self.call('load_products', user_id)
+
+    def count_products(self, user_id):
+        return self.call('count_products', user_id)
+
+    def get_inventory_summary(self, user_id):
+        return self.call('get_inventory_summary', user_id)
+
+    def search_products(self, user_id, text, limit=SEARCH_LIMIT, cancel=None):
+        # The server cannot see the caller's cancel event; a superseded search
+        # simply runs to completion and its result is discarded.
+        return self.call('search_products', user_id, text, limit)
+
+    def product_snapshot(self, user_id):
+        rows = self.call('view_products', user_id)
+        return columnar.ColumnarSnapshot.from_rows(rows)
+
+    def stock_as_of(self, user_id, at, product_no=None):
+        return self.call('stock_as_of', user_id, str(at), product_no)
+
+    def product_movements(self, user_id, product_no, limit=100):
+        return self.call('product_movements', user_id, product_no, limit)
+
+    def compact_movements(self, before=None):
+        return self.call('compact_movements', str(before) if before is not None else None)
+
+    def change_seq(self, user_id=None):
+        return self.call('change_seq', user_id)
+
+    def changes_since(self, user_id, seq, limit=database.CHANGE_FEED_LIMIT):
+        return self.call('changes_since', user_id, seq, limit)
+
+    def prune_changes(self, keep=database.CHANGE_LOG_KEEP):
+        return self.call('prune_changes', keep)
+
+    def import_products(self, user_id, path, progress=None, fmt=None):
+        # Sent as a series of requests of IMPORT_CHUNK_RECORDS records each,
+        # so neither side ever holds the whole file.
+        result = {'imported': 0, 'errors': [], 'error_count': 0, 'first_product_no': None, 'last_product_no': None}
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            if fmt is None:
+                if str(path).lower().endswith(('.jsonl', '.json')):
+                    fmt = 'jsonl'
+                elif str(path).lower().endswith('.csv'):
+                    fmt = 'csv'
+                else:
+                    fmt = 'jsonl' if f.read(256).lstrip().startswith('{') else 'csv'
+                    f.seek(0)
+            lines = 0
+            for text, offset in _import_chunks(f, fmt):
+                part = self.call('import_products', user_id, text, fmt)
+                result['imported'] += part['imported']
+                result['error_count'] += part['error_count']
+                room = database.IMPORT_MAX_ERRORS - len(result['errors'])
+                result['errors'].extend((line + offset, error) for line, error in part['errors'][:room])
+                if part['first_product_no'] is not None:
+                    if result['first_product_no'] is None:
+                        result['first_product_no'] = part['first_product_no']
+                    result['last_product_no'] = part['last_product_no']
+                lines += part['imported'] + part['error_count']
+                if progress:
+                    progress(lines, result['imported'])
+        return result
+
+    def export_products(self, path, user_id=None, progress=None, fmt=None):
+        # Streamed: the server sends the export in chunks as it reads it and
+        # they go straight to the file.
+        if fmt is None:
+            fmt = 'jsonl' if str(path).lower().endswith(('.jsonl', '.json')) else 'csv'
+        body = json.dumps({'args': [user_id, fmt], 'kwargs': {}}).encode('utf-8')
+        started = time.perf_counter()
+        # Rows are counted by line ends; a CSV header line is not a row.
+        rows = -1 if fmt == 'csv' else 0
+        conn = self._connect()
+        try:
+            conn.request('POST', '/stream/export_products', body=body, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            if response.status != 200:
+                _reply(response, response.read())
+            with open(path, 'wb') as f:
+                while True:
+                    chunk = response.read(EXPORT_READ_BYTES)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    rows += chunk.count(b'\n')
+                    if progress:
+                        progress(max(0, rows))
+        except (ConnectionError, http.client.HTTPException, OSError) as e:
+            raise Exception(f"Failed to export products from {self.url}: {str(e)}")
+        finally:
+            conn.close()
+        rows = max(0, rows)
+        seconds = time.perf_counter() - started
+        return {'rows': rows, 'seconds': seconds, 'rows_per_sec': rows / seconds if seconds > 0 else 0.0}
+
+    def shard_stats(self):
+        return self.call('shard_stats')
+
+    def cache_stats(self):
+        return self.call('cache_stats')
+
+    def stats(self):
+        return self._request('GET', '/stats')
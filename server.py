@@ -0,0 +1,367 @@
+import argparse
+import asyncio
+import functools
+import io
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import connection
+import database
+import instrumentation
+import migrations
+import shards
+
+# There is no authentication: keep the server on loopback or a Unix socket
+# whose directory permissions limit who can connect.
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 256 * 1024 * 1024
+LONG_WRITE_WORKERS = 2
+STREAM_WORKERS = 2
+STREAM_CHUNK_BYTES = 1 << 20
+
+
+def import_text(user_id, text, fmt=None):
+    return database.import_products(user_id, io.StringIO(text), fmt=fmt or None)
+
+
+def export_stream(stream, user_id=None, fmt='csv'):
+    return database.export_products(stream, user_id=user_id, fmt=fmt)
+
+
+def health():
+    with database.connect_db().reader() as conn:
+        version = migrations.schema_version(conn)
+    return {'status': 'ok', 'schema_version': version, 'db_file': os.path.abspath(database.DB_FILE)}
+
+
+READ_OPERATIONS = {
+    'check_user': database.check_user,
+    'view_products': database.view_products,
+    'products_page': database.products_page,
+    'view_products_window': database.view_products_window,
+    'load_products': database.load_products,
+    'count_products': database.count_products,
+    'get_inventory_summary': database.get_inventory_summary,
+    'search_products': database.search_products,
+    'stock_as_of': database.stock_as_of,
+    'product_movements': database.product_movements,
+    'find_product_by_sku': database.find_product_by_sku,
+    'product_sku': database.product_sku,
+    'change_seq': database.change_seq,
+    'changes_since': database.changes_since,
+    'cache_stats': database.cache_stats,
+    'shard_stats': database.shard_stats,
+    'write_batch_stats': database.write_batch_stats,
+    'stats': instrumentation.snapshot,
+    'health': health,
+}
+
+WRITE_OPERATIONS = {
+    'add_product': database.add_product,
+    'reserve_product_nos': database.reserve_product_nos,
+    'update_product': database.update_product,
+    'delete_product': database.delete_product,
+    'delete_products': database.delete_products,
+    'set_products_quantity': database.set_products_quantity,
+    'adjust_products_price': database.adjust_products_price,
+    'receive_stock': database.receive_stock,
+    'issue_stock': database.issue_stock,
+    'adjust_stock': database.adjust_stock,
+    'scan_product': database.scan_product,
+    'set_product_sku': database.set_product_sku,
+}
+
+# Writes that take their own transactions and can run for a long time. In a
+# group-commit batch an import's chunks would become savepoints of one
+# transaction, and register_user would hash the password while the write lock
+# is held, stalling every other client's writes.
+LONG_WRITE_OPERATIONS = {
+    'register_user': database.register_user,
+    'compact_movements': database.compact_movements,
+    'prune_changes': database.prune_changes,
+    'import_products': import_text,
+}
+
+
+# Reads whose result is written to the response as it is produced, in HTTP
+# chunks, instead of being returned as one JSON value. Each takes the stream
+# as its first argument.
+STREAM_OPERATIONS = {
+    'export_products': export_stream,
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class StreamAborted(Exception):
+    # The response was already under way when the operation failed, so the
+    # only way left to signal it is to drop the connection mid-body.
+    pass
+
+
+class ChunkedStream:
+    # File-like target for a streaming operation running on a worker thread.
+    # Text is buffered and sent as HTTP chunks on the event loop; the worker
+    # waits for each chunk to drain, so a slow client slows the export down
+    # instead of letting it pile up in memory.
+    def __init__(self, loop, writer, keep_alive, chunk_bytes=STREAM_CHUNK_BYTES):
+        self.loop = loop
+        self.writer = writer
+        self.keep_alive = keep_alive
+        self.chunk_bytes = chunk_bytes
+        self.started = False
+        self._parts = []
+        self._size = 0
+
+    def write(self, text):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.chunk_bytes:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if not self._parts:
+            return
+        data = ''.join(self._parts).encode('utf-8')
+        self._parts.clear()
+        self._size = 0
+        asyncio.run_coroutine_threadsafe(self._send(data), self.loop).result()
+
+    async def _send(self, data):
+        if not self.started:
+            self.started = True
+            self.writer.write(f"HTTP/1.1 200 OK\r\n"
+                              f"Content-Type: application/octet-stream\r\n"
+                              f"Transfer-Encoding: chunked\r\n"
+                              f"Connection: {'keep-alive' if self.keep_alive else 'close'}\r\n\r\n"
+                              .encode('latin-1'))
+        if data:
+            self.writer.write(f"{len(data):x}\r\n".encode('latin-1') + data + b"\r\n")
+        await self.writer.drain()
+
+    async def finish(self):
+        await self._send(b'')
+        self.writer.write(b"0\r\n\r\n")
+        await self.writer.drain()
+
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class InventoryServer:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None, readers=connection.DEFAULT_READERS):
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self._read_pool = ThreadPoolExecutor(max_workers=max(1, readers), thread_name_prefix="server-read")
+        self._long_write_pool = ThreadPoolExecutor(max_workers=LONG_WRITE_WORKERS,
+                                                   thread_name_prefix="server-long-write")
+        # Streams can run for minutes, so they do not hold read-pool threads.
+        self._stream_pool = ThreadPoolExecutor(max_workers=STREAM_WORKERS, thread_name_prefix="server-stream")
+        self._server = None
+
+    async def start(self):
+        await asyncio.get_running_loop().run_in_executor(self._read_pool, database.init_db)
+        if self.unix_path:
+            if os.path.exists(self.unix_path):
+                os.remove(self.unix_path)
+            self._server = await asyncio.start_unix_server(self._handle_client, path=self.unix_path,
+                                                           limit=MAX_HEADER_BYTES)
+        else:
+            self._server = await asyncio.start_server(self._handle_client, self.host, self.port,
+                                                      limit=MAX_HEADER_BYTES)
+            self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    @property
+    def address(self):
+        return f"unix://{self.unix_path}" if self.unix_path else f"http://{self.host}:{self.port}"
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._long_write_pool.shutdown(wait=True)
+        self._stream_pool.shutdown(wait=True)
+        await asyncio.get_running_loop().run_in_executor(self._read_pool, database.flush_writes)
+        self._read_pool.shutdown(wait=True)
+        if self.unix_path and os.path.exists(self.unix_path):
+            os.remove(self.unix_path)
+
+    async def call(self, name, args, kwargs):
+        loop = asyncio.get_running_loop()
+        if name in WRITE_OPERATIONS:
+            # Every client's writes go through the one group-commit queue.
+            return await asyncio.wrap_future(database.submit_write(WRITE_OPERATIONS[name], *args, **kwargs))
+        if name in LONG_WRITE_OPERATIONS:
+            return await loop.run_in_executor(self._long_write_pool,
+                                              functools.partial(LONG_WRITE_OPERATIONS[name], *args, **kwargs))
+        if name in READ_OPERATIONS:
+            return await loop.run_in_executor(self._read_pool,
+                                              functools.partial(READ_OPERATIONS[name], *args, **kwargs))
+        raise HTTPError(404, f"Unknown operation: {name}")
+
+    async def _read_request(self, reader):
+        try:
+            request_line = await reader.readline()
+        except (asyncio.LimitOverrunError, ValueError):
+            raise HTTPError(400, "Request line too long")
+        if not request_line:
+            return None
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3:
+            raise HTTPError(400, "Malformed request line")
+        method, path, version = parts
+        headers = {}
+        while True:
+            try:
+                line = await reader.readline()
+            except (asyncio.LimitOverrunError, ValueError):
+                raise HTTPError(400, "Header line too long")
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length < 0:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b''
+        keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+        return method, path, body, keep_alive
+
+    async def stream(self, name, args, kwargs, writer, keep_alive):
+        if name not in STREAM_OPERATIONS:
+            raise HTTPError(404, f"Unknown stream: {name}")
+        loop = asyncio.get_running_loop()
+        stream = ChunkedStream(loop, writer, keep_alive)
+        try:
+            await loop.run_in_executor(self._stream_pool,
+                                       functools.partial(STREAM_OPERATIONS[name], stream, *args, **kwargs))
+        except Exception as e:
+            if stream.started:
+                raise StreamAborted(str(e))
+            raise
+        await loop.run_in_executor(self._stream_pool, stream.flush)
+        await stream.finish()
+
+    async def _dispatch(self, method, path, body, writer=None, keep_alive=False):
+        # Returns the result to send as JSON, or None once a stream has
+        # written its own response.
+        if path in ('/health', '/stats'):
+            return await self.call(path[1:], (), {})
+        if path.startswith('/api/'):
+            prefix = '/api/'
+        elif path.startswith('/stream/'):
+            prefix = '/stream/'
+        else:
+            raise HTTPError(404, f"Unknown path: {path}")
+        if method != 'POST':
+            raise HTTPError(405, "Use POST for API calls")
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError as e:
+            raise HTTPError(400, f"Invalid JSON: {str(e)}")
+        args = payload.get('args', [])
+        kwargs = payload.get('kwargs', {})
+        if not isinstance(args, list) or not isinstance(kwargs, dict):
+            raise HTTPError(400, "'args' must be a list and 'kwargs' an object")
+        if prefix == '/stream/':
+            await self.stream(path[len(prefix):], args, kwargs, writer, keep_alive)
+            return None
+        return await self.call(path[len(prefix):], args, kwargs)
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                # Until the request parses, an error response closes the connection.
+                keep_alive = False
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, path, body, keep_alive = request
+                    streamed = path.startswith('/stream/')
+                    status, payload = 200, {'result': await self._dispatch(method, path, body, writer, keep_alive)}
+                    if streamed:
+                        if not keep_alive:
+                            break
+                        continue
+                except StreamAborted:
+                    break
+                except HTTPError as e:
+                    status, payload, keep_alive = e.status, {'error': str(e), 'type': 'HTTPError'}, False
+                except (ValueError, TypeError) as e:
+                    status, payload = 400, {'error': str(e), 'type': 'ValueError'}
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    status, payload = 500, {'error': str(e), 'type': 'Exception'}
+                data = json.dumps(payload).encode('utf-8')
+                writer.write(f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\n"
+                             f"Content-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def _serve(args):
+    server = await InventoryServer(args.host, args.port, args.unix, args.readers).start()
+    print(f"Serving {os.path.abspath(database.DB_FILE)} on {server.address}", file=sys.stderr)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the inventory database over local HTTP/JSON.")
+    parser.add_argument('--db', default=database.DB_FILE, help="SQLite database file")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', help="Listen on this Unix socket instead of TCP")
+    parser.add_argument('--readers', type=int, default=connection.DEFAULT_READERS)
+    parser.add_argument('--shards', help="Keep each user's inventory in its own file in this directory; "
+                                         "--db is then the user catalog")
+    parser.add_argument('--max-open-shards', type=int, default=shards.DEFAULT_MAX_OPEN)
+    parser.add_argument('--batch-max', type=int, default=database.WRITE_BATCH_MAX,
+                        help="Most writes committed in one transaction")
+    parser.add_argument('--batch-window-ms', type=float, default=database.WRITE_BATCH_WINDOW_MS,
+                        help="How long a lone write waits for company before committing")
+    args = parser.parse_args(argv)
+    database.configure(db_file=args.db, readers=args.readers, batch_max=args.batch_max,
+                       batch_window_ms=args.batch_window_ms, shard_dir=args.shards,
+                       max_open_shards=args.max_open_shards)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import argparse
+import collections
+import os
+import re
+import sqlite3
+import sys
+import threading
+
+import connection
+import migrations
+
+DEFAULT_MAX_OPEN = 64
+CATALOG_NAME = 'catalog.db'
+SHARD_PATTERN = re.compile(r'^user_(\d+)\.db$')
+# Everything keyed by user that moves into the user's shard when splitting.
+SHARDED_TABLES = ('inventory', 'stock_movements', 'stock_snapshots', 'product_sequences')
+
+
+def shard_path(directory, user_id):
+    return os.path.join(directory, f"user_{int(user_id)}.db")
+
+
+def shard_user_ids(directory):
+    if not os.path.isdir(directory):
+        return []
+    ids = []
+    for name in os.listdir(directory):
+        match = SHARD_PATTERN.match(name)
+        if match:
+            ids.append(int(match.group(1)))
+    ids.sort()
+    return ids
+
+
+class ShardMap:
+    def __init__(self, directory, open_shard, max_open=DEFAULT_MAX_OPEN):
+        self.directory = directory
+        self.max_open = max(1, max_open)
+        self._open_shard = open_shard
+        self._managers = collections.OrderedDict()
+        self._opening = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.opened = 0
+        self.evicted = 0
+
+    def path_for(self, user_id):
+        return shard_path(self.directory, user_id)
+
+    def user_ids(self):
+        return shard_user_ids(self.directory)
+
+    def get(self, user_id):
+        with self._lock:
+            manager = self._managers.get(user_id)
+            if manager is not None:
+                self._managers.move_to_end(user_id)
+                self.hits += 1
+                return manager
+            opening = self._opening.setdefault(user_id, threading.Lock())
+        # Opening runs migrations, so it happens outside the map lock; the
+        # per-user lock keeps two threads from opening the same shard.
+        with opening:
+            with self._lock:
+                manager = self._managers.get(user_id)
+                if manager is not None:
+                    self._managers.move_to_end(user_id)
+                    return manager
+            os.makedirs(self.directory, exist_ok=True)
+            manager = self._open_shard(self.path_for(user_id), user_id)
+            evicted = []
+            with self._lock:
+                self._managers[user_id] = manager
+                self._opening.pop(user_id, None)
+                self.opened += 1
+                while len(self._managers) > self.max_open:
+                    evicted.append(self._managers.popitem(last=False)[1])
+                    self.evicted += 1
+            # Retired rather than closed: another thread may still hold the
+            # manager, and it keeps working for that thread, just unpooled.
+            # Outside the map lock, since retiring waits for a write in progress.
+            for old in evicted:
+                old.retire()
+            return manager
+
+    def set_trace_callback(self, callback):
+        # Shards opened later get the callback from the open_shard function.
+        with self._lock:
+            managers = list(self._managers.values())
+        for manager in managers:
+            manager.set_trace_callback(callback)
+
+    def close(self):
+        with self._lock:
+            managers = list(self._managers.values())
+            self._managers.clear()
+        for manager in managers:
+            manager.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'open': len(self._managers),
+                'max_open': self.max_open,
+                'hits': self.hits,
+                'opened': self.opened,
+                'evicted': self.evicted,
+            }
+
+
+def split_database(source, directory, catalog=None, progress=None):
+    # Leaves the source untouched: users go to a new catalog, and each user's
+    # rows to their own shard. Users without products get a shard on first use.
+    catalog = catalog or os.path.join(directory, CATALOG_NAME)
+    if not os.path.exists(source):
+        raise ValueError(f"Database file not found: {source}")
+    if os.path.exists(catalog):
+        raise ValueError(f"Catalog already exists: {catalog}")
+    os.makedirs(directory, exist_ok=True)
+    source_uri = f"file:{os.path.abspath(source)}?mode=ro"
+    try:
+        src = sqlite3.connect(source_uri, uri=True)
+        try:
+            if migrations.schema_version(src) != migrations.LATEST_VERSION:
+                raise ValueError("Open the database with the application once to upgrade it before splitting")
+            users = src.execute("SELECT id, username, password FROM users ORDER BY id").fetchall()
+            counts = dict(src.execute("SELECT user_id, COUNT(*) FROM inventory GROUP BY user_id").fetchall())
+        finally:
+            src.close()
+
+        manager = connection.ConnectionManager(catalog)
+        try:
+            migrations.migrate(manager)
+            with manager.writer() as conn:
+                conn.executemany("INSERT INTO users (id, username, password) VALUES (?, ?, ?)", users)
+        finally:
+            manager.close()
+
+        stats = {'catalog': catalog, 'users': len(users), 'shards': 0, 'products': 0}
+        for user_id, username, _ in users:
+            if not counts.get(user_id):
+                continue
+            path = shard_path(directory, user_id)
+            if os.path.exists(path):
+                raise ValueError(f"Shard already exists: {path}")
+            manager = connection.ConnectionManager(path)
+            try:
+                migrations.migrate(manager)
+            finally:
+                manager.close()
+            conn = sqlite3.connect(path, uri=True, isolation_level=None)
+            try:
+                conn.execute("ATTACH DATABASE ? AS src", (source_uri,))
+                conn.execute("BEGIN IMMEDIATE")
+                # Shards keep a password-less copy of the user row so the
+                # foreign keys hold; credentials live only in the catalog.
+                conn.execute("INSERT INTO users (id, username, password) VALUES (?, ?, '')", (user_id, username))
+                for table in SHARDED_TABLES:
+                    columns = ', '.join(row[1] for row in conn.execute(f"PRAGMA src.table_info({table})"))
+                    conn.execute(f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM src.{table} "
+                                 f"WHERE user_id = ?", (user_id,))
+                # The copy went through the change-feed triggers; a new shard
+                # starts with no history for clients to replay.
+                conn.execute("DELETE FROM inventory_changes")
+                conn.execute("COMMIT")
+                conn.execute("DETACH DATABASE src")
+            finally:
+                conn.close()
+            stats['shards'] += 1
+            stats['products'] += counts[user_id]
+            if progress:
+                progress(stats['shards'], stats['products'])
+        return stats
+    except sqlite3.Error as e:
+        raise Exception(f"Failed to split database: {str(e)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Split a single inventory database into per-user shards.")
+    parser.add_argument('source', help="Existing inventory database")
+    parser.add_argument('directory', help="Directory for the catalog and shard files")
+    parser.add_argument('--catalog', help=f"Catalog file (default: DIRECTORY/{CATALOG_NAME})")
+    args = parser.parse_args(argv)
+    stats = split_database(args.source, args.directory, args.catalog,
+                           progress=lambda shards, products: print(f"\r{shards:,} shards, {products:,} products",
+                                                                   end='', file=sys.stderr, flush=True))
+    print(file=sys.stderr)
+    print(f"Split {stats['products']:,} products for {stats['users']:,} users into {stats['shards']:,} shards. "
+          f"Run with --db {stats['catalog']} --shards {args.directory}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
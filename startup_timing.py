@@ -0,0 +1,23 @@
+import sys
+import time
+
+
+class StartupTimer:
+    def __init__(self, started=None):
+        self.started = time.perf_counter() if started is None else started
+        self.marks = {}
+
+    def mark(self, name):
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.started
+        return self.marks[name]
+
+    def has(self, *names):
+        return all(name in self.marks for name in names)
+
+    def report(self, stream=None):
+        stream = stream or sys.stderr
+        stream.write("Startup timing (ms since launch):\n")
+        for name, elapsed in sorted(self.marks.items(), key=lambda item: item[1]):
+            stream.write(f"  {name:<14}{elapsed * 1000:>10.1f}\n")
+        stream.flush()
@@ -0,0 +1,118 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+DEFAULT_MAX_BATCH = 256
+DEFAULT_WINDOW_MS = 2
+
+
+class _Flush:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+def apply_batch(manager, calls):
+    # The whole batch shares one transaction; each call's own writer() becomes
+    # a savepoint, so a failing call only undoes itself. If the final COMMIT
+    # fails, every call in the batch fails with it.
+    outcomes = []
+    try:
+        with manager.writer():
+            for func, args, kwargs in calls:
+                try:
+                    outcomes.append((True, func(*args, **kwargs)))
+                except Exception as e:
+                    outcomes.append((False, e))
+    except Exception as e:
+        return [(False, e)] * len(calls)
+    return outcomes
+
+
+class WriteBatcher:
+    def __init__(self, manager_factory, max_batch=DEFAULT_MAX_BATCH, window_ms=DEFAULT_WINDOW_MS):
+        self.manager_factory = manager_factory
+        self.max_batch = max(1, max_batch)
+        self.window = max(0, window_ms) / 1000.0
+        self.batches = 0
+        self.writes = 0
+        self.largest_batch = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-write-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        if self._closed:
+            raise Exception("Write batcher is closed")
+        future = Future()
+        self._queue.put((func, args, kwargs, future))
+        return future
+
+    def flush(self, timeout=None):
+        # Commits whatever is queued now without waiting out the window, and
+        # returns once those writes have finished.
+        if self._closed:
+            return True
+        marker = _Flush()
+        self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'writes': self.writes,
+            'largest_batch': self.largest_batch,
+            'average_batch': self.writes / self.batches if self.batches else 0.0,
+            'pending': self._queue.qsize(),
+        }
+
+    def _collect(self, first):
+        batch = [first]
+        flushes = []
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            if isinstance(item, _Flush):
+                flushes.append(item)
+                break
+            batch.append(item)
+        return batch, flushes
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if isinstance(item, _Flush):
+                item.done.set()
+                continue
+            batch, flushes = self._collect(item)
+            live = [entry for entry in batch if entry[3].set_running_or_notify_cancel()]
+            if live:
+                outcomes = apply_batch(self.manager_factory(), [entry[:3] for entry in live])
+                self.batches += 1
+                self.writes += len(live)
+                self.largest_batch = max(self.largest_batch, len(live))
+                for (_, _, _, future), (ok, value) in zip(live, outcomes):
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+            for marker in flushes:
+                marker.done.set()